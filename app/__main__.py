@@ -0,0 +1,11 @@
+# app/__main__.py — точка входа бота: python -m app
+#
+# Процессы рендера картинок (multiprocessing) перед стартом заново импортируют главный
+# модуль. Запуск как python -m app.bot поднял бы в каждом из них всё, что app.bot делает
+# при импорте (логи, тесты, хранилища, пулы); модуль *.__main__ multiprocessing не трогает.
+import asyncio
+
+from app.bot import main
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+# app/adaptive.py — досрочное завершение тестов, когда итог уже не изменится
+
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.mbti import DIMENSION_PAIRS
+from app.scoring import SCORE_DIM, CompiledTest, Vector
+
+# сколько вопросов сэкономили по каждому тесту (с момента запуска)
+SAVED: Counter = Counter()
+
+# суммовые тесты с огромным разбросом баллов не перебираем
+_MAX_SUM_SPAN = 1000
+
+
+def _bounds(options: List[Vector], weight: Callable[[Vector], float]) -> Tuple[float, float]:
+    """ Мин/макс вклада вопроса (weight — вклад одного варианта). """
+    values = [weight(vec) for vec in options] or [0.0]
+    return min(values), max(values)
+
+
+def _along(a: int, b: int) -> Callable[[Vector], float]:
+    """ Вклад варианта в разницу a − b по оси MBTI. """
+    return lambda vec: sum(w for d, w in vec if d == a) - sum(w for d, w in vec if d == b)
+
+
+def _decided_axes(ct: CompiledTest, acc: List[float], start: int) -> Set[Tuple[int, int]]:
+    """ Оси MBTI, где лидера уже не догнать оставшимися вопросами. """
+    decided = set()
+    for a, b in DIMENSION_PAIRS:
+        ia, ib = ct.dim_index[a], ct.dim_index[b]
+        weight = _along(ia, ib)
+        diff = (acc[ia] if ia < len(acc) else 0.0) - (acc[ib] if ib < len(acc) else 0.0)
+        lo = hi = diff
+        for row in ct.options[start:]:
+            q_lo, q_hi = _bounds(row, weight)
+            lo += q_lo
+            hi += q_hi
+        # ничья → a (как в mbti_letters), поэтому b должен строго обгонять
+        if lo >= 0 or hi < 0:
+            decided.add((ia, ib))
+    return decided
+
+
+def _matters(row: List[Vector], axes: List[Tuple[int, int]]) -> bool:
+    """ Выбор варианта в вопросе двигает хоть одну из осей. """
+    for a, b in axes:
+        q_lo, q_hi = _bounds(row, _along(a, b))
+        if q_lo != q_hi:
+            return True
+    return False
+
+
+def _sum_decided(ct: CompiledTest, acc: List[float], start: int) -> bool:
+    """ Любая достижимая сумма попадает в одну и ту же полосу results.json. """
+    score = ct.dim_index[SCORE_DIM]
+    weight = lambda vec: sum(w for d, w in vec if d == score)
+    lo = hi = acc[score] if score < len(acc) else 0.0
+    for row in ct.options[start:]:
+        q_lo, q_hi = _bounds(row, weight)
+        lo += q_lo
+        hi += q_hi
+    # итог — полоса для int(суммы): перебираем целые между границами
+    lo, hi = int(lo), int(hi)
+    if hi - lo > _MAX_SUM_SPAN:
+        return False
+    first = ct.band_for(lo)
+    return all(ct.band_for(v) is first for v in range(lo + 1, hi + 1))
+
+
+def next_index(test: Dict[str, Any], stash: Dict[str, str], start: int) -> int:
+    """
+    Индекс следующего вопроса, который ещё может повлиять на итог.
+    len(questions) — пора показывать результат. Без meta.adaptive возвращает start.
+    Границы — по скомпилированным векторам вариантов (t:/s: и веса o:N одинаково).
+    """
+    total = len(test["questions"])
+    ct: Optional[CompiledTest] = test.get("compiled")
+    if not test.get("adaptive") or ct is None or start >= total:
+        return start
+
+    acc = ct.accumulate(stash)
+    if ct.kind == "sum":
+        return total if _sum_decided(ct, acc, start) else start
+
+    if ct.kind == "mbti":
+        decided = _decided_axes(ct, acc, start)
+        open_axes = [(ct.dim_index[a], ct.dim_index[b]) for a, b in DIMENSION_PAIRS]
+        open_axes = [ax for ax in open_axes if ax not in decided]
+        for i in range(start, total):
+            if _matters(ct.options[i], open_axes):
+                return i
+        return total
+
+    return start
+
+
+def record_saved(slug: Optional[str], saved: int) -> None:
+    if slug and saved > 0:
+        SAVED[slug] += saved
+
+
+def saved_stats() -> Dict[str, int]:
+    """ Для housekeeping-лога: сэкономленные вопросы по тестам. """
+    return dict(SAVED)
@@ -0,0 +1,251 @@
+# app/assets.py — контент-адресное хранилище картинок (sha256) + отчёт о дублях
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow нужен только для поиска похожих картинок
+    Image = None
+
+ROOT_DIR = Path(__file__).resolve().parent
+DATA_DIR = ROOT_DIR / "data"
+ASSETS_DIR = DATA_DIR / "assets"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+HASH_PREFIX = "sha256:"
+# исходники, которые бот ищет через locate/resolve_asset: картинки вопросов и обложки.
+# Остальное под data/ — рантайм (cards/, images/generated/ от imagegen) и старые копии
+SOURCE_GLOBS = ("tests/*/images/*", "branding/*")
+
+# путь → (mtime_ns, size, sha) — чтобы не перечитывать файл на каждый запрос
+_HASH_MEMO: Dict[str, Tuple[int, int, str]] = {}
+
+
+def _rel(path: Path) -> Optional[str]:
+    """ Путь относительно data/ — ключ в index.json. """
+    try:
+        return PurePosixPath(path.resolve().relative_to(DATA_DIR)).as_posix()
+    except ValueError:
+        return None
+
+
+def is_source(rel: str) -> bool:
+    parts = PurePosixPath(rel).parts
+    return any(len(parts) == len(g.split("/")) and PurePosixPath(rel).match(g) for g in SOURCE_GLOBS)
+
+
+def content_hash(path: str) -> str:
+    """ sha256 содержимого (с мемоизацией по mtime/size). """
+    st = os.stat(path)
+    memo = _HASH_MEMO.get(path)
+    if memo and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+        return memo[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    sha = h.hexdigest()
+    _HASH_MEMO[path] = (st.st_mtime_ns, st.st_size, sha)
+    return sha
+
+
+class AssetStore:
+    """
+    Каждая картинка лежит один раз: assets/objects/ab/<sha>.<ext>.
+    index.json хранит исходный путь → sha (для отчётов и обратной совместимости).
+    """
+
+    def __init__(self, root: Path = ASSETS_DIR):
+        self.root = root
+        self.objects = root / "objects"
+        self.index_file = root / "index.json"
+        self._index: Optional[Dict[str, Dict]] = None
+        self._by_sha: Dict[str, Path] = {}
+
+    @property
+    def index(self) -> Dict[str, Dict]:
+        if self._index is None:
+            try:
+                self._index = json.loads(self.index_file.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                self._index = {"paths": {}, "objects": {}}
+        return self._index
+
+    def save_index(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_file.write_text(json.dumps(self.index, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+
+    def object_path(self, sha: str, ext: str) -> Path:
+        return self.objects / sha[:2] / f"{sha}{ext}"
+
+    def put(self, path: Path) -> str:
+        sha = content_hash(str(path))
+        ext = path.suffix.lower()
+        dst = self.object_path(sha, ext)
+        if not dst.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, dst)
+        self.index["objects"].setdefault(sha, {"ext": ext, "size": dst.stat().st_size})
+        self.index["paths"][_rel(path) or str(path)] = sha
+        return sha
+
+    def path_for(self, sha: str) -> Optional[Path]:
+        if sha.startswith(HASH_PREFIX):
+            sha = sha[len(HASH_PREFIX):]
+        p = self._by_sha.get(sha)
+        if p is not None:
+            return p
+        meta = self.index["objects"].get(sha)
+        if not meta:
+            return None
+        p = self.object_path(sha, meta["ext"])
+        if not p.exists():
+            return None
+        self._by_sha[sha] = p
+        return p
+
+
+STORE = AssetStore()
+
+
+def resolve_asset(ref: Optional[str]) -> Optional[str]:
+    """ Ссылка из questions.json ("sha256:…") → путь к файлу в хранилище. """
+    if not ref:
+        return None
+    p = STORE.path_for(ref)
+    return str(p) if p else None
+
+
+def locate(path: Path) -> Optional[str]:
+    """ Файл на месте — берём его; удалён после build --prune — ищем по индексу. """
+    if path.exists():
+        return str(path)
+    rel = _rel(path)
+    sha = STORE.index["paths"].get(rel) if rel else None
+    return resolve_asset(sha) if sha else None
+
+
+# ===== Сборка и отчёт =====
+
+def iter_images(root: Optional[Path] = None):
+    """ Только исходники (SOURCE_GLOBS), без подпапок: ни карточек, ни сгенерированного. """
+    for pattern in SOURCE_GLOBS:
+        for p in sorted((root or DATA_DIR).glob(pattern)):
+            if p.suffix.lower() in IMAGE_EXTS and p.is_file():
+                yield p
+
+
+def prunable(path: Path) -> bool:
+    """ Исходник можно удалить, если бот найдёт его без файла: путь в индексе с тем же хэшем, объект на месте. """
+    rel = _rel(path)
+    sha = STORE.index["paths"].get(rel) if rel else None
+    return bool(sha) and sha == content_hash(str(path)) and resolve_asset(sha) is not None
+
+
+def build(prune: bool = False) -> Dict[str, int]:
+    """
+    Кладёт исходные картинки в хранилище и проставляет "asset" в questions.json.
+    prune=True удаляет исходники, которые бот найдёт по хэшу (см. prunable).
+    """
+    stats = {"files": 0, "unique": 0, "bytes_in": 0, "bytes_out": 0, "pruned": 0}
+    seen = set()
+    for p in iter_images():
+        size = p.stat().st_size
+        sha = STORE.put(p)
+        stats["files"] += 1
+        stats["bytes_in"] += size
+        if sha not in seen:
+            seen.add(sha)
+            stats["unique"] += 1
+            stats["bytes_out"] += size
+    # записи прежних сборок о рантайм-файлах (карточки, сгенерированное) — убираем
+    paths = STORE.index["paths"]
+    for rel in [r for r in paths if not is_source(r)]:
+        del paths[rel]
+    STORE.save_index()
+
+    for qf in sorted((DATA_DIR / "tests").glob("*/questions.json")):
+        data = json.loads(qf.read_text(encoding="utf-8"))
+        changed = False
+        for q in data.get("questions", []):
+            img = q.get("image")
+            if not img:
+                continue
+            p = qf.parent / "images" / img
+            if p.exists():
+                ref = HASH_PREFIX + content_hash(str(p))
+                if q.get("asset") != ref:
+                    q["asset"] = ref
+                    changed = True
+        if changed:
+            qf.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    if prune:
+        for p in list(iter_images()):
+            if prunable(p):
+                p.unlink()
+                stats["pruned"] += 1
+    return stats
+
+
+def dhash(path: Path, size: int = 8) -> int:
+    """ Разностный перцептивный хэш (64 бита): похожие картинки → близкие хэши. """
+    img = Image.open(path).convert("L").resize((size + 1, size), Image.LANCZOS)
+    px = img.tobytes()
+    bits = 0
+    for y in range(size):
+        for x in range(size):
+            bits = (bits << 1) | (px[y * (size + 1) + x] > px[y * (size + 1) + x + 1])
+    return bits
+
+
+def dedupe_report(threshold: int = 6) -> Dict[str, List]:
+    """ Точные дубли (по sha256) и похожие пары (расстояние Хэмминга dhash ≤ threshold). """
+    by_sha: Dict[str, List[str]] = {}
+    files = list(iter_images())
+    for p in files:
+        by_sha.setdefault(content_hash(str(p)), []).append(str(p.relative_to(DATA_DIR)))
+    exact = [paths for paths in by_sha.values() if len(paths) > 1]
+
+    near: List[Tuple[str, str, int]] = []
+    if Image is not None:
+        hashes = []
+        for p in files:
+            try:
+                hashes.append((str(p.relative_to(DATA_DIR)), dhash(p)))
+            except Exception:
+                continue
+        for i in range(len(hashes)):
+            a, ha = hashes[i]
+            for b, hb in hashes[i + 1:]:
+                dist = bin(ha ^ hb).count("1")
+                if dist <= threshold:
+                    near.append((a, b, dist))
+    return {"exact": exact, "near": sorted(near, key=lambda x: x[2])}
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if cmd == "build":
+        s = build(prune="--prune" in sys.argv)
+        print(f"файлов {s['files']}, уникальных {s['unique']}, "
+              f"{s['bytes_in'] / 1e6:.1f} MB → {s['bytes_out'] / 1e6:.1f} MB, удалено исходников {s['pruned']}")
+    elif cmd == "report":
+        thr = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+        rep = dedupe_report(thr)
+        print(f"Точные дубли: {len(rep['exact'])} групп")
+        for group in rep["exact"]:
+            print("  =", ", ".join(group))
+        if Image is None:
+            print("Похожие: нужен Pillow")
+        else:
+            print(f"Похожие (dhash ≤ {thr}): {len(rep['near'])} пар")
+            for a, b, d in rep["near"]:
+                print(f"  ~{d:2d} {a}  {b}")
+    else:
+        print("usage: python -m app.assets [build [--prune] | report [threshold]]")
@@ -0,0 +1,327 @@
+# app/bench.py — микробенчмарки горячих функций бота с порогом регрессии
+#
+#   python -m app.bench run [имя ...] [--save файл]         — замер (и запись базовой линии)
+#   python -m app.bench compare [--baseline файл] [--threshold 20] [имя ...]
+#
+# Входы детерминированы (SEED, реальные тесты из app/data/tests, заглушка Bot API из
+# app.replay), так что прогоны сравнимы между собой. compare выходит с кодом 1, если
+# какая-то функция стала медленнее базовой линии больше допустимого.
+#
+# Против шума: медиана из REPEAT повторов; время делим на калибровочный цикл, замеренный
+# рядом с каждым бенчмарком (сравниваем долю, а не микросекунды — частота CPU и соседи
+# по машине сокращаются); порог — не ниже собственного пола бенчмарка и полуторного разброса
+# замеров. Базовая линия — своя на каждой машине (в репозиторий не кладём):
+#   python -m app.bench run --save app/data/bench_baseline.json   # на main
+#   python -m app.bench compare                                   # на ветке
+
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = Path(os.getenv("BENCH_BASELINE") or ROOT_DIR / "data" / "bench_baseline.json")
+BENCH_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "20"))
+
+# пол порога по умолчанию (%): меньше — уже шум, а не регрессия
+BENCH_FLOOR = float(os.getenv("BENCH_FLOOR", "10"))
+
+SEED = 20240901
+# замер — медиана REPEAT повторов по ~REPEAT_TIME с; «регрессию» перемеряем до RETRIES раз
+REPEAT = 15
+REPEAT_TIME = 0.05
+RETRIES = 2
+# порог не ниже NOISE_K × (относительный межквартильный разброс замеров)
+NOISE_K = 1.5
+
+# имя → setup(): готовит входы и возвращает вызов без аргументов, который и меряем
+BENCHES: Dict[str, Callable[[], Callable[[], Any]]] = {}
+# имя → пол порога, % (микрофункции шумят сильнее)
+FLOORS: Dict[str, float] = {}
+
+
+def bench(name: str, floor: float = BENCH_FLOOR):
+    def deco(setup: Callable[[], Callable[[], Any]]):
+        BENCHES[name] = setup
+        FLOORS[name] = floor
+        return setup
+    return deco
+
+
+def _calibration() -> int:
+    """ Эталон: чистый Python (словари, строки, цикл) — масштаб скорости машины. """
+    d: Dict[str, int] = {}
+    for i in range(300):
+        k = "k" + str(i % 37)
+        d[k] = d.get(k, 0) + i
+    return sum(d.values())
+
+
+def _app():
+    logging.disable(logging.INFO)
+    from app import bot as app_bot
+    return app_bot
+
+
+def _stash(test: Dict[str, Any], rng: random.Random) -> Dict[str, str]:
+    """ Ответы на все вопросы теста — случайные, но одни и те же от прогона к прогону. """
+    from app.scoring import option_payload
+    stash: Dict[str, str] = {}
+    for i, q in enumerate(test["questions"]):
+        opts = q.get("options", [])
+        if opts:
+            j = rng.randrange(len(opts))
+            stash[str(i)] = option_payload(opts[j], j)
+    return stash
+
+
+def _run_async(make_coro: Callable[[], Any]) -> Callable[[], Any]:
+    # свой цикл на бенчмарк: в замер входит и run_until_complete (одинаково во всех прогонах)
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(make_coro())
+
+
+def _fsm(data: Dict[str, Any]):
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+    from app.storage import BoundedMemoryStorage
+
+    storage = BoundedMemoryStorage()
+    state = FSMContext(storage, StorageKey(bot_id=42, chat_id=1, user_id=1))
+    asyncio.run(state.set_data(data))
+    return state
+
+
+# ===== Бенчмарки =====
+
+@bench("load_tests")
+def _load_tests():
+    return _app().load_tests
+
+
+@bench("make_q_kb")
+def _make_q_kb():
+    b = _app()
+    qs = b.TESTS["mbti"]["questions"]
+    return lambda: [b.make_q_kb("mbti", i, q) for i, q in enumerate(qs)]
+
+
+@bench("render_question")
+def _render_question():
+    from aiogram import Bot
+    from app.replay import StubSession
+
+    b = _app()
+    b.QUESTION_IMAGES.workers = 0  # без фоновой отрисовки картинок: меряем сам хендлер
+    bot = Bot("42:BENCH", session=StubSession())
+    state = _fsm({"slug": "mbti", "index": 5, "stash": {}, b.ACTIVE_MSG_KEY: 1})
+    return _run_async(lambda: b.render_question(1, state, bot))
+
+
+def _compute_result(slug: str):
+    b = _app()
+    state = _fsm({"slug": slug, "stash": _stash(b.TESTS[slug], random.Random(SEED))})
+    return _run_async(lambda: b.compute_result(slug, state))
+
+
+# по тесту на каждый тип из каталога
+bench("compute_result[mbti]")(lambda: _compute_result("mbti"))
+bench("compute_result[sum]")(lambda: _compute_result("burnout"))
+
+
+@bench("score_to_mbti", floor=15)
+def _score_to_mbti():
+    b = _app()
+    rng = random.Random(SEED)
+    scores = [{k: rng.randrange(20) for k in "EISNTFJP"} for _ in range(100)]
+    return lambda: [b.score_to_mbti(s) for s in scores]
+
+
+@bench("mbti_from_traits", floor=25)
+def _mbti_from_traits():
+    from app.mbti import mbti_from_traits
+    rng = random.Random(SEED)
+    traits = [rng.choice("EISNTFJP") for _ in range(40)]
+    return lambda: mbti_from_traits(traits)
+
+
+@bench("calc_result", floor=25)
+def _calc_result():
+    from app.tests_manager import calc_result
+    # в каталоге нет тестов формата tests_manager — профили собираем сами, из SEED
+    rng = random.Random(SEED)
+    pool = [f"t{i}" for i in range(12)]
+    test = {
+        "slug": "bench",
+        "results": {f"p{k}": {"traits": rng.sample(pool, 4), "text": f"профиль {k}"} for k in range(8)},
+    }
+    traits = [rng.choice(pool) for _ in range(30)]
+    return lambda: calc_result(test, traits)
+
+
+@bench("question_image")
+def _question_image():
+    b = _app()
+    test_dir = b.TESTS_DIR / "mbti"
+    qs = b.TESTS["mbti"]["questions"]
+    return lambda: [b.question_image(test_dir, i + 1, q) for i, q in enumerate(qs)]
+
+
+@bench("find_brand_image")
+def _find_brand_image():
+    b = _app()
+    return lambda: (b.find_brand_image("menu"), b.find_brand_image("full"))
+
+
+@bench("make_one[128]")
+def _make_one():
+    try:
+        from make_images_pro import make_one
+    except ImportError:  # нет Pillow — пропускаем
+        return None
+    return lambda: make_one(128, SEED, "blend")
+
+
+# ===== Замер и сравнение =====
+
+def _number(timer: timeit.Timer) -> int:
+    number, total = timer.autorange()  # ≥ 0.2 с — отсюда число вызовов на повтор
+    return max(1, int(number * REPEAT_TIME / total))
+
+
+def measure(fn: Callable[[], Any], repeat: int = REPEAT) -> Dict[str, float]:
+    """
+    Повторы бенчмарка чередуем с калибровкой: в каждой паре машина в одном состоянии,
+    так что score (время / время калибровки) от дрейфа частоты и соседей почти не зависит.
+    """
+    timer, calib = timeit.Timer(fn), timeit.Timer(_calibration)
+    number, calib_number = _number(timer), _number(calib)
+    times: List[float] = []
+    scores: List[float] = []
+    for _ in range(repeat):
+        t = timer.timeit(number) / number
+        c = calib.timeit(calib_number) / calib_number
+        times.append(t)
+        scores.append(t / c)
+    scores.sort()
+    score = statistics.median(scores)
+    q1, q3 = scores[len(scores) // 4], scores[(3 * len(scores)) // 4]
+    return {
+        "us": round(statistics.median(times) * 1e6, 3),
+        "score": round(score, 4),
+        "spread": round((q3 - q1) / score, 4),
+        "number": number,
+    }
+
+
+def run(names: Optional[List[str]] = None) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name, setup in BENCHES.items():
+        if names and name not in names:
+            continue
+        fn = setup()
+        if fn is not None:
+            results[name] = measure(fn)
+    return {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "seed": SEED,
+        "results": results,
+    }
+
+
+def limit_for(name: str, cur: Dict[str, Any], base: Dict[str, Any], threshold: float) -> float:
+    """ Допустимое замедление, %: threshold, но не ниже пола бенчмарка и шума обоих замеров. """
+    noise = NOISE_K * max(cur.get("spread", 0), base.get("spread", 0)) * 100
+    return max(threshold, FLOORS.get(name, BENCH_FLOOR), noise)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = BENCH_THRESHOLD) -> List[Dict[str, Any]]:
+    rows = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None or "score" not in base:
+            rows.append({"name": name, "us": cur["us"], "base": None, "delta": None, "limit": None, "regressed": False})
+            continue
+        delta = (cur["score"] / base["score"] - 1) * 100
+        limit = limit_for(name, cur, base, threshold)
+        rows.append({
+            "name": name, "us": cur["us"], "base": base["us"],
+            "delta": delta, "limit": limit, "regressed": delta > limit,
+        })
+    return rows
+
+
+def check(baseline: Dict[str, Any], threshold: float = BENCH_THRESHOLD, names: Optional[List[str]] = None,
+          retries: int = RETRIES) -> List[Dict[str, Any]]:
+    """ compare() с перемером: «регрессии» перепроверяем и берём лучший замер — шум отсекается. """
+    current = run(names)
+    rows = compare(current, baseline, threshold)
+    for _ in range(retries):
+        suspects = [r["name"] for r in rows if r["regressed"]]
+        if not suspects:
+            break
+        again = run(suspects)["results"]
+        for name, r in again.items():
+            if r["score"] < current["results"][name]["score"]:
+                current["results"][name] = r
+        rows = compare(current, baseline, threshold)
+    return rows
+
+
+def format_rows(rows: List[Dict[str, Any]]) -> str:
+    lines = []
+    for r in rows:
+        if r["base"] is None:
+            lines.append(f"{r['name']:<24} {r['us']:>12.2f} us   (нет в базовой линии)")
+        else:
+            mark = "  РЕГРЕССИЯ" if r["regressed"] else ""
+            lines.append(
+                f"{r['name']:<24} {r['us']:>12.2f} us   база {r['base']:>12.2f} us   "
+                f"{r['delta']:+6.1f}% (допуск {r['limit']:.0f}%){mark}"
+            )
+    return "\n".join(lines)
+
+
+def _opt(args: List[str], flag: str, default: Any) -> Any:
+    if flag in args:
+        i = args.index(flag)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    cmd = args.pop(0) if args else "run"
+    if cmd == "run":
+        save = _opt(args, "--save", None)
+        report = run(args or None)
+        for name, r in report["results"].items():
+            print(f"{name:<24} {r['us']:>12.2f} us   ×{r['score']:<10.3f} разброс {r['spread'] * 100:.1f}%")
+        if save:
+            Path(save).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    elif cmd == "compare":
+        baseline_path = Path(_opt(args, "--baseline", BASELINE_FILE))
+        threshold = float(_opt(args, "--threshold", BENCH_THRESHOLD))
+        if not baseline_path.exists():
+            print(f"нет базовой линии {baseline_path}: снимите её на этой машине — "
+                  f"python -m app.bench run --save {baseline_path}")
+            sys.exit(2)
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        rows = check(baseline, threshold, args or None)
+        print(format_rows(rows))
+        if any(r["regressed"] for r in rows):
+            print("❌ медленнее базовой линии больше допуска")
+            sys.exit(1)
+    else:
+        print("usage: python -m app.bench run [имя ...] [--save файл] | compare [--baseline файл] [--threshold N] [имя ...]")
+        sys.exit(2)
@@ -1,29 +1,51 @@
 # app/bot.py — оригинальный UI из ZIP + фиксы результатов (MBTI + sum bands)
 
 import os
+import html
 import json
+import asyncio
 import logging
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.types import (
     Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup,
-    FSInputFile, InputMediaPhoto
+    InputMediaPhoto, InlineQuery
 )
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.filters import Command
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-
-logging.basicConfig(level=logging.INFO)
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.adaptive import next_index, record_saved, saved_stats
+from app.assets import locate, resolve_asset
+from app.broadcast import Broadcaster
+from app.config import get_bot_configs
+from app.http_session import TunedSession
+from app.imagegen import QuestionImages
+from app.itemstats import ITEMSTATS_FLUSH, ItemStats
+from app.logs import HandlerNameMiddleware, LatencyMiddleware, logging_stats, setup_logging
+from app.mbti import mbti_letters
+from app.cards import iter_outcomes
+from app.media import file_id_for, photo_input, remember_photo
+from app.middlewares import GROUP_CHAT_TYPES, ChatSerialMiddleware
+from app.reminders import Reminder, ReminderScheduler, ReminderWheel
+from app.replay import UpdateRecorder
+from app.results import INLINE_CACHE_TIME, InlineResults, ResultStore
+from app.snapshot import UpdateTracker, ack_offset, restore_snapshot, resume_updates, save_snapshot
+from app.scoring import compile_test, option_payload
+from app.storage import BoundedMemoryStorage
+from app.tenants import card_caches, register, tenant_for
+
+# stdout пишет фоновый поток: хендлеры только кладут записи в очередь
+setup_logging()
 log = logging.getLogger("mbti_bot")
 
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    raise SystemExit("❌ BOT_TOKEN не задан в окружении")
-
 # Пути
 ROOT_DIR = Path(__file__).resolve().parent
 DATA_DIR = ROOT_DIR / "data"
@@ -46,22 +68,52 @@ TITLE_ALIAS: Dict[str, str] = {
 # FSM keys
 ACTIVE_MSG_KEY = "active_msg_id"
 
-# ===== Картинки/ресурсы =====
+# Служебный чат, куда заранее заливаем карточки результатов (ради file_id)
+CARD_UPLOAD_CHAT_ID = int(os.getenv("CARD_UPLOAD_CHAT_ID") or 0)
 
-def find_brand_image(kind: str) -> Optional[str]:
-    """ Ищем обложки: data/branding/menu.(png/jpg/webp), full.(...) """
-    for ext in ("png", "jpg", "jpeg", "webp"):
-        p = DATA_DIR / "branding" / f"{kind}.{ext}"
-        if p.exists():
-            return str(p)
-    return None
+# Кому можно /broadcast (через запятую)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+
+# Запись анонимизированного потока апдейтов для app.replay (пусто — выключено)
+RECORD_UPDATES = os.getenv("RECORD_UPDATES", "")
+
+# Сколько апдейтов обрабатываем одновременно (по всем чатам)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "100"))
+# Сколько апдейтов может ждать свободного места; сверх — отвечаем «занято»
+INGRESS_QUEUE_MAX = int(os.getenv("INGRESS_QUEUE_MAX", "1000"))
+# Сообщений «занято» в секунду (на все чаты); сверх — молча пропускаем
+BUSY_REPLY_RATE = float(os.getenv("BUSY_REPLY_RATE", "5"))
+
+# Флуд-контроль: в личке короткую паузу выжидаем и повторяем, длинную — сообщаем
+# пользователю; в группах (~20 сообщений в минуту на чат) сообщаем сразу
+FLOOD_WAIT_MAX = float(os.getenv("FLOOD_WAIT_MAX", "10"))
+
+# «Напомнить пройти снова»: для каких тестов и через сколько дней
+REMIND_SLUGS = {x for x in os.getenv("REMIND_SLUGS", "burnout,psych_age").replace(" ", "").split(",") if x}
+REMIND_AFTER_DAYS = float(os.getenv("REMIND_AFTER_DAYS", "14"))
 
-def question_image(test_dir: Path, idx: int) -> Optional[str]:
-    """ Ищем изображения вопросов: 1.jpg|png, 2.jpg|png, ... """
+# ===== Картинки/ресурсы =====
+
+def find_brand_image(kind: str, bot: Optional[Bot] = None) -> Optional[str]:
+    """ Ищем обложки бота: <branding_dir>/menu.(png/jpg/webp), full.(...), иначе data/branding """
+    return tenant_for(bot).brand_image(kind)
+
+def question_image(test_dir: Path, idx: int, q: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """ Картинка вопроса: "asset" (sha256) → images/<image> → images/q1.jpg → 1.jpg """
+    q = q or {}
+    p = resolve_asset(q.get("asset"))
+    if p:
+        return p
+    candidates: List[Path] = []
+    if q.get("image"):
+        candidates.append(test_dir / "images" / q["image"])
     for ext in ("jpg", "jpeg", "png", "webp"):
-        p = test_dir / f"{idx}.{ext}"
-        if p.exists():
-            return str(p)
+        candidates.append(test_dir / "images" / f"q{idx}.{ext}")
+        candidates.append(test_dir / f"{idx}.{ext}")
+    for c in candidates:
+        p = locate(c)
+        if p:
+            return p
     return None
 
 # ===== Загрузка тестов (как в ZIP) + учитываем meta.type =====
@@ -96,15 +148,30 @@ def load_tests() -> Dict[str, Dict[str, Any]]:
             "title": qdata.get("meta", {}).get("title", TITLE_ALIAS.get(slug, slug)),
             # 💡 критично: читаем тип теста для расчёта результатов
             "type": qdata.get("meta", {}).get("type", "traits"),
+            # meta.adaptive: пропускаем вопросы, которые уже не меняют итог
+            "adaptive": bool(qdata.get("meta", {}).get("adaptive", False)),
             "questions": questions,
             "results": rdata,
             "dir": slug_path,
         }
+        # веса вариантов/полосы/профили — один раз при загрузке
+        tests[slug]["compiled"] = compile_test(slug, tests[slug])
     log.info("Загружено тестов: %d", len(tests))
     return tests
 
+# Каталог общий для всех ботов процесса: парсим и компилируем один раз
 TESTS = load_tests()
 
+# Недостающие картинки вопросов рисуем при первом показе (и кладём в images/ теста)
+QUESTION_IMAGES = QuestionImages()
+
+# Статистика вопросов: выборы, время ответа, дискриминация (python -m app.itemstats)
+ITEM_STATS = ItemStats(TESTS)
+
+# Последние результаты (state.json) и готовые inline-ответы для шаринга через @bot
+RESULTS = ResultStore()
+INLINE = InlineResults(TESTS)
+
 # ===== Базовые утилиты сообщений =====
 
 async def _store_msg_id(state: FSMContext, key: str, msg_id: Optional[int]):
@@ -123,20 +190,50 @@ async def replace_message(
     text: Optional[str] = None,
     photo: Optional[str] = None,
     reply_markup: Optional[InlineKeyboardMarkup] = None,
+    flood_wait: float = FLOOD_WAIT_MAX,
 ):
-    """ «Мягкая» подмена: редачим старое сообщение, если можно, иначе шлём новое. """
+    """
+    «Мягкая» подмена: редачим старое сообщение, если можно, иначе шлём новое.
+    Флуд-паузу до flood_wait секунд выжидаем и повторяем — всё это время держим место
+    в очереди апдейтов и замок чата, поэтому в группах (flood_wait=0) сразу отдаём наверх.
+    """
+    for attempt in range(2):
+        try:
+            await _replace_once(bot, chat_id, state, text, photo, reply_markup)
+            return
+        except TelegramRetryAfter as e:
+            if attempt or e.retry_after > flood_wait:
+                raise
+            log.warning("flood wait %ss", e.retry_after, extra={"chat_id": chat_id})
+            await asyncio.sleep(e.retry_after)
+
+async def _replace_once(
+    bot: Bot,
+    chat_id: int,
+    state: FSMContext,
+    text: Optional[str],
+    photo: Optional[str],
+    reply_markup: Optional[InlineKeyboardMarkup],
+):
+    msg_id = None
     try:
         msg_id = await _get_msg_id(state, ACTIVE_MSG_KEY)
         if msg_id and photo:
-            media = InputMediaPhoto(media=FSInputFile(photo), caption=text)
-            await bot.edit_message_media(media=media, chat_id=chat_id, message_id=msg_id, reply_markup=reply_markup)
+            media = InputMediaPhoto(media=photo_input(bot.id, photo), caption=text)
+            res = await bot.edit_message_media(media=media, chat_id=chat_id, message_id=msg_id, reply_markup=reply_markup)
+            remember_photo(bot.id, photo, res)
         elif msg_id and text is not None:
             await bot.edit_message_text(text, chat_id, msg_id, reply_markup=reply_markup)
         else:
             raise RuntimeError("no active message")
-    except Exception:
+    except TelegramRetryAfter:
+        raise  # новое сообщение упрётся в тот же лимит
+    except Exception as e:
+        if msg_id:
+            log.info("replace_message: не отредактировали (%s), шлём новое", type(e).__name__)
         if photo:
-            msg = await bot.send_photo(chat_id, FSInputFile(photo), caption=text, reply_markup=reply_markup)
+            msg = await bot.send_photo(chat_id, photo_input(bot.id, photo), caption=text, reply_markup=reply_markup)
+            remember_photo(bot.id, photo, msg)
         else:
             msg = await bot.send_message(chat_id, text or "—", reply_markup=reply_markup)
         await _store_msg_id(state, ACTIVE_MSG_KEY, msg.message_id)
@@ -144,63 +241,41 @@ async def replace_message(
 # ===== Подсчёт результатов (фикс) =====
 
 def score_to_mbti(score: Dict[str, int]) -> str:
-    e = "E" if score.get("E", 0) >= score.get("I", 0) else "I"
-    s = "S" if score.get("S", 0) >= score.get("N", 0) else "N"
-    t = "T" if score.get("T", 0) >= score.get("F", 0) else "F"
-    j = "J" if score.get("J", 0) >= score.get("P", 0) else "P"
-    return f"{e}{s}{t}{j}"
+    return mbti_letters(lambda k: score.get(k, 0))
+
+def result_outcome(slug: str, stash: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """ Итог для карточки: {key, title, text}. Только для mbti/sum — у них конечный набор исходов. """
+    test = TESTS.get(slug)
+    if not test:
+        return None
+    out = test["compiled"].outcome(stash)
+    if not out or out["kind"] not in ("mbti", "sum"):
+        return None
+    return {"key": out["key"], "title": out["title"], "text": out["text"], "test": test.get("title", slug)}
 
 async def compute_result(slug: str, state: FSMContext) -> str:
     data = await state.get_data()
     stash: Dict[str, str] = data.get("stash", {})
     test = TESTS.get(slug, {})
     ttype = test.get("type", "traits")
-
-    # собираем и трейты, и суммы баллов
-    trait_score: Dict[str, int] = {}
-    total_score = 0
-    for raw in stash.values():
-        if not raw:
-            continue
-        if raw.startswith("t:"):
-            trait = raw[2:]
-            if not trait:
-                continue
-            trait_score[trait] = trait_score.get(trait, 0) + 1
-        elif raw.startswith("s:"):
-            try:
-                total_score += int(raw[2:])
-            except Exception:
-                pass
+    out = test["compiled"].outcome(stash) if test else None
 
     # MBTI — классическая сборка по осям
-    if slug == "mbti" or ttype == "mbti":
-        typ = score_to_mbti(trait_score)
-        desc = test.get("results", {}).get(typ, "Описание недоступно.")
-        return f"🏁 Твой тип: <b>{typ}</b>\n{desc}"
+    if out and out["kind"] == "mbti":
+        return f"🏁 Твой тип: <b>{out['title']}</b>\n{out['text']}"
 
     # Суммовые тесты: bands + format
     if ttype == "sum":
-        rdata = test.get("results", {})
-        bands = rdata.get("bands", [])
-        fmt = rdata.get("format", "<b>{title}</b>\n\n{text}")
-        picked = None
-        for b in bands:
-            try:
-                if int(b.get("min", -10**9)) <= total_score <= int(b.get("max", 10**9)):
-                    picked = b
-                    break
-            except Exception:
-                continue
-        if not picked and bands:
-            bands_sorted = sorted(bands, key=lambda x: (x.get("min", 0)))
-            picked = bands_sorted[0] if total_score < bands_sorted[0].get("min", 0) else bands_sorted[-1]
-        if picked:
-            return fmt.format(title=picked.get("title", "—"), text=picked.get("text", ""))
+        fmt = test.get("results", {}).get("format", "<b>{title}</b>\n\n{text}")
+        if out:
+            return fmt.format(title=out["title"], text=out["text"])
         return "🏁 Результат: нет данных"
 
+    if out and out["kind"] == "profiles":
+        return f"🏁 Результат «{TESTS[slug]['title']}»:\n<b>{out['title']}</b>\n{out['text']}"
+
     # Fallback (если вдруг другой тип теста)
-    top = sorted(trait_score.items(), key=lambda x: -x[1])[:3]
+    top = out["top"] if out else []
     top_str = ", ".join([f"{k}:{v}" for k, v in top]) if top else "нет данных"
     return f"🏁 Результат «{TESTS[slug]['title']}»:\n<b>{top_str}</b>"
 
@@ -211,15 +286,10 @@ router = Router()
 def make_q_kb(slug: str, idx: int, q: Dict[str, Any]) -> InlineKeyboardMarkup:
     rows: List[List[InlineKeyboardButton]] = []
     row: List[InlineKeyboardButton] = []
-    for opt in q.get("options", []):
+    for i, opt in enumerate(q.get("options", [])):
         btn_text = opt.get("text", "—")
-        # Внешний вид не меняем — только payload т/с
-        if "trait" in opt and opt.get("trait"):
-            val = f"t:{opt.get('trait')}"
-        elif "score" in opt:
-            val = f"s:{opt.get('score')}"
-        else:
-            val = "t:"
+        # Внешний вид не меняем — только payload т/с (o:N — для вариантов с весами)
+        val = option_payload(opt, i)
         row.append(InlineKeyboardButton(text=btn_text, callback_data=f"ans:{slug}:{idx}:{val}"))
         if len(row) == 2:
             rows.append(row); row = []
@@ -228,60 +298,111 @@ def make_q_kb(slug: str, idx: int, q: Dict[str, Any]) -> InlineKeyboardMarkup:
     rows.append([InlineKeyboardButton(text="⬅️ Вернуться в меню", callback_data="back:menu")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-async def render_question(chat_id: int, state: FSMContext, bot: Bot):
+async def render_question(chat_id: int, state: FSMContext, bot: Bot, flood_wait: float = FLOOD_WAIT_MAX):
     data = await state.get_data()
     slug = data.get("slug")
     idx = int(data.get("index", 0))
     test = TESTS.get(slug)
     if not test:
-        await replace_message(bot, chat_id, state, text="Тест недоступен.")
+        await replace_message(bot, chat_id, state, text="Тест недоступен.", flood_wait=flood_wait)
         return
     qs = test["questions"]
     total = len(qs)
+    # в группе подписываем, чей это тест
+    owner = f"👤 {html.escape(data['owner'])}\n" if data.get("owner") else ""
 
     if idx >= total:
-        # Конец теста — показываем результат (с фирменной обложкой, если есть)
-        result_text = await compute_result(slug, state)
-        img = find_brand_image("full")
-        await replace_message(bot, chat_id, state, text=result_text, photo=img)
+        # Конец теста — показываем результат на карточке (или на фирменной обложке)
+        result_text = owner + await compute_result(slug, state)
+        saved = int(data.get("saved", 0))
+        if saved:
+            record_saved(slug, saved)
+            log.info("adaptive finish: slug=%s saved=%d/%d", slug, saved, total)
+        ITEM_STATS.complete(slug, data.get("stash", {}))
+        outcome = result_outcome(slug, data.get("stash", {}))
+        tenant = tenant_for(bot)
+        card = await tenant.cards.get(outcome) if outcome else None
+        await replace_message(
+            bot, chat_id, state, text=result_text, photo=card or tenant.brand_image("full"), reply_markup=remind_kb(slug),
+            flood_wait=flood_wait,
+        )
+        if outcome:
+            RESULTS.record(bot.id, state.key.user_id, chat_id, slug, outcome)
+            if card:
+                INLINE.remember_photo(bot.id, outcome, file_id_for(bot.id, card))
         return
 
     q = qs[idx]
-    text = f"<b>{q.get('text', '')}</b>\n\n({idx + 1}/{total})"
+    ITEM_STATS.shown(slug, idx)
+    text = f"{owner}<b>{q.get('text', '')}</b>\n\n({idx + 1}/{total})"
     kb = make_q_kb(slug, idx, q)
 
-    # Фото вопроса: 1.jpg/png/...
-    p = question_image(test["dir"], idx + 1)
-    await replace_message(bot, chat_id, state, text=text, photo=p, reply_markup=kb)
+    # Фото вопроса: по хэшу из хранилища или из images/; нет — рисуем
+    p = question_image(test["dir"], idx + 1, q) or await QUESTION_IMAGES.get(test["dir"], idx + 1)
+    if idx + 1 < total and not question_image(test["dir"], idx + 2, qs[idx + 1]):
+        QUESTION_IMAGES.prefetch(test["dir"], idx + 2)
+    await replace_message(bot, chat_id, state, text=text, photo=p, reply_markup=kb, flood_wait=flood_wait)
 
 # Главное меню: смайлы + обложка "menu"
 @router.message(Command("start"))
 async def cmd_start(msg: Message, state: FSMContext, bot: Bot):
+    tenant = tenant_for(bot)
     rows = []
-    # Порядок — как в TITLE_ALIAS (как было в ZIP)
+    # Порядок — как в TITLE_ALIAS (как было в ZIP); только тесты, включённые у этого бота
     for slug, pretty in TITLE_ALIAS.items():
-        if slug in TESTS:
+        if slug in TESTS and tenant.allows(slug):
             rows.append([InlineKeyboardButton(text=pretty, callback_data=f"start:{slug}")])
     kb = InlineKeyboardMarkup(inline_keyboard=rows)
 
-    photo = find_brand_image("menu")
+    photo = tenant.brand_image("menu")
     caption = "👋 Выбери тест ниже:"
+    # в группе — ответом на /start, чтобы было видно, чьё это меню
+    reply_to = msg.message_id if msg.chat.type in GROUP_CHAT_TYPES else None
     if photo:
-        m = await msg.answer_photo(FSInputFile(photo), caption=caption, reply_markup=kb)
+        m = await msg.answer_photo(photo_input(bot.id, photo), caption=caption, reply_markup=kb, reply_to_message_id=reply_to)
+        remember_photo(bot.id, photo, m)
     else:
-        m = await msg.answer(caption, reply_markup=kb)
+        m = await msg.answer(caption, reply_markup=kb, reply_to_message_id=reply_to)
     await _store_msg_id(state, ACTIVE_MSG_KEY, m.message_id)
 
 @router.callback_query(F.data.startswith("start:"))
 async def cb_start(call: CallbackQuery, state: FSMContext, bot: Bot):
     slug = call.data.split(":", 1)[1]
-    if slug not in TESTS:
+    if slug not in TESTS or not tenant_for(bot).allows(slug):
         await call.answer("Тест временно недоступен", show_alert=True)
         return
-    await state.update_data(slug=slug, index=0, stash={})
-    await render_question(call.message.chat.id, state, bot)
+    # в группе меню общее: кто нажал — тому и своя сессия/сообщение (FSM-ключ — chat+user)
+    owner = call.from_user.full_name if call.message.chat.type in GROUP_CHAT_TYPES else None
+    await state.update_data(slug=slug, index=0, stash={}, saved=0, shown_at=time.time(), owner=owner)
+    if owner is None:
+        # в личке тест продолжается в том сообщении, где нажали (меню, напоминание, «начать заново»)
+        await _store_msg_id(state, ACTIVE_MSG_KEY, call.message.message_id)
+    if not await render_or_flood(call, state, bot):
+        return
     await call.answer()
 
+async def render_or_flood(call: CallbackQuery, state: FSMContext, bot: Bot) -> bool:
+    """
+    render_question для кнопок; при долгом флуд-лимите — тост вместо падения.
+    В группе лимит на чат (~20 в минуту) — не ждём вовсе, тост сразу.
+    """
+    chat = call.message.chat
+    flood_wait = 0 if chat.type in GROUP_CHAT_TYPES else FLOOD_WAIT_MAX
+    try:
+        await render_question(chat.id, state, bot, flood_wait=flood_wait)
+        return True
+    except TelegramRetryAfter as e:
+        await call.answer(f"⏳ В чате слишком много сообщений — повтори через {e.retry_after} с")
+        return False
+
+async def session_expired(call: CallbackQuery, slug: str):
+    rows = []
+    if slug in TESTS and tenant_for(call.bot).allows(slug):
+        rows.append([InlineKeyboardButton(text="🔁 Начать заново", callback_data=f"start:{slug}")])
+    kb = InlineKeyboardMarkup(inline_keyboard=rows) if rows else None
+    await call.answer("Сессия истекла", show_alert=False)
+    await call.message.answer("⌛ Сессия истекла — ответы не сохранились. Начать тест заново?", reply_markup=kb)
+
 @router.callback_query(F.data.startswith("ans:"))
 async def cb_ans(call: CallbackQuery, state: FSMContext, bot: Bot):
     try:
@@ -291,28 +412,247 @@ async def cb_ans(call: CallbackQuery, state: FSMContext, bot: Bot):
         await call.answer()
         return
     data = await state.get_data()
+    own_msg = data.get(ACTIVE_MSG_KEY)
+    if call.message.chat.type in GROUP_CHAT_TYPES and own_msg not in (None, call.message.message_id):
+        # кнопки чужого теста в группе: ответы не смешиваем
+        await call.answer("Это тест другого участника — нажми /start, чтобы пройти свой")
+        return
+    if data.get("slug") != slug:
+        # сессию вытеснили по простою (или кнопка от старого теста) — предлагаем начать заново
+        await session_expired(call, slug)
+        return
     stash: Dict[str, str] = data.get("stash", {})
     stash[str(idx)] = val
-    await state.update_data(stash=stash, index=idx + 1)
-    await render_question(call.message.chat.id, state, bot)
+    now = time.time()
+    shown_at = data.get("shown_at")
+    ITEM_STATS.answer(slug, idx, val, now - shown_at if shown_at else None)
+    nxt = idx + 1
+    test = TESTS.get(slug)
+    if test:
+        nxt = next_index(test, stash, nxt)
+    saved = int(data.get("saved", 0)) + (nxt - idx - 1)
+    await state.update_data(stash=stash, index=nxt, saved=saved, shown_at=now)
+    if not await render_or_flood(call, state, bot):
+        return
     await call.answer()
 
+# ===== Шаринг результата: @bot в любом чате =====
+
+@router.inline_query()
+async def inline_share(query: InlineQuery, bot: Bot):
+    """ Последний результат пользователя — карточкой (или текстом). Только словари в памяти. """
+    last = RESULTS.latest(bot.id, query.from_user.id)
+    key = last["key"] if last and tenant_for(bot).allows(last["slug"]) else None
+    await query.answer([INLINE.get(bot.id, key)], cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+# ===== Напоминания: пройти тест снова =====
+
+# боты процесса по id — напоминание уходит от того же бота, у которого его заказали
+BOTS: Dict[int, Bot] = {}
+
+def remind_kb(slug: str) -> Optional[InlineKeyboardMarkup]:
+    if slug not in REMIND_SLUGS:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=f"🔔 Напомнить пройти снова через {REMIND_AFTER_DAYS:g} дн.", callback_data=f"remind:{slug}")
+    ]])
+
+async def send_reminder(rem: Reminder):
+    bot = BOTS.get(rem.bot_id)
+    if bot is None or rem.slug not in TESTS or not tenant_for(bot).allows(rem.slug):
+        return
+    title = html.escape(TITLE_ALIAS.get(rem.slug, TESTS[rem.slug]["title"]))
+    kb = InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="🔁 Пройти снова", callback_data=f"start:{rem.slug}")
+    ]])
+    await bot.send_message(rem.chat_id, f"🔔 Пора пройти «{title}» ещё раз и сравнить с прошлым результатом.", reply_markup=kb)
+
+REMINDERS = ReminderScheduler(ReminderWheel(), send_reminder)
+
+@router.callback_query(F.data.startswith("remind:"))
+async def cb_remind(call: CallbackQuery, bot: Bot):
+    slug = call.data.split(":", 1)[1]
+    if slug not in REMIND_SLUGS or slug not in TESTS:
+        await call.answer()
+        return
+    rem = REMINDERS.schedule(bot.id, call.message.chat.id, slug, REMIND_AFTER_DAYS * 86400)
+    await call.answer(f"🔔 Напомню {datetime.fromtimestamp(rem.due):%d.%m}")
+
+# ===== Рассылка (только для админов) =====
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(msg: Message, bot: Bot):
+    """ /broadcast [slug] текст — анонс всем известным чатам (от имени этого бота). """
+    tenant = tenant_for(bot)
+    broadcaster = tenant.broadcaster
+    if msg.from_user is None or msg.from_user.id not in ADMIN_IDS or broadcaster is None:
+        return
+    parts = (msg.text or "").split(maxsplit=2)
+    if len(parts) < 2:
+        await msg.answer("Формат: /broadcast [slug] текст")
+        return
+    kb = None
+    text = " ".join(parts[1:])
+    if parts[1] in TESTS and tenant.allows(parts[1]) and len(parts) == 3:
+        slug, text = parts[1], parts[2]
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=TITLE_ALIAS.get(slug, TESTS[slug]["title"]), callback_data=f"start:{slug}")]
+        ])
+    try:
+        camp = broadcaster.start(text, photo=tenant.brand_image("start"), reply_markup=kb)
+    except RuntimeError as e:
+        await msg.answer(f"⚠️ {e}")
+        return
+    await msg.answer(f"📣 Рассылка {camp['id']} запущена")
+
+@router.message(Command("broadcast_status"))
+async def cmd_broadcast_status(msg: Message, bot: Bot):
+    broadcaster = tenant_for(bot).broadcaster
+    if msg.from_user is None or msg.from_user.id not in ADMIN_IDS or broadcaster is None:
+        return
+    camp = broadcaster.campaign
+    if not camp:
+        await msg.answer("Рассылок не было.")
+        return
+    status = "✅ завершена" if camp["done"] else ("⏳ идёт" if broadcaster.running else "⏸ на паузе")
+    await msg.answer(
+        f"📣 {camp['id']}: {status}\n"
+        f"отправлено {camp['sent']}, ошибок {camp['failed']}, заблокировали {camp['blocked']}"
+    )
+
 # ===== MAIN =====
 
-async def main():
-    bot = Bot(BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher(storage=MemoryStorage())
+def build_dispatcher(
+    storage: BaseStorage, recorder: Optional[UpdateRecorder] = None
+) -> Tuple[Dispatcher, UpdateTracker, ChatSerialMiddleware]:
+    """ Диспетчер со всеми middleware бота (общий для main() и python -m app.replay). """
+    dp = Dispatcher(storage=storage)
+    if recorder:
+        dp.update.outer_middleware(recorder)
+    # трекер первым: считает «в работе» и апдейты, ждущие своей очереди
+    tracker = UpdateTracker()
+    dp.update.outer_middleware(tracker)
+    # апдейты одного чата — по очереди (иначе гонка get_data/update_data в cb_ans);
+    # при всплеске ответы идущих тестов — вперёд новых /start
+    serial = ChatSerialMiddleware(MAX_CONCURRENT_UPDATES, INGRESS_QUEUE_MAX, BUSY_REPLY_RATE)
+    dp.update.outer_middleware(serial)
+    # контекст логов (update_id, chat_id, handler, slug) + медленные апдейты
+    dp.update.outer_middleware(LatencyMiddleware())
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(HandlerNameMiddleware(TESTS))
     dp.include_router(router)
+    return dp, tracker, serial
 
+async def main():
     try:
-        # сбросим вебхук (на всякий), используем long polling
-        await bot.delete_webhook(drop_pending_updates=False)
-    except Exception:
-        pass
-
-    log.info("✅ MBTI бот запущен")
-    await dp.start_polling(bot)
+        configs = get_bot_configs()
+    except (RuntimeError, ValueError, OSError) as e:
+        raise SystemExit(f"❌ {e}")
+    # несколько токенов — один процесс: общий каталог, общий диспетчер,
+    # у каждого бота свои обложки, file_id и рассылка; HTTP-пул — один на всех
+    session = TunedSession()
+    bots: List[Bot] = []
+    for cfg in configs:
+        bot = Bot(cfg.token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        register(bot, cfg)
+        bots.append(bot)
+        BOTS[bot.id] = bot
+    storage = BoundedMemoryStorage()
+    recorder = UpdateRecorder(RECORD_UPDATES) if RECORD_UPDATES else None
+    dp, tracker, serial = build_dispatcher(storage, recorder)
+
+    # процесс рендера картинок — заранее, чтобы первый вопрос не ждал запуск интерпретатора
+    QUESTION_IMAGES.warm_up()
+
+    # сессии/кэши от предыдущего инстанса (мягкий рестарт)
+    offsets, unfinished = restore_snapshot(storage)
+    ITEM_STATS.load()
+    if len(bots) == 1 and 0 in offsets:
+        offsets.setdefault(bots[0].id, offsets.pop(0))
+    # записи старого однобота (без bot_id) — первому боту в конфиге
+    RESULTS.legacy_bot = bots[0].id
+
+    for bot in bots:
+        try:
+            # сбросим вебхук (на всякий), используем long polling
+            await bot.delete_webhook(drop_pending_updates=False)
+        except Exception:
+            pass
+        # подтверждаем уже обработанное старым инстансом — без дублей
+        await ack_offset(bot, offsets.get(bot.id))
+
+        tenant = tenant_for(bot)
+        # получатели — из ResultStore в памяти: файл на диске отстаёт на интервал сброса
+        tenant.broadcaster = Broadcaster(
+            bot, checkpoint=tenant.checkpoint_path(), legacy=bot is bots[0], state=lambda: RESULTS.state,
+        )
+        tenant.broadcaster.resume()
+
+    # апдейты, которые старый инстанс начал, но не закончил (Telegram их уже не пришлёт);
+    # ссылки на задачи держим до выхода, иначе их может собрать GC
+    resumed = resume_updates(dp, bots, unfinished)
+    if resumed:
+        log.info("snapshot: прогоняем %d недоделанных апдейтов", len(resumed))
+
+    # наступившие напоминания (в т.ч. пропущенные, пока бот лежал) — в фоне
+    REMINDERS.start()
+
+    # периодически чистим простаивающие сессии и пишем метрики памяти
+    async def housekeeping():
+        while True:
+            await asyncio.sleep(300)
+            storage.sweep(limit=None)
+            log.info("fsm sessions: %s; logs: %s", storage.stats(), logging_stats())
+            log.info("http pool: %s", session.stats())
+            log.info("ingress: %s", serial.stats())
+            log.info("reminders: %s", REMINDERS.stats())
+            log.info("adaptive saved: %s", saved_stats())
+    housekeeping_task = asyncio.create_task(housekeeping())
+
+    async def flush_stats():
+        while True:
+            await asyncio.sleep(ITEMSTATS_FLUSH)
+            ITEM_STATS.flush()
+            await RESULTS.flush_async()
+            if recorder:
+                recorder.flush_async()
+    stats_task = asyncio.create_task(flush_stats())
+
+    # карточки рисуем в фоне: до готовности недостающие дорисуются по запросу.
+    # Рендер — по разу на обложку, заливка — каждым ботом (file_id у ботов свои)
+    async def warmup_cards():
+        for cards in card_caches():
+            await cards.prerender(TESTS)
+        for bot in bots:
+            tenant = tenant_for(bot)
+            if CARD_UPLOAD_CHAT_ID:
+                await tenant.cards.preupload(bot, CARD_UPLOAD_CHAT_ID, tenant.tests(TESTS))
+            # карточки с file_id (залитые или из снимка) — сразу в inline-ответы
+            for outcome in iter_outcomes(tenant.tests(TESTS)):
+                card = await tenant.cards.get(outcome)
+                if card:
+                    INLINE.remember_photo(bot.id, outcome, file_id_for(bot.id, card))
+    cards_task = asyncio.create_task(warmup_cards())
+
+    log.info("✅ MBTI бот запущен: %s", ", ".join(tenant_for(b).name for b in bots))
+    # SIGTERM/SIGINT aiogram ловит сам: перестаём тянуть апдейты,
+    # дальше дожидаемся начатых, сохраняем снимок и только потом закрываем сессии
+    try:
+        await dp.start_polling(*bots, handle_as_tasks=True, close_bot_session=False)
+    finally:
+        housekeeping_task.cancel()
+        stats_task.cancel()
+        await tracker.drain()
+        for bot in bots:
+            await tenant_for(bot).broadcaster.stop()
+        await REMINDERS.stop()
+        save_snapshot(storage, {**offsets, **tracker.offsets}, tracker.unfinished())
+        ITEM_STATS.flush()
+        RESULTS.flush()
+        QUESTION_IMAGES.close()
+        if recorder:
+            await recorder.close()
+        await session.close()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
@@ -0,0 +1,383 @@
+# app/broadcast.py — рассылка по всем известным чатам (с лимитами и чекпоинтами)
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+)
+from aiogram.types import InlineKeyboardMarkup
+
+from app.fileio import atomic_write_json
+from app.media import has_file_id, photo_input, remember_photo
+
+log = logging.getLogger("mbti_bot.broadcast")
+
+ROOT_DIR = Path(__file__).resolve().parent
+STATE_FILE = ROOT_DIR / "data" / "state.json"
+CHECKPOINT_FILE = Path(os.getenv("BROADCAST_CHECKPOINT") or ROOT_DIR / "data" / "broadcast.json")
+
+# Глобальный лимит Bot API ~30 сообщений/сек на бота — фоновым отправкам (рассылка
+# и напоминания вместе) даём с запасом, чтобы интерактивным тестам оставалась своя доля.
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+
+# Ошибки, после которых чат больше не трогаем
+_DEAD_CHAT_MARKERS = ("chat not found", "user is deactivated", "bot was kicked", "have no rights")
+
+
+class RateLimiter:
+    """ Простой token bucket: не больше rate операций в секунду (с небольшим burst). """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """ После flood-wait от Telegram ждут все отправители, а не один. """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# bot.id → общий лимитер фоновых отправок этого бота
+_LIMITERS: Dict[int, RateLimiter] = {}
+
+
+def limiter_for(bot_id: int) -> RateLimiter:
+    """ Один лимитер на бота: рассылка и напоминания делят BROADCAST_RATE, а не складываются. """
+    limiter = _LIMITERS.get(bot_id)
+    if limiter is None:
+        limiter = _LIMITERS[bot_id] = RateLimiter(BROADCAST_RATE)
+    return limiter
+
+
+def read_state(state_file: Path = STATE_FILE) -> Dict[str, Any]:
+    try:
+        return json.loads(state_file.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        log.warning("state.json не прочитан: %s", e)
+        return {}
+
+
+def _snapshot_sources(state: Dict[str, Any], bot_id: Optional[int], legacy: bool) -> Tuple[List[List[Any]], List[Tuple[Any, Any]]]:
+    """
+    Ключи секций state — снимком на цикле: list(dict) копирует ссылки на уровне C,
+    без разбора и сортировки (записи last_results заменяются целиком, не меняются на месте).
+    """
+    chats: List[List[Any]] = []
+    results: List[Tuple[Any, Any]] = []
+    by_bot = state.get("chats") or {}
+    if bot_id is None:
+        chats.extend(list(ids) for ids in list(by_bot.values()))
+    else:
+        chats.append(list(by_bot.get(str(bot_id)) or {}))
+    if bot_id is None or legacy:
+        # last_results — по пользователю, чат лежит внутри (в группе это не одно и то же)
+        results = list((state.get("last_results") or {}).items())
+        for section in ("last_mbti", "last_traits"):
+            chats.append(list(state.get(section) or {}))
+    return chats, results
+
+
+def _sorted_recipients(chats: List[List[Any]], results: List[Tuple[Any, Any]], after: Optional[int]) -> List[int]:
+    """ В потоке: разбор, дедупликация и сортировка — на миллионах чатов это секунды. """
+    ids: Set[int] = set()
+    raw_chats = [raw for section in chats for raw in section]
+    for raw, rec in results:
+        if isinstance(rec, dict) and "bot" in rec:
+            continue  # новые записи уже учтены в "chats"
+        raw_chats.append(rec.get("chat", raw) if isinstance(rec, dict) else raw)
+    for raw in raw_chats:
+        try:
+            ids.add(int(raw))
+        except (TypeError, ValueError):
+            continue
+    if after is not None:
+        ids = {c for c in ids if c > after}
+    return sorted(ids)
+
+
+async def load_recipients(
+    state: Dict[str, Any],
+    after: Optional[int] = None,
+    bot_id: Optional[int] = None,
+    legacy: bool = True,
+) -> List[int]:
+    """
+    Известные чаты из state (ResultStore.state, в памяти) — по возрастанию chat_id, без
+    повторов, строго после after. Порядок задаёт сам chat_id, а не позиция в списке:
+    новые записи (бот дописывает их на ходу) не сдвигают курсор незаконченной рассылки.
+
+    bot_id — только чаты этого бота ("chats" → {bot_id: {chat_id: ...}}); legacy — плюс записи
+    без бота (старый однобот: last_mbti, last_traits, last_results без "bot").
+    """
+    chats, results = _snapshot_sources(state, bot_id, legacy)
+    return await asyncio.to_thread(_sorted_recipients, chats, results, after)
+
+
+class Broadcaster:
+    """
+    Одна активная рассылка за раз. Прогресс (курсор — chat_id, до которого включительно
+    всё отправлено) лежит в CHECKPOINT_FILE — после падения продолжаем с курсора.
+    «Мёртвые» чаты — в соседнем <checkpoint>.blocked, по id на строку: файл только
+    дописывается новыми, так что сохранение не пересортировывает и не переписывает весь список.
+    Получатели — из state() (по умолчанию ResultStore.state бота), запись — в потоке.
+    При нескольких ботах — по рассыльщику на бота, у каждого свой чекпоинт и свои получатели;
+    legacy=True — бот, которому достаются записи старого однобота без bot_id.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        checkpoint: Path = CHECKPOINT_FILE,
+        limiter: Optional[RateLimiter] = None,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        legacy: bool = True,
+        state: Optional[Callable[[], Dict[str, Any]]] = None,
+    ):
+        self.bot = bot
+        self.legacy = legacy
+        self.checkpoint = checkpoint
+        self.blocked_file = checkpoint.with_suffix(".blocked")
+        self.limiter = limiter or limiter_for(bot.id)
+        self.concurrency = concurrency
+        self.source = state
+        self.task: Optional[asyncio.Task] = None
+        self._upload_lock = asyncio.Lock()
+        self._save_lock = asyncio.Lock()
+        self.state: Dict[str, Any] = self._load()
+        self.blocked: Optional[Set[int]] = None   # читается лениво, в потоке
+        self._new_blocked: List[int] = []          # ещё не дописаны в .blocked
+
+    # ----- чекпоинт -----
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.checkpoint.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {"campaign": None}
+        except Exception as e:
+            log.warning("broadcast checkpoint не прочитан: %s", e)
+            return {"campaign": None}
+
+    def _read_blocked(self) -> Set[int]:
+        blocked: Set[int] = set()
+        try:
+            with open(self.blocked_file, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        blocked.add(int(line))
+                    except ValueError:
+                        continue  # недописанная строка при падении
+        except FileNotFoundError:
+            pass
+        return blocked
+
+    async def _load_blocked(self) -> Set[int]:
+        if self.blocked is None:
+            self.blocked = await asyncio.to_thread(self._read_blocked)
+            # чекпоинт старого формата: список целиком в json — переносим в .blocked
+            legacy = self.state.pop("blocked", None) or []
+            fresh = [int(c) for c in legacy if int(c) not in self.blocked]
+            self.blocked.update(fresh)
+            self._new_blocked.extend(fresh)
+        return self.blocked
+
+    def _write(self, state: Dict[str, Any], new_blocked: List[int]) -> None:
+        """ В потоке: сначала дописываем заблокированных, потом курсор. """
+        if new_blocked:
+            self.blocked_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.blocked_file, "a", encoding="utf-8") as f:
+                f.write("".join(f"{c}\n" for c in new_blocked))
+        atomic_write_json(self.checkpoint, state)
+
+    def _save(self) -> None:
+        """ Синхронно — только на старте (resume). """
+        self._write(self.state, [])
+
+    async def _save_async(self) -> None:
+        async with self._save_lock:
+            new_blocked, self._new_blocked = self._new_blocked, []
+            # campaign — маленький словарь: копия на цикле, json и диск — в потоке
+            snapshot = {**self.state, "campaign": dict(self.campaign) if self.campaign else None}
+            try:
+                await asyncio.to_thread(self._write, snapshot, new_blocked)
+            except OSError as e:
+                self._new_blocked[:0] = new_blocked
+                log.warning("broadcast checkpoint не сохранён: %s", e)
+
+    @property
+    def campaign(self) -> Optional[Dict[str, Any]]:
+        return self.state.get("campaign")
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    # ----- запуск -----
+
+    def start(
+        self,
+        text: str,
+        photo: Optional[str] = None,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+    ) -> Dict[str, Any]:
+        if self.running:
+            raise RuntimeError("рассылка уже идёт")
+        self.state["campaign"] = {
+            "id": uuid.uuid4().hex[:8],
+            "text": text,
+            "photo": photo,
+            "reply_markup": reply_markup.model_dump(exclude_none=True) if reply_markup else None,
+            "after": None,
+            "sent": 0,
+            "failed": 0,
+            "blocked": 0,
+            "done": False,
+        }
+        # чекпоинт пишет сама задача первым делом (в потоке)
+        self.task = asyncio.create_task(self._run())
+        return self.state["campaign"]
+
+    def resume(self) -> bool:
+        """ Досылаем незавершённую рассылку (вызывается на старте бота). """
+        camp = self.campaign
+        if not camp or camp.get("done") or self.running:
+            return False
+        if "after" not in camp:
+            # чекпоинт старого формата: курсор — позиция в списке, который с тех пор сдвинулся.
+            # Лучше недослать, чем разослать части чатов повторно
+            log.warning("broadcast %s: чекпоинт старого формата, не продолжаем", camp["id"])
+            camp["done"] = True
+            self._save()
+            return False
+        log.info("broadcast %s: продолжаем после чата %s", camp["id"], camp["after"])
+        self.task = asyncio.create_task(self._run())
+        return True
+
+    async def stop(self) -> None:
+        """ Останавливаем на рестарте: курсор сохранится в finally, новый инстанс доберёт. """
+        if not self.running:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    # ----- основной цикл -----
+
+    async def _recipients(self, after: Optional[int]) -> List[int]:
+        state = self.source() if self.source else await asyncio.to_thread(read_state)
+        return await load_recipients(state, after=after, bot_id=self.bot.id, legacy=self.legacy)
+
+    async def _run(self) -> None:
+        camp = self.campaign
+        await self._save_async()
+        blocked = await self._load_blocked()
+        markup = InlineKeyboardMarkup(**camp["reply_markup"]) if camp.get("reply_markup") else None
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        pending: Set[int] = set()    # чаты в работе — для честного курсора
+        produced = camp["after"]     # всё до него включительно уже отдано воркерам
+        last_save = time.monotonic()
+
+        async def worker():
+            nonlocal last_save
+            while True:
+                chat_id = await queue.get()
+                if chat_id is None:
+                    return
+                status = await self._send_one(chat_id, camp["text"], camp.get("photo"), markup)
+                camp[status] += 1
+                if status == "blocked":
+                    blocked.add(chat_id)
+                    self._new_blocked.append(chat_id)
+                pending.discard(chat_id)
+                # чаты идут по возрастанию: всё левее самого младшего в работе — готово
+                camp["after"] = min(pending) - 1 if pending else produced
+                if time.monotonic() - last_save > 2:
+                    last_save = time.monotonic()
+                    await self._save_async()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for chat_id in await self._recipients(camp["after"]):
+                if chat_id not in blocked:
+                    pending.add(chat_id)
+                    await queue.put(chat_id)
+                produced = chat_id
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            camp["after"] = produced
+            camp["done"] = True
+            log.info(
+                "broadcast %s завершена: sent=%d failed=%d blocked=%d",
+                camp["id"], camp["sent"], camp["failed"], camp["blocked"],
+            )
+        finally:
+            for w in workers:
+                w.cancel()
+            await self._save_async()
+
+    async def _send_one(
+        self,
+        chat_id: int,
+        text: str,
+        photo: Optional[str],
+        markup: Optional[InlineKeyboardMarkup],
+    ) -> str:
+        while True:
+            await self.limiter.acquire()
+            try:
+                if photo and not has_file_id(self.bot.id, photo):
+                    # первую загрузку делаем одну: остальные ждут file_id
+                    async with self._upload_lock:
+                        if not has_file_id(self.bot.id, photo):
+                            msg = await self.bot.send_photo(chat_id, photo_input(self.bot.id, photo), caption=text, reply_markup=markup)
+                            remember_photo(self.bot.id, photo, msg)
+                            return "sent"
+                if photo:
+                    await self.bot.send_photo(chat_id, photo_input(self.bot.id, photo), caption=text, reply_markup=markup)
+                else:
+                    await self.bot.send_message(chat_id, text, reply_markup=markup)
+                return "sent"
+            except TelegramRetryAfter as e:
+                log.warning("broadcast flood wait %ss", e.retry_after)
+                self.limiter.pause(e.retry_after)
+            except TelegramForbiddenError:
+                return "blocked"
+            except TelegramBadRequest as e:
+                if any(m in str(e).lower() for m in _DEAD_CHAT_MARKERS):
+                    return "blocked"
+                log.warning("broadcast %s: %s", chat_id, e)
+                return "failed"
+            except Exception as e:
+                log.warning("broadcast %s: %s", chat_id, e)
+                return "failed"
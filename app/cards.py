@@ -0,0 +1,186 @@
+# app/cards.py — карточки результатов (итог поверх фирменной обложки)
+
+import asyncio
+import hashlib
+import logging
+import os
+import textwrap
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # без Pillow остаётся общая обложка full.png
+    Image = None
+
+from app.assets import content_hash
+from app.media import has_file_id, photo_input, remember_photo
+
+log = logging.getLogger("mbti_bot.cards")
+
+ROOT_DIR = Path(__file__).resolve().parent
+CARDS_DIR = Path(os.getenv("CARDS_DIR") or ROOT_DIR / "data" / "cards")
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "256"))
+CARD_RENDER_THREADS = int(os.getenv("CARD_RENDER_THREADS", "2"))
+
+_FONT_CANDIDATES = (
+    os.getenv("CARD_FONT", ""),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+)
+
+
+def _font(size: int):
+    for path in _FONT_CANDIDATES:
+        if path and Path(path).exists():
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size)
+
+
+def iter_outcomes(tests: Dict[str, Dict[str, Any]]) -> Iterator[Dict[str, str]]:
+    """ Все конечные исходы: 16 типов MBTI и полосы sum-тестов (ключи как в bot.result_outcome). """
+    for slug, test in tests.items():
+        results = test.get("results", {})
+        if slug == "mbti" or test.get("type") == "mbti":
+            for typ, desc in results.items():
+                if len(typ) == 4 and not typ.startswith("_"):
+                    yield {"key": f"{slug}:{typ}", "title": typ, "text": desc, "test": test["title"]}
+        elif test.get("type") == "sum":
+            for i, band in enumerate(results.get("bands", [])):
+                yield {
+                    "key": f"{slug}:{i}",
+                    "title": band.get("title", "—"),
+                    "text": band.get("text", ""),
+                    "test": test["title"],
+                }
+
+
+def _plain(text: str) -> str:
+    """ Эмодзи шрифт не нарисует — убираем символы вне BMP и вариационные селекторы. """
+    return "".join(ch for ch in text if ord(ch) <= 0xFFFF and not 0xFE00 <= ord(ch) <= 0xFE0F).strip()
+
+
+def render_card(base: str, heading: str, title: str, text: str, out: Path) -> Path:
+    """ Рисуем карточку: затемнённая плашка снизу, название теста, итог, короткое описание. """
+    img = Image.open(base).convert("RGB")
+    w, h = img.size
+    panel_top = int(h * 0.52)
+    overlay = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    dr = ImageDraw.Draw(overlay)
+    dr.rectangle([(0, panel_top), (w, h)], fill=(12, 12, 20, 185))
+    img = Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
+
+    dr = ImageDraw.Draw(img)
+    pad = int(w * 0.06)
+    y = panel_top + pad // 2
+    heading, title, text = _plain(heading), _plain(title), _plain(text)
+    dr.text((pad, y), heading, font=_font(int(w * 0.035)), fill=(210, 210, 225))
+    y += int(w * 0.06)
+    dr.text((pad, y), title, font=_font(int(w * 0.085)), fill=(255, 255, 255))
+    y += int(w * 0.12)
+    body = _font(int(w * 0.036))
+    for line in textwrap.wrap(text, width=40)[:6]:
+        dr.text((pad, y), line, font=body, fill=(235, 235, 240))
+        y += int(w * 0.048)
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".tmp")
+    img.save(tmp, "JPEG", quality=88, optimize=True)
+    os.replace(tmp, out)
+    return out
+
+
+class CardCache:
+    """
+    Карточки лежат на диске (имя = хэш содержимого исхода и обложки),
+    в памяти — ограниченный LRU «ключ → путь». Недостающие рисуем в пуле потоков,
+    одновременные запросы одной карточки ждут один и тот же рендер.
+    """
+
+    def __init__(self, base_image: Optional[str], max_items: int = CARD_CACHE_SIZE):
+        self.base = base_image
+        self.max_items = max_items
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=CARD_RENDER_THREADS, thread_name_prefix="cards")
+        self._base_sha = content_hash(base_image)[:12] if base_image else ""
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and self.base is not None
+
+    def _path(self, outcome: Dict[str, str]) -> Path:
+        raw = "|".join((self._base_sha, outcome["key"], outcome.get("test", ""), outcome["title"], outcome["text"]))
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+        return CARDS_DIR / f"{outcome['key'].replace(':', '_')}-{digest}.jpg"
+
+    def _remember(self, key: str, path: str) -> None:
+        self._lru[key] = path
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    async def get(self, outcome: Dict[str, str]) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = outcome["key"]
+        path = self._lru.get(key)
+        if path:
+            self._lru.move_to_end(key)
+            return path
+        out = self._path(outcome)
+        if out.exists():
+            self._remember(key, str(out))
+            return str(out)
+
+        fut = self._inflight.get(key)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = loop.run_in_executor(
+                self._pool, render_card, self.base,
+                outcome.get("test", ""), outcome["title"], outcome["text"], out,
+            )
+            self._inflight[key] = fut
+        try:
+            await fut
+        except Exception as e:
+            log.warning("card %s не нарисована: %s", key, e)
+            return None
+        finally:
+            self._inflight.pop(key, None)
+        self._remember(key, str(out))
+        return str(out)
+
+    async def prerender(self, tests: Dict[str, Dict[str, Any]]) -> Tuple[int, int]:
+        """ На старте: рисуем все недостающие исходы (в фоне, не блокируя цикл). """
+        if not self.enabled:
+            return 0, 0
+        outcomes = list(iter_outcomes(tests))
+        missing = sum(1 for o in outcomes if not self._path(o).exists())
+        await asyncio.gather(*(self.get(o) for o in outcomes))
+        log.info("cards: %d исходов, дорисовано %d", len(outcomes), missing)
+        return len(outcomes), missing
+
+    async def preupload(self, bot, chat_id: int, tests: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Заливаем карточки в служебный чат, чтобы у всех были file_id этого бота
+        ещё до первого пользователя (сообщение сразу удаляем).
+        """
+        uploaded = 0
+        for outcome in iter_outcomes(tests):
+            path = await self.get(outcome)
+            if not path or has_file_id(bot.id, path):
+                continue
+            try:
+                msg = await bot.send_photo(chat_id, photo_input(bot.id, path))
+                remember_photo(bot.id, path, msg)
+                uploaded += 1
+                await bot.delete_message(chat_id, msg.message_id)
+            except Exception as e:
+                log.warning("card preupload %s: %s", outcome["key"], e)
+            await asyncio.sleep(0.2)  # не мешаем интерактивному трафику
+        log.info("cards: залито %d карточек", uploaded)
+        return uploaded
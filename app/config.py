@@ -1,6 +1,10 @@
 # app/config.py
+import json
 import os
 from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,8 +13,46 @@ load_dotenv()
 class Settings:
     bot_token: str
 
+@dataclass(frozen=True)
+class BotConfig:
+    """ Один брендированный бот: токен, своя папка обложек, свой набор тестов. """
+    token: str
+    name: str = "main"
+    branding_dir: Optional[str] = None
+    slugs: Optional[Tuple[str, ...]] = None  # None — все тесты каталога
+
 def get_settings() -> Settings:
     token = os.getenv("BOT_TOKEN", "").strip()
     if not token:
         raise RuntimeError("BOT_TOKEN не задан в .env")
     return Settings(bot_token=token)
+
+def get_bot_configs() -> List[BotConfig]:
+    """
+    BOTS — JSON-список (или путь к .json-файлу) вида
+      [{"token": "...", "name": "brand1", "branding_dir": "/brands/1", "slugs": ["mbti", "burnout"]}, ...]
+    Без BOTS — один бот из BOT_TOKEN.
+    """
+    raw = os.getenv("BOTS", "").strip()
+    if not raw:
+        return [BotConfig(token=get_settings().bot_token)]
+    if not raw.startswith("["):
+        raw = Path(raw).read_text(encoding="utf-8")
+    items = json.loads(raw)
+    configs: List[BotConfig] = []
+    for i, item in enumerate(items):
+        token = str(item.get("token", "")).strip()
+        if not token:
+            raise RuntimeError(f"BOTS[{i}]: не задан token")
+        slugs = item.get("slugs")
+        configs.append(BotConfig(
+            token=token,
+            name=item.get("name") or f"bot{i}",
+            branding_dir=item.get("branding_dir"),
+            slugs=tuple(slugs) if slugs else None,
+        ))
+    if not configs:
+        raise RuntimeError("BOTS пуст")
+    if len({c.name for c in configs}) != len(configs):
+        raise RuntimeError("BOTS: имена ботов должны быть уникальны")
+    return configs
@@ -0,0 +1,18 @@
+# app/fileio.py — атомарная запись файлов состояния (через .tmp и os.replace)
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """ Пишем рядом во временный файл и подменяем: при падении остаётся старая версия целиком. """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def atomic_write_json(path: Path, payload: Any) -> None:
+    atomic_write_bytes(path, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
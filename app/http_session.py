@@ -0,0 +1,185 @@
+# app/http_session.py — общий HTTP-клиент Bot API: пул соединений, таймауты, загрузки через mmap
+#
+# Один TunedSession на все боты процесса: соединения к api.telegram.org живут в пуле
+# (keep-alive), DNS кэшируется, мелкие вызовы и загрузки файлов — с разными таймаутами.
+# Метрики пула (сколько запросов ждут свободное соединение) — в stats().
+
+import asyncio
+import mmap
+import os
+import time
+from typing import Any, AsyncGenerator, BinaryIO, Dict, Optional, Tuple, Union
+
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import Bot, __version__ as aiogram_version
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import InputFile
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "60"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+# мелкие вызовы (sendMessage, answerCallbackQuery, …) и загрузки файлов
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_UPLOAD_TIMEOUT = float(os.getenv("HTTP_UPLOAD_TIMEOUT", "120"))
+
+UPLOAD_CHUNK = 256 * 1024
+
+
+class MmapInputFile(InputFile):
+    """
+    Файл с диска для загрузки: отображаем в память и отдаём крупными кусками.
+    open/mmap и каждый срез (копия из page cache, а при промахе — чтение с диска
+    через page fault) идут в пуле потоков, чтобы не останавливать цикл.
+    Против FSInputFile — куски в 4 раза крупнее и один mmap вместо read на кусок.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], filename: Optional[str] = None, chunk_size: int = UPLOAD_CHUNK):
+        super().__init__(filename=filename or os.path.basename(path), chunk_size=chunk_size)
+        self.path = path
+
+    def _open(self) -> Tuple[BinaryIO, Optional[mmap.mmap]]:
+        f = open(self.path, "rb")
+        try:
+            if not os.fstat(f.fileno()).st_size:
+                return f, None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            f.close()
+            raise
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)  # читаем подряд — ядру можно читать вперёд
+        return f, mm
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        f, mm = await asyncio.to_thread(self._open)
+        try:
+            if mm is None:
+                return
+            # срез mmap — копия; memoryview не отдаём:
+            # транспорт может держать кусок дольше, чем живёт отображение
+            for pos in range(0, len(mm), self.chunk_size):
+                yield await asyncio.to_thread(mm.__getitem__, slice(pos, pos + self.chunk_size))
+        finally:
+            if mm is not None:
+                mm.close()
+            f.close()
+
+
+class PoolStats:
+    """ Счётчики пула по trace-хукам aiohttp. """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+        self.uploads = 0
+        self.waiting = 0          # сейчас ждут свободное соединение
+        self.waited = 0           # всего ждали
+        self.wait_max_ms = 0.0
+        self.created = 0          # новых соединений
+        self.reused = 0           # взято из пула
+
+    def trace_config(self) -> TraceConfig:
+        tc = TraceConfig()
+
+        async def queued_start(session, ctx, params):
+            ctx.queued_at = time.perf_counter()
+            self.waiting += 1
+            self.waited += 1
+
+        async def queued_end(session, ctx, params):
+            self.waiting -= 1
+            self.wait_max_ms = max(self.wait_max_ms, (time.perf_counter() - ctx.queued_at) * 1000)
+
+        async def created(session, ctx, params):
+            self.created += 1
+
+        async def reused(session, ctx, params):
+            self.reused += 1
+
+        tc.on_connection_queued_start.append(queued_start)
+        tc.on_connection_queued_end.append(queued_end)
+        tc.on_connection_create_end.append(created)
+        tc.on_connection_reuseconn.append(reused)
+        return tc
+
+    def snapshot(self, limit: int) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "peak": self.peak,
+            "limit": limit,
+            "saturated": self.waiting > 0,
+            "waiting": self.waiting,
+            "waited": self.waited,
+            "wait_max_ms": round(self.wait_max_ms, 1),
+            "requests": self.requests,
+            "uploads": self.uploads,
+            "conn_created": self.created,
+            "conn_reused": self.reused,
+        }
+
+
+class TunedSession(AiohttpSession):
+    """ AiohttpSession с настраиваемым пулом, keep-alive, DNS-кэшем и раздельными таймаутами. """
+
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        keepalive: float = HTTP_KEEPALIVE,
+        dns_ttl: int = HTTP_DNS_TTL,
+        timeout: float = HTTP_TIMEOUT,
+        upload_timeout: float = HTTP_UPLOAD_TIMEOUT,
+        **kwargs: Any,
+    ):
+        super().__init__(limit=limit, timeout=timeout, **kwargs)
+        self.limit = limit
+        self.upload_timeout = upload_timeout
+        self._connector_init.update(keepalive_timeout=keepalive, ttl_dns_cache=dns_ttl)
+        self.pool = PoolStats()
+
+    async def create_session(self) -> ClientSession:
+        # как в AiohttpSession, плюс trace-хуки для метрик пула
+        if self._should_reset_connector:
+            await self.close()
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{aiogram_version}"},
+                trace_configs=[self.pool.trace_config()],
+            )
+            self._should_reset_connector = False
+        return self._session
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        # таймаут выбираем до отправки: загрузки ждём дольше, getUpdates передаёт свой
+        if timeout is None and _has_upload(method):
+            timeout = self.upload_timeout
+            self.pool.uploads += 1
+        self.pool.requests += 1
+        self.pool.in_flight += 1
+        self.pool.peak = max(self.pool.peak, self.pool.in_flight)
+        try:
+            return await super().make_request(bot, method, timeout=timeout)
+        finally:
+            self.pool.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return self.pool.snapshot(self.limit)
+
+
+def _has_upload(method: TelegramMethod) -> bool:
+    for value in method.__dict__.values():
+        if isinstance(value, InputFile):
+            return True
+        media = getattr(value, "media", None)
+        if isinstance(media, InputFile):
+            return True
+        if isinstance(value, list) and any(isinstance(getattr(v, "media", None), InputFile) for v in value):
+            return True
+    return False
@@ -0,0 +1,113 @@
+# app/httpbench.py — бенчмарк HTTP-слоя против локальной заглушки Bot API
+#
+#   python -m app.httpbench [запросов] [параллельно]
+#
+# Поднимает aiohttp-сервер, отвечающий как Bot API, и сравнивает штатный
+# AiohttpSession с TunedSession: мелкие вызовы (sendMessage) и загрузки (sendPhoto:
+# FSInputFile против MmapInputFile). Печатает p50/p99 и счётчики пула.
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import FSInputFile
+
+from app.http_session import MmapInputFile, TunedSession
+
+TOKEN = "42:BENCH"
+UPLOAD_SIZE = 2 * 1024 * 1024
+
+
+def _message(chat_id: int, photo: bool) -> Dict[str, Any]:
+    msg: Dict[str, Any] = {"message_id": 1, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+    if photo:
+        msg["photo"] = [{"file_id": "bench", "file_unique_id": "bench", "width": 1, "height": 1}]
+    return msg
+
+
+async def _handle(request: web.Request) -> web.Response:
+    method = request.match_info["method"].lower()
+    await request.read()  # как настоящий сервер: тело принимаем целиком
+    return web.json_response({"ok": True, "result": _message(1, photo=method == "sendphoto")})
+
+
+async def start_stub_api() -> web.AppRunner:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/bot{token}/{method}", _handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+def _port(runner: web.AppRunner) -> int:
+    return runner.addresses[0][1]
+
+
+async def _measure(n: int, concurrency: int, call: Callable[[], Awaitable[Any]]) -> Dict[str, float]:
+    sem = asyncio.Semaphore(concurrency)
+    lat: List[float] = []
+
+    async def one():
+        async with sem:
+            t = time.perf_counter()
+            await call()
+            lat.append((time.perf_counter() - t) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    wall = time.perf_counter() - started
+    lat.sort()
+    return {
+        "rps": n / wall,
+        "p50": statistics.median(lat),
+        "p99": lat[min(len(lat) - 1, int(len(lat) * 0.99))],
+    }
+
+
+async def run(n: int = 2000, concurrency: int = 50) -> List[Dict[str, Any]]:
+    runner = await start_stub_api()
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{_port(runner)}")
+    fd, upload = tempfile.mkstemp(suffix=".jpg")
+    os.write(fd, os.urandom(UPLOAD_SIZE))
+    os.close(fd)
+    rows: List[Dict[str, Any]] = []
+    try:
+        for name, session in (("aiohttp default", AiohttpSession(api=api)), ("tuned", TunedSession(api=api))):
+            bot = Bot(TOKEN, session=session)
+            small = await _measure(n, concurrency, lambda: bot.send_message(1, "bench"))
+            rows.append({"case": f"{name}: sendMessage", **small})
+            for label, make in (("FSInputFile", FSInputFile), ("MmapInputFile", MmapInputFile)):
+                up = await _measure(max(n // 20, 20), min(concurrency, 20), lambda: bot.send_photo(1, make(upload)))
+                rows.append({"case": f"{name}: sendPhoto {label}", **up})
+            if isinstance(session, TunedSession):
+                rows.append({"case": "tuned pool", **session.stats()})
+            await session.close()
+    finally:
+        os.unlink(upload)
+        await runner.cleanup()
+    return rows
+
+
+def format_rows(rows: List[Dict[str, Any]]) -> str:
+    lines = []
+    for r in rows:
+        if "rps" in r:
+            lines.append(f"{r['case']:<40} {r['rps']:>9.0f} rps  p50 {r['p50']:>7.2f} ms  p99 {r['p99']:>7.2f} ms")
+        else:
+            lines.append(f"{r['case']:<40} " + " ".join(f"{k}={v}" for k, v in r.items() if k != "case"))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    conc = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(format_rows(asyncio.run(run(n, conc))))
@@ -0,0 +1,118 @@
+# app/imagegen.py — картинки вопросов на лету (стили make_images_pro.py) с кэшем на диске
+#
+# Нет images/q{N}.jpg — рисуем при первом показе в отдельном процессе (рендер — чистый
+# Python по пикселям, в потоке он держал бы GIL), кладём в images/generated/ теста (отдельно
+# от исходников: их собирает python -m app.assets), дальше — с диска.
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    from make_images_pro import cycle_modes, make_one, question_seed
+except ImportError:  # нет Pillow или скрипта рядом — генерации нет, вопросы уходят текстом
+    make_one = None
+
+log = logging.getLogger("mbti_bot.imagegen")
+
+IMAGE_SIZE = 900
+GENERATED_DIR = "generated"
+IMAGEGEN_WORKERS = int(os.getenv("IMAGEGEN_WORKERS", "1"))
+# сколько первый запросивший ждёт картинку; не успели — вопрос уходит текстом,
+# а рендер доделывается и сохраняется для следующих
+IMAGEGEN_WAIT = float(os.getenv("IMAGEGEN_WAIT", "3"))
+# пул создаётся лениво, когда в процессе уже есть потоки (to_thread, логи, aiohttp):
+# fork скопировал бы чужие захваченные замки — дочерний процесс может зависнуть.
+# forkserver — чистый однопоточный процесс с уже импортированным make_images_pro (Pillow),
+# воркеры форкаются от него; где его нет — spawn. Главный модуль воркеры импортируют
+# заново, поэтому бот запускается как python -m app (см. app/__main__.py), а не app.bot
+IMAGEGEN_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+IMAGEGEN_PRELOAD = ["make_images_pro"]
+
+
+def _render(out: str, slug: str, idx: int) -> str:
+    """ Выполняется в процессе пула. """
+    img = make_one(IMAGE_SIZE, question_seed(slug, idx), cycle_modes(idx))
+    tmp = out + ".tmp"
+    img.save(tmp, "JPEG", quality=90)
+    os.replace(tmp, out)
+    return out
+
+
+class QuestionImages:
+    def __init__(self, workers: int = IMAGEGEN_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return make_one is not None and self.workers > 0
+
+    @staticmethod
+    def target(test_dir: Path, idx: int) -> Path:
+        return test_dir / "images" / GENERATED_DIR / f"q{idx}.jpg"
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            ctx = multiprocessing.get_context(IMAGEGEN_START_METHOD)
+            if IMAGEGEN_START_METHOD == "forkserver":
+                ctx.set_forkserver_preload(IMAGEGEN_PRELOAD)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._pool
+
+    def warm_up(self) -> None:
+        """ Запустить процесс рендера заранее (новый интерпретатор и импорт Pillow — не на первом вопросе). """
+        if self.enabled:
+            self._ensure_pool().submit(os.getpid)
+
+    def _start(self, test_dir: Path, idx: int) -> Optional[asyncio.Future]:
+        out = self.target(test_dir, idx)
+        key = str(out)
+        fut = self._inflight.get(key)
+        if fut is None:
+            self._ensure_pool()
+            out.parent.mkdir(parents=True, exist_ok=True)
+            loop = asyncio.get_running_loop()
+            fut = loop.run_in_executor(self._pool, _render, key, test_dir.name, idx)
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f, k=key: self._done(k, f))
+        return fut
+
+    def _done(self, key: str, fut: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if fut.cancelled():
+            return
+        if fut.exception():
+            log.warning("imagegen %s: %s", key, fut.exception())
+        else:
+            log.info("imagegen: %s", key)
+
+    async def get(self, test_dir: Path, idx: int, wait: float = IMAGEGEN_WAIT) -> Optional[str]:
+        """ Картинка вопроса idx (с 1): из кэша на диске или свежий рендер (ждём не дольше wait). """
+        out = self.target(test_dir, idx)
+        if out.exists():
+            return str(out)
+        if not self.enabled:
+            return None
+        fut = self._start(test_dir, idx)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), wait)
+        except asyncio.TimeoutError:
+            return None
+        except Exception:
+            return None
+
+    def prefetch(self, test_dir: Path, idx: int) -> None:
+        """ Заранее рисуем следующий вопрос, пока пользователь думает над текущим. """
+        if self.enabled and not self.target(test_dir, idx).exists():
+            self._start(test_dir, idx)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
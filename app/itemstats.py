@@ -0,0 +1,309 @@
+# app/itemstats.py — статистика вопросов по потоку ответов (без хранения сырых событий)
+#
+# На каждый вопрос теста — фиксированный кусок массива double:
+#   shown | выборы по вариантам (m) | гистограмма времени ответа (TIME_BUCKETS) |
+#   суммы для дискриминации: n, Σx, Σx², ΣT, ΣT², ΣxT | согласие: agree, agree_n
+# Ответ/показ — пара инкрементов, завершение теста — один проход по ответам сессии.
+# Отчёт считается из этих сумм, сырые события не перечитываются.
+
+import logging
+import math
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.fileio import atomic_write_bytes
+from app.scoring import SCORE_DIM, option_payload
+
+log = logging.getLogger("mbti_bot.itemstats")
+
+ROOT_DIR = Path(__file__).resolve().parent
+ITEMSTATS_PATH = Path(os.getenv("ITEMSTATS_PATH") or ROOT_DIR / "data" / "itemstats.bin")
+ITEMSTATS_FLUSH = float(os.getenv("ITEMSTATS_FLUSH", "60"))
+
+# верхние границы корзин времени ответа (сек); последняя корзина — «дольше»
+TIME_BUCKETS = (0.5, 1, 1.5, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64, 96, 128)
+_NB = len(TIME_BUCKETS) + 1
+_NSUMS = 6
+_MAGIC = b"IST1"
+
+# пороги для пометок в отчёте
+SLOW_MEDIAN = 20.0
+LOW_CORR = 0.2
+LOW_AGREE = 0.6
+
+
+class _Block:
+    """ Счётчики одного теста: плоский array('d') + смещения вопросов. """
+
+    def __init__(self, slug: str, test: Dict[str, Any]):
+        self.slug = slug
+        self.compiled = test["compiled"]
+        self.kind = self.compiled.kind
+        questions = test["questions"]
+        self.shape: Tuple[int, ...] = tuple(min(len(q.get("options", [])), 255) for q in questions)
+        # payload → номер варианта (для одинаковых payload — первый)
+        self.payloads: List[Dict[str, int]] = []
+        for q in questions:
+            m: Dict[str, int] = {}
+            for i, opt in enumerate(q.get("options", [])[:255]):
+                m.setdefault(option_payload(opt, i), i)
+            self.payloads.append(m)
+        self.offsets: List[int] = []
+        size = 0
+        for m in self.shape:
+            self.offsets.append(size)
+            size += 1 + m + _NB + _NSUMS + 2
+        self.data = array("d", bytes(8 * size))
+
+    # ----- раскладка -----
+
+    def _opt(self, qi: int) -> int:
+        return self.offsets[qi] + 1
+
+    def _hist(self, qi: int) -> int:
+        return self.offsets[qi] + 1 + self.shape[qi]
+
+    def _sums(self, qi: int) -> int:
+        return self._hist(qi) + _NB
+
+    def _agree(self, qi: int) -> int:
+        return self._sums(qi) + _NSUMS
+
+
+class ItemStats:
+    def __init__(self, tests: Dict[str, Dict[str, Any]], path: Path = ITEMSTATS_PATH):
+        self.path = path
+        self.blocks: Dict[str, _Block] = {slug: _Block(slug, t) for slug, t in tests.items()}
+        self.dirty = False
+
+    # ----- горячий путь -----
+
+    def shown(self, slug: Optional[str], qi: int) -> None:
+        b = self.blocks.get(slug)
+        if b is None or not 0 <= qi < len(b.shape):
+            return
+        b.data[b.offsets[qi]] += 1
+        self.dirty = True
+
+    def answer(self, slug: Optional[str], qi: int, payload: str, elapsed: Optional[float]) -> None:
+        b = self.blocks.get(slug)
+        if b is None or not 0 <= qi < len(b.shape):
+            return
+        oi = b.payloads[qi].get(payload)
+        if oi is not None:
+            b.data[b._opt(qi) + oi] += 1
+        if elapsed is not None and elapsed >= 0:
+            b.data[b._hist(qi) + bisect_right(TIME_BUCKETS, elapsed)] += 1
+        self.dirty = True
+
+    def complete(self, slug: Optional[str], stash: Dict[str, str]) -> None:
+        """ Конец теста: вклад каждого ответа в дискриминацию (один проход по stash). """
+        b = self.blocks.get(slug)
+        if b is None:
+            return
+        c = b.compiled
+        answers: List[Tuple[int, str]] = []
+        for k, payload in stash.items():
+            try:
+                qi = int(k)
+            except (TypeError, ValueError):
+                continue
+            if payload and 0 <= qi < len(b.shape):
+                answers.append((qi, payload))
+        if not answers:
+            return
+        data = b.data
+
+        if b.kind == "sum":
+            score = c.dim_index.get(SCORE_DIM)
+            xs = [(qi, sum(w for d, w in c.vector(qi, p) if d == score)) for qi, p in answers]
+            total = sum(x for _, x in xs)
+            for qi, x in xs:
+                s = b._sums(qi)
+                data[s] += 1
+                data[s + 1] += x
+                data[s + 2] += x * x
+                data[s + 3] += total
+                data[s + 4] += total * total
+                data[s + 5] += x * total
+        else:
+            final = self._final_dims(b, stash)
+            for qi, p in answers:
+                dims = {d for d, w in c.vector(qi, p) if w > 0}
+                if not dims:
+                    continue
+                a = b._agree(qi)
+                data[a] += 1 if dims & final else 0
+                data[a + 1] += 1
+        self.dirty = True
+
+    @staticmethod
+    def _final_dims(b: _Block, stash: Dict[str, str]) -> set:
+        """ Измерения итога: буквы типа MBTI, трейты профиля или топ-трейты. """
+        c = b.compiled
+        out = c.outcome(stash)
+        if not out:
+            return set()
+        if out["kind"] == "mbti":
+            names = list(out["title"])
+        elif out["kind"] == "profiles":
+            names = c.results.get(out["title"], {}).get("traits", [])
+        else:
+            names = [k for k, _ in out.get("top", [])]
+        return {c.dim_index[n] for n in names if n in c.dim_index}
+
+    # ----- диск -----
+
+    def save(self, path: Optional[Path] = None) -> None:
+        path = path or self.path
+        out = bytearray(_MAGIC)
+        out += struct.pack("<I", len(self.blocks))
+        for slug, b in self.blocks.items():
+            name = slug.encode("utf-8")
+            out += struct.pack("<H", len(name)) + name
+            out += struct.pack("<H", len(b.shape)) + bytes(b.shape)
+            data = array("d", b.data)
+            if sys.byteorder != "little":
+                data.byteswap()
+            out += struct.pack("<I", len(data)) + data.tobytes()
+        atomic_write_bytes(path, bytes(out))
+        self.dirty = False
+
+    def flush(self) -> None:
+        if not self.dirty:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            log.warning("itemstats не сохранена: %s", e)
+
+    def load(self, path: Optional[Path] = None) -> int:
+        """ Подмешиваем сохранённые счётчики; тесты с изменившейся формой пропускаем. """
+        path = path or self.path
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return 0
+        if raw[:4] != _MAGIC:
+            log.warning("itemstats: неизвестный формат %s", path)
+            return 0
+        pos = 4
+        (count,) = struct.unpack_from("<I", raw, pos); pos += 4
+        loaded = 0
+        for _ in range(count):
+            (n,) = struct.unpack_from("<H", raw, pos); pos += 2
+            slug = raw[pos:pos + n].decode("utf-8"); pos += n
+            (nq,) = struct.unpack_from("<H", raw, pos); pos += 2
+            shape = tuple(raw[pos:pos + nq]); pos += nq
+            (size,) = struct.unpack_from("<I", raw, pos); pos += 4
+            data = array("d", raw[pos:pos + 8 * size]); pos += 8 * size
+            if sys.byteorder != "little":
+                data.byteswap()
+            b = self.blocks.get(slug)
+            if b is None or b.shape != shape or len(b.data) != len(data):
+                log.info("itemstats: %s изменился — старая статистика пропущена", slug)
+                continue
+            for i, v in enumerate(data):
+                b.data[i] += v
+            loaded += 1
+        return loaded
+
+    # ----- отчёт -----
+
+    def rows(self, slug: str) -> Iterator[Dict[str, Any]]:
+        b = self.blocks[slug]
+        d = b.data
+        for qi, m in enumerate(b.shape):
+            shown = d[b.offsets[qi]]
+            opts = [d[b._opt(qi) + i] for i in range(m)]
+            answered = sum(opts)
+            hist = [d[b._hist(qi) + i] for i in range(_NB)]
+            row: Dict[str, Any] = {
+                "q": qi + 1,
+                "shown": int(shown),
+                "answered": int(answered),
+                "drop": (1 - answered / shown) if shown else None,
+                "options": [v / answered if answered else 0.0 for v in opts],
+                "median": _hist_quantile(hist, 0.5),
+            }
+            if b.kind == "sum":
+                row["corr"] = _item_rest_corr(*d[b._sums(qi):b._sums(qi) + _NSUMS])
+            else:
+                agree, n = d[b._agree(qi)], d[b._agree(qi) + 1]
+                row["agree"] = agree / n if n else None
+            yield row
+
+
+def _hist_quantile(hist: List[float], q: float) -> Optional[float]:
+    """ Квантиль по гистограмме (линейно внутри корзины). """
+    total = sum(hist)
+    if not total:
+        return None
+    target = q * total
+    acc = 0.0
+    for i, c in enumerate(hist):
+        if acc + c >= target and c:
+            lo = TIME_BUCKETS[i - 1] if i else 0.0
+            hi = TIME_BUCKETS[i] if i < len(TIME_BUCKETS) else TIME_BUCKETS[-1]
+            return lo + (hi - lo) * (target - acc) / c
+        acc += c
+    return float(TIME_BUCKETS[-1])
+
+
+def _item_rest_corr(n, sx, sxx, st, stt, sxt) -> Optional[float]:
+    """ Корреляция балла вопроса с суммой остальных (point-biserial для 0/1-вопросов). """
+    if n < 2:
+        return None
+    # R = T − x: суммы выводятся из накопленных
+    sr = st - sx
+    srr = stt - 2 * sxt + sxx
+    sxr = sxt - sxx
+    cov = n * sxr - sx * sr
+    var_x = n * sxx - sx * sx
+    var_r = n * srr - sr * sr
+    if var_x <= 0 or var_r <= 0:
+        return None
+    return cov / math.sqrt(var_x * var_r)
+
+
+def format_report(stats: ItemStats, slugs: Optional[List[str]] = None) -> str:
+    lines: List[str] = []
+    for slug in slugs or sorted(stats.blocks):
+        if slug not in stats.blocks:
+            lines.append(f"{slug}: нет такого теста")
+            continue
+        kind = stats.blocks[slug].kind
+        metric = "r_it" if kind == "sum" else "agree"
+        lines.append(f"== {slug} ({kind})")
+        lines.append(f"{'q':>3} {'shown':>7} {'drop':>6} {'med,s':>6} {metric:>6}  варианты / пометки")
+        for r in stats.rows(slug):
+            val = r.get("corr") if kind == "sum" else r.get("agree")
+            flags = []
+            if r["median"] is not None and r["median"] > SLOW_MEDIAN:
+                flags.append("медленный")
+            if val is not None and val < (LOW_CORR if kind == "sum" else LOW_AGREE):
+                flags.append("слабый сигнал")
+            if r["answered"] and max(r["options"]) > 0.9:
+                flags.append("почти все выбирают одно")
+            drop = "—" if r["drop"] is None else f"{r['drop']:.0%}"
+            median = "—" if r["median"] is None else f"{r['median']:.1f}"
+            value = "—" if val is None else f"{val:.2f}"
+            opts = "/".join(f"{p:.0%}" for p in r["options"])
+            note = f"  ⚠ {', '.join(flags)}" if flags else ""
+            lines.append(f"{r['q']:>3} {r['shown']:>7} {drop:>6} {median:>6} {value:>6}  {opts}{note}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m app.itemstats [slug ...] — отчёт по сохранённой статистике
+    from app.bot import TESTS
+
+    stats = ItemStats(TESTS)
+    if not stats.load():
+        print(f"нет статистики: {stats.path}")
+    print(format_report(stats, sys.argv[1:] or None))
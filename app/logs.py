@@ -0,0 +1,209 @@
+# app/logs.py — логирование без блокировок цикла: очередь + фоновый поток, лимит повторов
+#
+# Обработчики только кладут запись в очередь (put_nowait); писать в stdout — дело
+# QueueListener в отдельном потоке. Очередь полна — запись выкидываем и считаем.
+# Контекст апдейта (chat_id, slug, handler, latency) подмешивается в каждую запись.
+
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import sys
+import time
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# одно и то же сообщение (логгер + шаблон): не больше BURST штук за WINDOW секунд
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "10"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))
+# апдейты дольше порога — в WARNING с задержкой
+LOG_SLOW_MS = float(os.getenv("LOG_SLOW_MS", "1000"))
+
+# сколько разных ключей помнит лимитер
+_MAX_KEYS = 10_000
+
+# поля, которые выводим как key=value
+FIELDS = ("update_id", "chat_id", "slug", "handler", "latency_ms")
+
+# контекст текущего апдейта (на задачу asyncio — свой)
+LOG_CONTEXT: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("log_context", default=None)
+
+# выброшено из-за полной очереди / подавлено лимитом (по уровню)
+DROPPED: Counter = Counter()
+SUPPRESSED: Counter = Counter()
+
+_listener: Optional[QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """ Переносит поля из LOG_CONTEXT в запись (в потоке, где логируют). """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        ctx = LOG_CONTEXT.get()
+        if ctx:
+            for k, v in ctx.items():
+                if not hasattr(record, k):
+                    setattr(record, k, v)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Лимит повторов по ключу (логгер, шаблон сообщения) или extra={"rl_key": ...}.
+    ERROR и выше не трогаем. Первая запись нового окна сообщает, сколько подавили.
+    """
+
+    def __init__(self, burst: int = LOG_RATE_BURST, window: float = LOG_RATE_WINDOW, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.clock = clock
+        # ключ → [начало окна, сколько пропустили, сколько подавили]
+        self._keys: Dict[Tuple[str, Any], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR or self.burst <= 0:
+            return True
+        key = (record.name, getattr(record, "rl_key", record.msg))
+        now = self.clock()
+        slot = self._keys.get(key)
+        if slot is None or now - slot[0] >= self.window:
+            suppressed = slot[2] if slot else 0
+            if len(self._keys) >= _MAX_KEYS:
+                self._prune(now)
+            self._keys[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if slot[1] < self.burst:
+            slot[1] += 1
+            return True
+        slot[2] += 1
+        SUPPRESSED[record.levelname] += 1
+        return False
+
+    def _prune(self, now: float) -> None:
+        for k in [k for k, s in self._keys.items() if now - s[0] >= self.window]:
+            del self._keys[k]
+        # ключей слишком много и все свежие (например, в ключе id) — начинаем заново
+        if len(self._keys) > _MAX_KEYS // 2:
+            self._keys.clear()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED[record.levelname] += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = [f"{k}={getattr(record, k)}" for k in FIELDS if getattr(record, k, None) is not None]
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            extra.append(f"suppressed={suppressed}")
+        return f"{line} | {' '.join(extra)}" if extra else line
+
+
+def setup_logging(level: str = LOG_LEVEL) -> None:
+    """ Вместо logging.basicConfig: корневой логгер пишет через очередь. Повторный вызов — no-op. """
+    global _listener
+    if _listener is not None:
+        return
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(StructuredFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler = NonBlockingQueueHandler(q)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    _listener = QueueListener(q, out, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging(timeout: float = 5.0) -> None:
+    """ Дописываем всё из очереди (на выходе процесса), но не дольше timeout. """
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    # QueueListener.stop() кладёт стоп-метку через put_nowait и падает на полной очереди
+    try:
+        listener.queue.put(QueueListener._sentinel, timeout=timeout)
+    except queue.Full:
+        return  # stdout стоит — выход процесса не держим
+    if listener._thread is not None:
+        listener._thread.join(timeout)
+
+
+def logging_stats() -> Dict[str, int]:
+    return {"dropped": sum(DROPPED.values()), "suppressed": sum(SUPPRESSED.values())}
+
+
+class LatencyMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: заводит контекст логов для апдейта
+    и пишет медленные апдейты (дольше LOG_SLOW_MS) в WARNING.
+    """
+
+    def __init__(self, slow_ms: float = LOG_SLOW_MS):
+        self.slow_ms = slow_ms
+        self.log = logging.getLogger("mbti_bot.latency")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        chat = data.get("event_chat")
+        ctx: Dict[str, Any] = {"update_id": event.update_id, "chat_id": chat.id if chat else None}
+        token = LOG_CONTEXT.set(ctx)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            if ms >= self.slow_ms:
+                self.log.warning("медленный апдейт %s", event.event_type, extra={"latency_ms": round(ms, 1)})
+            LOG_CONTEXT.reset(token)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """ Inner-middleware: имя хендлера и slug из callback_data («start:slug», «ans:slug:…») — в контекст логов. """
+
+    def __init__(self, slugs: Iterable[str] = ()):
+        self.slugs = set(slugs)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        ctx = LOG_CONTEXT.get()
+        if ctx is not None:
+            h = data.get("handler")
+            if h is not None:
+                ctx["handler"] = getattr(h.callback, "__name__", None)
+            cb_data = getattr(event, "data", None)
+            if isinstance(cb_data, str) and ":" in cb_data:
+                slug = cb_data.split(":", 2)[1]
+                if slug in self.slugs:
+                    ctx["slug"] = slug
+        return await handler(event, data)
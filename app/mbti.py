@@ -1,14 +1,14 @@
 from collections import Counter
-from typing import List, Dict
+from typing import Callable, List, Dict
 
 DIMENSION_PAIRS = [("E","I"),("S","N"),("T","F"),("J","P")]
 
+def mbti_letters(get: Callable[[str], float]) -> str:
+    """get(буква) → счёт; при равенстве берём первую букву пары."""
+    return "".join(a if get(a) >= get(b) else b for a, b in DIMENSION_PAIRS)
+
 def mbti_from_traits(traits: List[str]) -> str:
-    c = Counter(traits)
-    res = []
-    for a,b in DIMENSION_PAIRS:
-        res.append(a if c[a] >= c[b] else b)
-    return "".join(res)
+    return mbti_letters(Counter(traits).__getitem__)
 
 def validate_questions(questions: List[Dict]) -> None:
     for q in questions:
@@ -0,0 +1,39 @@
+# app/media.py
+from typing import Dict, Optional, Union
+
+from aiogram.types import Message
+
+from app.assets import content_hash
+from app.http_session import MmapInputFile
+
+# Кэш file_id загруженных фото: bot.id → {sha256 содержимого → file_id}.
+# Ключ по содержимому: одинаковые картинки под разными путями грузятся один раз.
+# file_id привязан к боту — чужой file_id Telegram не примет.
+FILE_IDS: Dict[int, Dict[str, str]] = {}
+
+
+def media_key(path: str) -> str:
+    try:
+        return content_hash(path)
+    except OSError:
+        return path
+
+
+def has_file_id(bot_id: int, path: str) -> bool:
+    return media_key(path) in FILE_IDS.get(bot_id, ())
+
+
+def file_id_for(bot_id: int, path: str) -> Optional[str]:
+    return FILE_IDS.get(bot_id, {}).get(media_key(path))
+
+
+def photo_input(bot_id: int, path: str) -> Union[str, MmapInputFile]:
+    """ file_id, если этот бот уже загружал такую картинку, иначе файл для загрузки. """
+    return FILE_IDS.get(bot_id, {}).get(media_key(path)) or MmapInputFile(path)
+
+
+def remember_photo(bot_id: int, path: Optional[str], msg: Union[Message, bool, None]) -> None:
+    """ Запоминаем file_id из ответа send_photo/edit_message_media. """
+    if not path or not isinstance(msg, Message) or not msg.photo:
+        return
+    FILE_IDS.setdefault(bot_id, {}).setdefault(media_key(path), msg.photo[-1].file_id)
@@ -0,0 +1,238 @@
+# app/middlewares.py
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+GROUP_CHAT_TYPES = ("group", "supergroup")
+
+# классы приоритета: меньше — важнее
+PRIO_ANSWER, PRIO_DEFAULT, PRIO_START = 0, 1, 2
+PRIO_NAMES = ("answer", "default", "start")
+
+# «дешёвые» ответы при перегрузке: без картинок и клавиатур
+BUSY_TOAST = "⏳ Много желающих — нажми ещё раз через пару секунд"
+BUSY_TEXT = "⏳ Сейчас очень много желающих. Попробуй /start через минуту."
+
+log = logging.getLogger("mbti_bot.ingress")
+
+
+def update_priority(update: TelegramObject) -> int:
+    """ Ответы на вопросы (уже идущий тест) — первыми, новые /start — последними. """
+    if isinstance(update, Update):
+        call = update.callback_query
+        if call is not None and (call.data or "").startswith("ans:"):
+            return PRIO_ANSWER
+        msg = update.message
+        if msg is not None and (msg.text or "").startswith("/start"):
+            return PRIO_START
+    return PRIO_DEFAULT
+
+
+class PriorityGate:
+    """
+    Семафор на slots мест с ограниченной очередью по классам приоритета.
+    Освободившееся место получает самый важный из ждущих (внутри класса — FIFO).
+    Очередь полна: новичок вытесняет самого свежего ждущего из менее важного
+    класса, а если таких нет — отбрасывается сам.
+    """
+
+    def __init__(self, slots: int, max_waiting: int, classes: int = len(PRIO_NAMES)):
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.free = slots
+        self._queues: List[Deque[asyncio.Future]] = [deque() for _ in range(classes)]
+        self.shed: Counter = Counter()
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues)
+
+    def _evict(self, prio: int) -> bool:
+        for worse in range(len(self._queues) - 1, prio, -1):
+            q = self._queues[worse]
+            while q:
+                fut = q.pop()
+                if not fut.done():
+                    fut.set_result(False)
+                    self.shed[worse] += 1
+                    return True
+        return False
+
+    async def acquire(self, prio: int) -> bool:
+        """ True — место получено (потом release), False — апдейт отброшен. """
+        if self.free > 0 and not self.depth:
+            self.free -= 1
+            return True
+        if self.depth >= self.max_waiting and not self._evict(prio):
+            self.shed[prio] += 1
+            return False
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[prio].append(fut)
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.result():
+                self.release()  # место уже передали — возвращаем
+            else:
+                try:
+                    self._queues[prio].remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self) -> None:
+        # место переходит прямо к следующему — без гонки с новичками
+        for q in self._queues:
+            while q:
+                fut = q.popleft()
+                if not fut.done():
+                    fut.set_result(True)
+                    return
+        self.free += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.slots - self.free,
+            "limit": self.slots,
+            "depth": self.depth,
+            **{f"depth_{name}": len(q) for name, q in zip(PRIO_NAMES, self._queues)},
+            **{f"shed_{name}": self.shed[i] for i, name in enumerate(PRIO_NAMES)},
+        }
+
+
+class TokenBucket:
+    """
+    Неблокирующий token bucket: take() либо сразу берёт жетон, либо говорит «нет».
+    Для ответов, которые при перегрузке лучше молча пропустить, чем ставить в очередь.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._stamp = clock()
+
+    def take(self) -> bool:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class _KeySlot:
+    """ Очередь одного ключа: FIFO-замок + счётчик желающих (для уборки). """
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatSerialMiddleware(BaseMiddleware):
+    """
+    Апдейты одного чата идут строго по очереди (в порядке прихода),
+    разные чаты — параллельно, но не больше max_concurrency одновременно.
+    В группах очередь своя у каждого участника (ключ (chat, user)).
+
+    Общий лимит — PriorityGate: при всплеске ответы на вопросы обгоняют новые /start,
+    а сверх max_waiting ждущих лишнее отбрасывается с коротким «занято».
+    Сообщения «занято» идут через TokenBucket на busy_rate в секунду: при шквале /start
+    лишние молча пропускаем — иначе ответы на отброшенное съели бы лимит Bot API.
+    Тосты на кнопки (answer_callback_query) не в счёт: это не сообщения в чат.
+
+    Слоты создаются лениво и удаляются, как только очередь чата опустела,
+    так что память зависит только от числа «живых» чатов.
+    Вешать на dp.update.outer_middleware (после UserContextMiddleware).
+    """
+
+    def __init__(self, max_concurrency: int = 100, max_waiting: int = 1000, busy_rate: float = 5.0):
+        self.max_concurrency = max_concurrency
+        self.gate = PriorityGate(max_concurrency, max_waiting)
+        self.busy_replies = TokenBucket(busy_rate, burst=max(1.0, busy_rate * 2))
+        self.busy_dropped = 0
+        self._slots: Dict[Hashable, _KeySlot] = {}
+
+    @staticmethod
+    def key_for(data: Dict[str, Any]) -> Optional[Hashable]:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        if chat is not None:
+            # в группе у каждого участника своя FSM-сессия (chat, user) —
+            # общий замок на весь чат только выстроил бы всех в одну очередь
+            if chat.type in GROUP_CHAT_TYPES and user is not None:
+                return (chat.id, user.id)
+            return chat.id
+        if user is not None:
+            return ("user", user.id)
+        return None
+
+    @property
+    def active_keys(self) -> int:
+        return len(self._slots)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"chats": len(self._slots), "busy_dropped": self.busy_dropped, **self.gate.stats()}
+
+    async def _run(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        prio = update_priority(event)
+        if not await self.gate.acquire(prio):
+            log.warning("перегрузка: отброшен апдейт (%s)", PRIO_NAMES[prio])
+            await self._busy(event, data)
+            return None
+        try:
+            return await handler(event, data)
+        finally:
+            self.gate.release()
+
+    async def _busy(self, event: TelegramObject, data: Dict[str, Any]) -> None:
+        bot = data.get("bot")
+        if bot is None or not isinstance(event, Update):
+            return
+        try:
+            if event.callback_query is not None:
+                await bot.answer_callback_query(event.callback_query.id, text=BUSY_TOAST)
+            elif event.message is not None:
+                if not self.busy_replies.take():
+                    self.busy_dropped += 1
+                    return
+                await bot.send_message(event.message.chat.id, BUSY_TEXT)
+        except Exception as e:
+            log.info("busy-ответ не ушёл: %s", type(e).__name__)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = self.key_for(data)
+        if key is None:
+            return await self._run(handler, event, data)
+
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _KeySlot()
+        slot.users += 1
+        try:
+            # сначала очередь чата, потом общий лимит — ждущие в очереди
+            # своего чата не занимают глобальные слоты
+            async with slot.lock:
+                return await self._run(handler, event, data)
+        finally:
+            slot.users -= 1
+            if slot.users == 0 and self._slots.get(key) is slot:
+                del self._slots[key]
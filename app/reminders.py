@@ -0,0 +1,366 @@
+# app/reminders.py — отложенные напоминания «пройди тест ещё раз» (колесо корзин на диске)
+#
+# Время режется на корзины по REMINDER_BUCKET секунд; корзина — файл data/reminders/{N}.bin
+# с записями фиксированной длины (добавление — дописать в конец, O(1)). В памяти — только
+# текущая корзина (куча по времени), остальные лежат на диске. Отправленные записи
+# отмечаются в {N}.done (номер записи), так что после рестарта читаем лишь наступившие
+# корзины и не шлём повторно. Корзину, в которой всё отправлено, удаляем. Чтение корзин,
+# отметки и удаление — в потоке, отметки пачкой за проход.
+
+import asyncio
+import heapq
+import logging
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from app.broadcast import RateLimiter, limiter_for
+
+log = logging.getLogger("mbti_bot.reminders")
+
+ROOT_DIR = Path(__file__).resolve().parent
+REMINDERS_DIR = Path(os.getenv("REMINDERS_DIR") or ROOT_DIR / "data" / "reminders")
+REMINDER_BUCKET = int(os.getenv("REMINDER_BUCKET", "3600"))
+# как часто просыпаемся, если ближайшее напоминание далеко (новые корзины, часы)
+REMINDER_POLL = float(os.getenv("REMINDER_POLL", "60"))
+
+# due, bot_id, chat_id, slug
+_REC = struct.Struct("<dqq32s")
+_IDX = struct.Struct("<I")
+
+
+class Reminder(NamedTuple):
+    due: float
+    bot_id: int
+    chat_id: int
+    slug: str
+    bucket: int = 0
+    pos: int = 0
+
+
+Key = Tuple[int, int, str]
+
+
+class ReminderWheel:
+    """
+    Хранилище напоминаний: add() — дописать в корзину, pop_due() — наступившие
+    из текущей корзины (файл корзины читается в потоке), done() — отметить отправленное.
+    Отметки и удаление корзин копятся в памяти и уходят на диск пачкой во flush().
+    На (бот, чат, тест) — одно ожидающее напоминание: повторное add() возвращает уже
+    запланированное. Индекс ключей после рестарта — load_index() (в потоке, по всем
+    корзинам). Часы подменяются (clock).
+    """
+
+    def __init__(self, root: Path = REMINDERS_DIR, bucket: int = REMINDER_BUCKET, clock: Callable[[], float] = time.time):
+        self.root = Path(root)
+        self.bucket = bucket
+        self.clock = clock
+        self.loaded: Optional[int] = None
+        self.loading: Optional[int] = None   # корзина, которую сейчас читает поток
+        self.indexed = False
+        self._heap: List[Tuple[float, int, Reminder]] = []
+        # выданы pop_due, но ещё не done: корзина → номера записей
+        self._outstanding: Dict[int, Set[int]] = {}
+        self._buckets: List[int] = []        # корзины на диске (куча), кроме загруженной
+        self._known: Set[int] = set()
+        self._keys: Dict[Key, Reminder] = {}  # ожидающие — для дедупликации при add()
+        self._late: List[Reminder] = []       # добавлены в корзину, пока её читали
+        self._marks: Dict[int, List[int]] = {}  # отметки .done, ещё не записанные
+        self._drops: Set[int] = set()           # корзины к удалению
+        self._flush_lock = asyncio.Lock()
+        # на старте — только имена файлов, записи не читаем
+        for p in self.root.glob("*.bin"):
+            try:
+                self._note_bucket(int(p.stem))
+            except ValueError:
+                continue
+
+    # ----- диск -----
+
+    def _path(self, b: int, ext: str = "bin") -> Path:
+        return self.root / f"{b}.{ext}"
+
+    def _note_bucket(self, b: int) -> None:
+        if b not in self._known:
+            self._known.add(b)
+            heapq.heappush(self._buckets, b)
+
+    def _read(self, b: int) -> Tuple[List[Reminder], int]:
+        """ В потоке: неотмеченные записи корзины и сколько записей было в файле. """
+        done: Set[int] = set()
+        try:
+            raw = self._path(b, "done").read_bytes()
+            done = {i for (i,) in _IDX.iter_unpack(raw[: len(raw) - len(raw) % _IDX.size])}
+        except FileNotFoundError:
+            pass
+        try:
+            raw = self._path(b).read_bytes()
+        except FileNotFoundError:
+            raw = b""
+        n = len(raw) // _REC.size
+        recs = [
+            Reminder(due, bot_id, chat_id, slug.rstrip(b"\0").decode(), b, pos)
+            for pos, (due, bot_id, chat_id, slug) in enumerate(_REC.iter_unpack(raw[: n * _REC.size]))
+            if pos not in done
+        ]
+        return recs, n
+
+    def _install(self, b: int, recs: List[Reminder], n: int) -> None:
+        # дописанное в корзину во время чтения — если поток его не застал
+        recs += [rem for rem in self._late if rem.pos >= n]
+        self._late = []
+        self.loading = None
+        marked = set(self._marks.get(b, ()))  # отмечены, но ещё не записаны
+        for rem in recs:
+            if rem.pos in marked:
+                continue
+            owner = self._keys.setdefault((rem.bot_id, rem.chat_id, rem.slug), rem)
+            if owner != rem:
+                self._mark(b, rem.pos)  # дважды нажали «напомнить» — шлём одно
+                continue
+            self._heap.append((rem.due, rem.pos, rem))
+        heapq.heapify(self._heap)
+        self.loaded = b
+        self._known.discard(b)
+
+    def _scan(self, buckets: List[int]) -> List[Reminder]:
+        """ В потоке: все неотмеченные записи корзин, от ранних к поздним. """
+        out: List[Reminder] = []
+        for b in sorted(buckets):
+            out += self._read(b)[0]
+        return out
+
+    def _mark(self, b: int, pos: int) -> None:
+        self._marks.setdefault(b, []).append(pos)
+
+    def _drop(self, b: int) -> None:
+        self._marks.pop(b, None)
+        self._drops.add(b)
+
+    def _write(self, marks: Dict[int, List[int]], drops: Set[int]) -> None:
+        """ В потоке: отметки — одним дописыванием на корзину, потом удаление корзин. """
+        for b, positions in marks.items():
+            with open(self._path(b, "done"), "ab") as f:
+                f.write(b"".join(_IDX.pack(pos) for pos in positions))
+        for b in drops:
+            for ext in ("bin", "done"):
+                try:
+                    self._path(b, ext).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _unload(self) -> None:
+        # файлы корзины удаляем, когда отмечено всё выданное (иначе — в done())
+        if not self._outstanding.get(self.loaded):
+            self._outstanding.pop(self.loaded, None)
+            self._drop(self.loaded)
+        self.loaded = None
+
+    # ----- API -----
+
+    def add(self, bot_id: int, chat_id: int, slug: str, due: float) -> Reminder:
+        pending = self._keys.get((bot_id, chat_id, slug))
+        # уже в отправке (выдано pop_due) — новое нажатие планирует следующее
+        if pending is not None and pending.pos not in self._outstanding.get(pending.bucket, ()):
+            return pending
+        # уже наступившее — в корзину «сейчас»: прошлые корзины дочищаются и удаляются
+        b = max(int(due // self.bucket), int(self.clock() // self.bucket))
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self._path(b), "ab") as f:
+            pos = f.tell() // _REC.size
+            f.write(_REC.pack(due, bot_id, chat_id, slug.encode()))
+        rem = Reminder(due, bot_id, chat_id, slug, b, pos)
+        self._keys[(bot_id, chat_id, slug)] = rem
+        if b == self.loaded:
+            heapq.heappush(self._heap, (due, pos, rem))
+        elif b == self.loading:
+            self._late.append(rem)
+        else:
+            self._note_bucket(b)
+        return rem
+
+    async def load_index(self) -> None:
+        """ Ключи ожидающих напоминаний со всех корзин (после рестарта). """
+        if self.indexed:
+            return
+        found = await asyncio.to_thread(self._scan, list(self._known))
+        for rem in found:
+            # корзины, загруженные за время чтения, уже учтены в _install
+            if rem.bucket not in self._known or rem.bucket == self.loading:
+                continue
+            owner = self._keys.setdefault((rem.bot_id, rem.chat_id, rem.slug), rem)
+            if owner != rem:
+                self._mark(rem.bucket, rem.pos)  # дубль в другой корзине — шлём раннее
+        self.indexed = True
+
+    def next_due(self) -> Optional[float]:
+        """ Когда ближайшее напоминание (для будущих корзин — начало корзины). """
+        if self._heap:
+            return self._heap[0][0]
+        if self._buckets:
+            return self._buckets[0] * self.bucket
+        return None
+
+    async def _advance(self, now: float) -> None:
+        current = int(now // self.bucket)
+        while True:
+            if self.loaded is not None:
+                if self._heap or self.loaded >= current:
+                    return
+                self._unload()
+            if not self._buckets or self._buckets[0] > current:
+                return
+            b = self.loading = heapq.heappop(self._buckets)
+            recs, n = await asyncio.to_thread(self._read, b)
+            self._install(b, recs, n)
+
+    async def pop_due(self, now: Optional[float] = None, limit: int = 1000) -> List[Reminder]:
+        now = self.clock() if now is None else now
+        await self._advance(now)
+        out: List[Reminder] = []
+        while len(out) < limit:
+            if not self._heap:
+                await self._advance(now)
+                if not self._heap:
+                    break
+            if self._heap[0][0] > now:
+                break
+            rem = heapq.heappop(self._heap)[2]
+            self._outstanding.setdefault(rem.bucket, set()).add(rem.pos)
+            out.append(rem)
+        return out
+
+    def done(self, rem: Reminder) -> None:
+        key = (rem.bot_id, rem.chat_id, rem.slug)
+        if self._keys.get(key) == rem:
+            del self._keys[key]
+        pending = self._outstanding.get(rem.bucket)
+        if pending is not None:
+            pending.discard(rem.pos)
+            if not pending and rem.bucket != self.loaded:
+                # корзина уже выгружена и это была последняя запись
+                del self._outstanding[rem.bucket]
+                self._drop(rem.bucket)
+                return
+        self._mark(rem.bucket, rem.pos)
+
+    async def flush(self) -> None:
+        """ Накопленные отметки и удаления — на диск, в потоке (по порядку, под замком). """
+        async with self._flush_lock:
+            if not self._marks and not self._drops:
+                return
+            marks, drops = self._marks, self._drops
+            self._marks, self._drops = {}, set()
+            try:
+                await asyncio.to_thread(self._write, marks, drops)
+            except OSError as e:
+                log.warning("напоминания: отметки не записаны: %s", e)
+                for b, positions in marks.items():
+                    if b not in self._drops:
+                        self._marks.setdefault(b, [])[:0] = positions
+                self._drops |= drops
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "loaded": len(self._heap),
+            "buckets": len(self._buckets) + (self.loaded is not None),
+            "pending_keys": len(self._keys),
+        }
+
+
+class ReminderScheduler:
+    """
+    Фоновая отправка: будим цикл к ближайшему сроку, шлём через лимитер бота — общий
+    с его рассылкой (limiter_for), так что вместе они не выходят за BROADCAST_RATE.
+    send(rem) отправляет сообщение; flood-wait — пауза и повтор, бан/удалённый чат — забываем.
+    run_due() — один проход (удобно гонять с подменёнными часами).
+    """
+
+    def __init__(
+        self,
+        wheel: ReminderWheel,
+        send: Callable[[Reminder], Awaitable[None]],
+        limiter: Callable[[int], RateLimiter] = limiter_for,
+        poll: float = REMINDER_POLL,
+    ):
+        self.wheel = wheel
+        self.send = send
+        self.limiter = limiter
+        self.poll = poll
+        self.sent = 0
+        self.failed = 0
+        self.task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def schedule(self, bot_id: int, chat_id: int, slug: str, delay: float) -> Reminder:
+        rem = self.wheel.add(bot_id, chat_id, slug, self.wheel.clock() + delay)
+        self._wake.set()
+        return rem
+
+    async def _deliver(self, rem: Reminder) -> None:
+        while True:
+            limiter = self.limiter(rem.bot_id)
+            await limiter.acquire()
+            try:
+                await self.send(rem)
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                log.warning("reminders flood wait %ss", e.retry_after)
+                limiter.pause(e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                self.failed += 1
+                log.info("напоминание %s не доставлено: %s", rem.chat_id, e)
+                return
+            except Exception as e:
+                self.failed += 1
+                log.warning("напоминание %s: %s", rem.chat_id, e)
+                return
+
+    async def run_due(self) -> int:
+        await self.wheel.load_index()
+        n = 0
+        while True:
+            batch = await self.wheel.pop_due()
+            if not batch:
+                await self.wheel.flush()
+                return n
+            for rem in batch:
+                await self._deliver(rem)
+                self.wheel.done(rem)
+                n += 1
+            # отметки — одной записью на пачку, а не файлом на каждое напоминание
+            await self.wheel.flush()
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            await self.run_due()
+            nxt = self.wheel.next_due()
+            delay = self.poll if nxt is None else min(self.poll, max(0.0, nxt - self.wheel.clock()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """ Недоотправленное (не отмеченное в .done) уйдёт после рестарта. """
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.wheel.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.wheel.stats(), "sent": self.sent, "failed": self.failed}
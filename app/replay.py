@@ -0,0 +1,318 @@
+# app/replay.py — запись реального потока апдейтов и воспроизведение на заглушке Bot
+#
+#   RECORD_UPDATES=data/updates.rec  — бот пишет анонимизированные апдейты
+#   python -m app.replay data/updates.rec [--speed 1|10|max]  — прогон с отчётом
+
+import asyncio
+import datetime
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import (
+    CallbackQuery, Chat, Message, PhotoSize, TelegramObject, Update, User
+)
+
+from app.storage import BoundedMemoryStorage
+
+log = logging.getLogger("mbti_bot.replay")
+
+
+# ===== Запись =====
+
+class UpdateRecorder(BaseMiddleware):
+    """
+    Пишет только то, что нужно боту: тип, чат, юзер, message_id и команду/callback_data.
+    Имена, username и свободный текст не сохраняются, id заменяются солёным хэшем.
+    Формат — JSON Lines с относительным временем "t" (сек), файл только дописывается.
+    Строки копятся в памяти; каждые flush_every штук (и по flush_async() из фоновой
+    задачи бота) пачка уходит на диск в потоке — цикл на запись не ждёт.
+    """
+
+    def __init__(self, path: str, salt: Optional[str] = None, flush_every: int = 50):
+        self.path = path
+        self.salt = (salt or os.getenv("RECORD_SALT") or os.urandom(8).hex()).encode()
+        self.flush_every = flush_every
+        self._fh = open(path, "a", encoding="utf-8")
+        self._t0 = time.monotonic()
+        self._buf: List[str] = []
+        # пачки пишутся по очереди: следующая ждёт предыдущую, порядок строк сохраняется
+        self._writing: Optional[asyncio.Task] = None
+        self._ids: Dict[int, int] = {}
+
+    def _anon(self, raw: Optional[int]) -> Optional[int]:
+        if raw is None:
+            return None
+        got = self._ids.get(raw)
+        if got is None:
+            h = hashlib.blake2b(str(abs(raw)).encode(), key=self.salt, digest_size=5).digest()
+            got = int.from_bytes(h, "big") + 1
+            got = -got if raw < 0 else got
+            self._ids[raw] = got
+        return got
+
+    def _record(self, event: Update) -> Optional[Dict[str, Any]]:
+        if event.callback_query is not None:
+            cq = event.callback_query
+            msg = cq.message
+            return {
+                "k": "cb",
+                "c": self._anon(msg.chat.id) if msg else None,
+                "ct": msg.chat.type if msg else "private",
+                "u": self._anon(cq.from_user.id),
+                "m": msg.message_id if msg else None,
+                "d": cq.data,
+            }
+        if event.message is not None:
+            m = event.message
+            text = m.text or ""
+            return {
+                "k": "msg",
+                "c": self._anon(m.chat.id),
+                "ct": m.chat.type,
+                "u": self._anon(m.from_user.id) if m.from_user else None,
+                "m": m.message_id,
+                # только команда — свободный текст не пишем
+                "d": text.split()[0] if text.startswith("/") else "",
+            }
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            rec = self._record(event)
+            if rec is not None:
+                rec["t"] = round(time.monotonic() - self._t0, 3)
+                self._buf.append(json.dumps(rec, separators=(",", ":"), ensure_ascii=False) + "\n")
+                if len(self._buf) >= self.flush_every:
+                    self.flush_async()
+        return await handler(event, data)
+
+    def _write(self, lines: List[str]) -> None:
+        self._fh.write("".join(lines))
+        self._fh.flush()
+
+    async def _write_after(self, prev: Optional[asyncio.Task], lines: List[str]) -> None:
+        if prev is not None:
+            await asyncio.gather(prev, return_exceptions=True)
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except OSError as e:
+            log.warning("запись апдейтов в %s: %s", self.path, e)
+
+    def flush_async(self) -> Optional[asyncio.Task]:
+        """ Отдать накопленное на запись в потоке; можно не ждать (задача — в self._writing). """
+        if not self._buf:
+            return self._writing
+        lines, self._buf = self._buf, []
+        self._writing = asyncio.get_running_loop().create_task(self._write_after(self._writing, lines))
+        return self._writing
+
+    async def close(self) -> None:
+        """ На выходе: дождаться начатых записей, дописать хвост и закрыть файл. """
+        task = self.flush_async()
+        if task is not None:
+            await task
+        self._fh.close()
+
+
+# ===== Заглушки Bot API и хранилища =====
+
+class StubSession(BaseSession):
+    """ Отвечает правдоподобными объектами и считает вызовы Bot API по методам. """
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(10_000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+        if name == "GetMe":
+            return User(id=bot.id, is_bot=True, first_name="replay", username="replay_bot")
+        if name in ("SendMessage", "SendPhoto", "EditMessageText", "EditMessageMedia", "EditMessageCaption"):
+            chat_id = getattr(method, "chat_id", None) or 1
+            photo = None
+            if name in ("SendPhoto", "EditMessageMedia"):
+                photo = [PhotoSize(file_id=f"stub{next(self._ids)}", file_unique_id="stub", width=1, height=1)]
+            return Message(
+                message_id=getattr(method, "message_id", None) or next(self._ids),
+                date=datetime.datetime.now(),
+                chat=Chat(id=chat_id, type="private"),
+                photo=photo,
+            )
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class CountingStorage(BoundedMemoryStorage):
+    """ Хранилище бота (BoundedMemoryStorage) со счётчиком операций. """
+
+    def __init__(self):
+        super().__init__()
+        self.ops: Counter = Counter()
+
+    async def set_state(self, key, state=None):
+        self.ops["set_state"] += 1
+        return await super().set_state(key, state)
+
+    async def get_state(self, key):
+        self.ops["get_state"] += 1
+        return await super().get_state(key)
+
+    async def set_data(self, key, data):
+        self.ops["set_data"] += 1
+        return await super().set_data(key, data)
+
+    async def get_data(self, key):
+        self.ops["get_data"] += 1
+        return await super().get_data(key)
+
+
+# ===== Воспроизведение =====
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def build_update(rec: Dict[str, Any], update_id: int) -> Optional[Update]:
+    chat = Chat(id=rec.get("c") or rec.get("u") or 1, type=rec.get("ct") or "private")
+    user = User(id=rec.get("u") or chat.id, is_bot=False, first_name="user")
+    now = datetime.datetime.now()
+    if rec["k"] == "cb":
+        msg = Message(message_id=rec.get("m") or 1, date=now, chat=chat)
+        return Update(
+            update_id=update_id,
+            callback_query=CallbackQuery(id=str(update_id), from_user=user, chat_instance="replay", data=rec.get("d"), message=msg),
+        )
+    if rec["k"] == "msg":
+        return Update(
+            update_id=update_id,
+            message=Message(message_id=rec.get("m") or update_id, date=now, chat=chat, from_user=user, text=rec.get("d") or "…"),
+        )
+    return None
+
+
+def handler_key(rec: Dict[str, Any]) -> str:
+    if rec["k"] == "cb":
+        return "cb:" + (rec.get("d") or "").split(":", 1)[0]
+    return "msg:" + (rec.get("d") or "text")
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def replay(path: str, speed: Optional[float] = 1.0) -> Dict[str, Any]:
+    """
+    speed=None — максимально быстро, иначе во столько раз быстрее записи.
+    Диспетчер — тот же, что в main() (build_dispatcher): трекер, очереди чатов,
+    логи задержек, вытеснение сессий. Упавшие апдейты — в лог с трейсбеком и в отчёт.
+    """
+    os.environ.setdefault("BOT_TOKEN", "42:REPLAY")
+    from app import bot as app_bot
+
+    # картинки вопросов не дорисовываем: прогон не должен писать в images/ тестов
+    app_bot.QUESTION_IMAGES.workers = 0
+    session = StubSession()
+    bot = Bot("42:REPLAY", session=session)
+    storage = CountingStorage()
+    dp, tracker, serial = app_bot.build_dispatcher(storage)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    first_errors: List[str] = []
+
+    async def feed(n: int, rec: Dict[str, Any], update: Update):
+        t = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            kind = f"{handler_key(rec)}: {type(e).__name__}"
+            errors[kind] += 1
+            if errors[kind] == 1:
+                # трейсбек — по разу на вид ошибки, дальше только счётчик
+                log.error("replay: апдейт #%d (%s) упал", n, handler_key(rec), exc_info=True)
+                if len(first_errors) < 5:
+                    first_errors.append(traceback.format_exc())
+        latencies[handler_key(rec)].append(time.perf_counter() - t)
+
+    tasks = []
+    started = time.perf_counter()
+    for n, rec in enumerate(read_records(path), start=1):
+        update = build_update(rec, n)
+        if update is None:
+            continue
+        if speed:
+            delay = rec.get("t", 0) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(feed(n, rec, update)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+
+    return {
+        "updates": len(tasks),
+        "errors": sum(errors.values()),
+        "error_kinds": dict(errors.most_common()),
+        "tracebacks": first_errors,
+        "wall_s": round(wall, 3),
+        "handlers": {
+            k: {
+                "n": len(v),
+                "p50_ms": round(_pct(v, 0.50) * 1000, 3),
+                "p95_ms": round(_pct(v, 0.95) * 1000, 3),
+                "p99_ms": round(_pct(v, 0.99) * 1000, 3),
+                "max_ms": round(max(v) * 1000, 3),
+            }
+            for k, v in sorted(latencies.items())
+        },
+        "bot_calls": dict(session.calls),
+        "storage_ops": dict(storage.ops),
+        "sessions": storage.stats(),
+        "ingress": serial.stats(),
+        "unfinished": sum(len(v) for v in tracker.in_flight.values()),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m app.replay <file.rec> [--speed 1|N|max]")
+        sys.exit(2)
+    speed_arg = "1"
+    if "--speed" in sys.argv:
+        speed_arg = sys.argv[sys.argv.index("--speed") + 1]
+    speed = None if speed_arg == "max" else float(speed_arg)
+    # медленные апдейты и так видны в отчёте; в логе остаются ошибки с трейсбеками
+    logging.disable(logging.WARNING)
+    report = asyncio.run(replay(sys.argv[1], speed))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["errors"]:
+        sys.exit(1)
@@ -0,0 +1,160 @@
+# app/results.py — последние результаты пользователей + готовые inline-ответы для шаринга
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from aiogram.types import (
+    InlineQueryResultArticle, InlineQueryResultCachedPhoto, InputTextMessageContent
+)
+
+from app.broadcast import STATE_FILE
+from app.cards import iter_outcomes
+from app.fileio import atomic_write_json
+
+log = logging.getLogger("mbti_bot.results")
+
+# Сколько Telegram кэширует inline-ответ у себя (сек); ответы персональные
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "60"))
+
+_CAPTION_LIMIT = 1024
+_TEXT_LIMIT = 4096
+
+InlineResult = Union[InlineQueryResultArticle, InlineQueryResultCachedPhoto]
+
+
+class ResultStore:
+    """
+    Последний результат каждого пользователя у каждого бота: state.json → "last_results"
+    ({"bot_id:user_id": {"slug", "key", "chat", "bot"}}) — у тенантов свои наборы тестов,
+    результат одного бота другому не виден. Чаты каждого бота для рассылки:
+    "chats" ({bot_id: {chat_id: slug}}). Записи старого однобота ("last_results" по
+    user_id без "bot", "last_mbti") только читаем — от имени legacy_bot.
+    Читается один раз на старте, пишется пачкой (flush), чтение — только из памяти.
+    """
+
+    def __init__(self, path: Path = STATE_FILE):
+        self.path = path
+        self.dirty = False
+        self.legacy_bot: Optional[int] = None  # первый бот в конфиге — наследник однобота
+        try:
+            self.state: Dict[str, Any] = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.state = {}
+        except Exception as e:
+            log.warning("state.json не прочитан: %s", e)
+            self.state = {}
+        self.last: Dict[str, Dict[str, str]] = self.state.setdefault("last_results", {})
+
+    def record(self, bot_id: int, user_id: int, chat_id: int, slug: str, outcome: Dict[str, str]) -> None:
+        # шаринг — по пользователю, рассылка — по чату (в группе они разные) и от того же бота
+        self.last[f"{bot_id}:{user_id}"] = {"slug": slug, "key": outcome["key"], "chat": chat_id, "bot": bot_id}
+        chats = self.state.setdefault("chats", {}).setdefault(str(bot_id), {})
+        chats[str(chat_id)] = slug
+        self.dirty = True
+
+    def latest(self, bot_id: int, user_id: int) -> Optional[Dict[str, str]]:
+        rec = self.last.get(f"{bot_id}:{user_id}")
+        if rec is not None:
+            return rec
+        # прежний формат: ключ — только user_id; без "bot" — запись однобота
+        old = self.last.get(str(user_id))
+        if old is not None and old.get("bot", self.legacy_bot) == bot_id:
+            return old
+        if bot_id == self.legacy_bot:
+            # записи старого бота: только тип MBTI
+            typ = self.state.get("last_mbti", {}).get(str(user_id))
+            if typ:
+                return {"slug": "mbti", "key": f"mbti:{typ}"}
+        return None
+
+    def _copy(self) -> Dict[str, Any]:
+        # записи внутри секций не меняются, а заменяются целиком — хватает копии двух уровней
+        # ("chats" — на уровень глубже: словари ботов пополняются на месте)
+        snapshot = {k: dict(v) if isinstance(v, dict) else v for k, v in self.state.items()}
+        if "chats" in snapshot:
+            snapshot["chats"] = {b: dict(ids) for b, ids in snapshot["chats"].items()}
+        return snapshot
+
+    def flush(self) -> None:
+        """ Синхронно — на выходе процесса. """
+        if not self.dirty:
+            return
+        try:
+            atomic_write_json(self.path, self.state)
+            self.dirty = False
+        except OSError as e:
+            log.warning("state.json не сохранён: %s", e)
+
+    async def flush_async(self) -> None:
+        """ Периодический сброс: json.dumps и запись файла — в потоке, не в цикле. """
+        if not self.dirty:
+            return
+        snapshot = self._copy()
+        self.dirty = False
+        try:
+            await asyncio.to_thread(atomic_write_json, self.path, snapshot)
+        except OSError as e:
+            self.dirty = True
+            log.warning("state.json не сохранён: %s", e)
+
+
+def _result_id(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:32]
+
+
+def _share_text(outcome: Dict[str, str], limit: int) -> str:
+    text = f"🏁 {outcome.get('test', '')}: <b>{outcome['title']}</b>\n\n{outcome['text']}"
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class InlineResults:
+    """
+    Готовые объекты inline-ответов на каждый исход:
+      • статья (текст) — строится сразу для всех исходов, общая для всех ботов;
+      • фото-карточка по file_id — у каждого бота своя, появляется после первой загрузки.
+    На inline-запрос — только поиск в словаре: ни диска, ни загрузок.
+    """
+
+    def __init__(self, tests: Dict[str, Dict[str, Any]]):
+        self.articles: Dict[str, InlineQueryResultArticle] = {}
+        self.photos: Dict[int, Dict[str, InlineQueryResultCachedPhoto]] = {}
+        for outcome in iter_outcomes(tests):
+            self.articles[outcome["key"]] = InlineQueryResultArticle(
+                id=_result_id(outcome["key"]),
+                title=f"{outcome['test']}: {outcome['title']}",
+                description=outcome["text"][:100],
+                input_message_content=InputTextMessageContent(
+                    message_text=_share_text(outcome, _TEXT_LIMIT), parse_mode="HTML",
+                ),
+            )
+        self.empty = InlineQueryResultArticle(
+            id="none",
+            title="Пока нет результатов",
+            description="Пройди тест в боте — и делись результатом здесь",
+            input_message_content=InputTextMessageContent(message_text="🧠 Пройди тест и узнай свой результат!"),
+        )
+
+    def remember_photo(self, bot_id: int, outcome: Dict[str, str], file_id: Optional[str]) -> None:
+        """ Карточка исхода уже загружена этим ботом — отдаём её вместо текста. """
+        if not file_id:
+            return
+        cache = self.photos.setdefault(bot_id, {})
+        if outcome["key"] in cache:
+            return
+        cache[outcome["key"]] = InlineQueryResultCachedPhoto(
+            id=_result_id(outcome["key"]),
+            photo_file_id=file_id,
+            title=f"{outcome.get('test', '')}: {outcome['title']}",
+            caption=_share_text(outcome, _CAPTION_LIMIT),
+            parse_mode="HTML",
+        )
+
+    def get(self, bot_id: int, key: Optional[str]) -> InlineResult:
+        if not key:
+            return self.empty
+        return self.photos.get(bot_id, {}).get(key) or self.articles.get(key) or self.empty
@@ -0,0 +1,226 @@
+# app/scoring.py — единый движок подсчёта результатов
+#
+# Каждый вариант ответа — вектор весов по измерениям теста (разреженный: (индекс, вес)).
+# Итог сессии — сумма векторов выбранных ответов, дальше по типу теста:
+#   mbti     — по осям E/I, S/N, T/F, J/P (ничья → первая буква);
+#   sum      — сумма баллов → полоса из results.json (таблица на весь достижимый диапазон);
+#   profiles — results {key: {"traits": [...], "text"}} → argmax скалярного произведения;
+#   traits   — запасной вариант: топ-3 трейта.
+# Тест компилируется один раз, дальше подсчёт — только сложение векторов и поиск в таблице.
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.mbti import DIMENSION_PAIRS, mbti_letters
+
+Vector = Tuple[Tuple[int, float], ...]
+
+SCORE_DIM = "score"
+# шире этого диапазона таблицу полос не строим — ищем полосу как раньше
+_MAX_BAND_TABLE = 10_000
+
+
+def pick_band(bands: List[Dict[str, Any]], total: int) -> Optional[Dict[str, Any]]:
+    """ Полоса для суммы баллов; за краями — крайняя полоса. """
+    for b in bands:
+        try:
+            if int(b.get("min", -10**9)) <= total <= int(b.get("max", 10**9)):
+                return b
+        except Exception:
+            continue
+    if not bands:
+        return None
+    bands_sorted = sorted(bands, key=lambda x: (x.get("min", 0)))
+    return bands_sorted[0] if total < bands_sorted[0].get("min", 0) else bands_sorted[-1]
+
+
+def option_payload(opt: Dict[str, Any], idx: int) -> str:
+    """ Что кладём в callback_data для варианта (совместимо со старыми кнопками). """
+    if opt.get("weights"):
+        return f"o:{idx}"
+    if "trait" in opt and opt.get("trait"):
+        return f"t:{opt.get('trait')}"
+    if "score" in opt:
+        return f"s:{opt.get('score')}"
+    return "t:"
+
+
+class CompiledTest:
+    def __init__(self, slug: str, kind: str, questions: List[Dict[str, Any]], results: Dict[str, Any]):
+        self.slug = slug
+        self.kind = kind
+        self.results = results
+        self.dims: List[str] = []
+        self.dim_index: Dict[str, int] = {}
+        # (номер вопроса, payload) → вектор; t:/s: от вопроса не зависят — ключ (-1, payload)
+        self.vectors: Dict[Tuple[int, str], Vector] = {}
+        # для каждого вопроса — векторы вариантов по порядку
+        self.options: List[List[Vector]] = []
+
+        for qi, q in enumerate(questions):
+            row = []
+            for oi, opt in enumerate(q.get("options", [])):
+                payload = option_payload(opt, oi)
+                vec = self._option_vector(opt)
+                self.vectors[(qi if payload.startswith("o:") else -1, payload)] = vec
+                row.append(vec)
+            self.options.append(row)
+
+        if kind == "mbti":
+            for a, b in DIMENSION_PAIRS:
+                self._dim(a)
+                self._dim(b)
+        self._score = self._dim(SCORE_DIM) if kind == "sum" else self.dim_index.get(SCORE_DIM)
+
+        self.bands: List[Dict[str, Any]] = results.get("bands", []) if kind == "sum" else []
+        self.band_lo = 0
+        self.band_table: List[int] = []
+        if self.bands:
+            self._build_band_table()
+
+        self.profile_keys: List[str] = []
+        self.profiles: List[Vector] = []
+        if kind == "profiles":
+            for rkey, rdata in results.items():
+                if not isinstance(rdata, dict):
+                    continue
+                self.profile_keys.append(rkey)
+                self.profiles.append(tuple((self._dim(t), 1.0) for t in dict.fromkeys(rdata.get("traits", []))))
+
+    # ----- компиляция -----
+
+    def _dim(self, name: str) -> int:
+        i = self.dim_index.get(name)
+        if i is None:
+            i = self.dim_index[name] = len(self.dims)
+            self.dims.append(name)
+        return i
+
+    def _option_vector(self, opt: Dict[str, Any]) -> Vector:
+        if opt.get("weights"):
+            return tuple((self._dim(k), float(v)) for k, v in opt["weights"].items())
+        return self._payload_vector(option_payload(opt, 0))
+
+    def _payload_vector(self, payload: str, grow: bool = True) -> Vector:
+        """ grow=False — только по уже известным измерениям (payload не из теста). """
+        dim = self._dim if grow else self.dim_index.get
+        if payload.startswith("t:"):
+            trait = payload[2:]
+            d = dim(trait) if trait else None
+            return ((d, 1.0),) if d is not None else ()
+        if payload.startswith("s:"):
+            try:
+                value = float(int(payload[2:]))
+            except ValueError:
+                return ()
+            d = dim(SCORE_DIM)
+            return ((d, value),) if d is not None else ()
+        return ()
+
+    def _build_band_table(self) -> None:
+        """ Таблица «сумма → индекс полосы» на весь достижимый диапазон. """
+        lo = hi = 0
+        for row in self.options:
+            sums = [sum(w for d, w in vec if d == self._score) for vec in row] or [0]
+            lo += min(sums)
+            hi += max(sums)
+        lo, hi = int(lo), int(hi)
+        if hi - lo > _MAX_BAND_TABLE:
+            return
+        self.band_lo = lo
+        index = {id(b): i for i, b in enumerate(self.bands)}
+        self.band_table = [index[id(pick_band(self.bands, t))] for t in range(lo, hi + 1)]
+
+    # ----- подсчёт -----
+
+    def vector(self, qi: int, payload: str) -> Vector:
+        vec = self.vectors.get((-1, payload))
+        if vec is None:
+            vec = self.vectors.get((qi, payload))
+        if vec is None:
+            # payload, которого нет в тесте (старые кнопки, подделанный callback_data) —
+            # разбираем на лету, но скомпилированный тест не трогаем: ни кэша, ни новых измерений
+            vec = self._payload_vector(payload, grow=False)
+        return vec
+
+    def accumulate(self, stash: Dict[str, str]) -> List[float]:
+        acc = [0.0] * len(self.dims)
+        for qkey, payload in stash.items():
+            if not payload:
+                continue
+            try:
+                qi = int(qkey)
+            except (TypeError, ValueError):
+                qi = -1
+            for d, w in self.vector(qi, payload):
+                if d >= len(acc):
+                    acc.extend([0.0] * (d + 1 - len(acc)))
+                acc[d] += w
+        return acc
+
+    def band_for(self, total: int) -> Optional[Dict[str, Any]]:
+        i = total - self.band_lo
+        if self.band_table and 0 <= i < len(self.band_table):
+            return self.bands[self.band_table[i]]
+        return pick_band(self.bands, total)
+
+    def outcome(self, stash: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """ Итог сессии: {kind, key, title, text} (для traits — ещё top). """
+        acc = self.accumulate(stash)
+        get = lambda name: acc[self.dim_index[name]] if name in self.dim_index and self.dim_index[name] < len(acc) else 0.0
+
+        if self.kind == "mbti":
+            typ = mbti_letters(get)
+            desc = self.results.get(typ, "Описание недоступно.")
+            return {"kind": "mbti", "key": f"{self.slug}:{typ}", "title": typ, "text": desc}
+
+        if self.kind == "sum":
+            band = self.band_for(int(get(SCORE_DIM)))
+            if band is None:
+                return None
+            return {
+                "kind": "sum",
+                "key": f"{self.slug}:{self.bands.index(band)}",
+                "title": band.get("title", "—"),
+                "text": band.get("text", ""),
+            }
+
+        if self.kind == "profiles":
+            best_i, best = 0, None
+            for i, prof in enumerate(self.profiles):
+                s = sum(acc[d] * w for d, w in prof if d < len(acc))
+                if best is None or s > best:
+                    best_i, best = i, s
+            if not self.profile_keys:
+                return None
+            rkey = self.profile_keys[best_i]
+            return {"kind": "profiles", "key": f"{self.slug}:{rkey}", "title": rkey, "text": self.results[rkey].get("text", "")}
+
+        # traits: порядок при равенстве — как трейты встречались в ответах
+        # трейты не из теста (измерений под них нет) считаем тут же, по вхождениям
+        order: Dict[str, float] = {}
+        for qkey, payload in stash.items():
+            if payload and payload.startswith("t:") and payload[2:]:
+                trait = payload[2:]
+                if trait in self.dim_index:
+                    order.setdefault(trait, get(trait))
+                else:
+                    order[trait] = order.get(trait, 0.0) + 1
+        top = sorted(order.items(), key=lambda x: -x[1])[:3]
+        return {"kind": "traits", "key": None, "title": None, "text": None, "top": [(k, int(v)) for k, v in top]}
+
+    def score_many(self, stashes: Iterable[Dict[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """ Пакетный подсчёт (аналитика, пересчёт, бенчмарки). """
+        return [self.outcome(s) for s in stashes]
+
+
+def compile_test(slug: str, test: Dict[str, Any]) -> CompiledTest:
+    """ test — запись из bot.TESTS ({type, questions, results}). """
+    kind = test.get("type", "traits")
+    if slug == "mbti":
+        kind = "mbti"
+    return CompiledTest(slug, kind, test.get("questions", []), test.get("results", {}))
+
+
+def compile_profiles(slug: str, questions: Sequence[Dict[str, Any]], results: Dict[str, Any]) -> CompiledTest:
+    """ Формат tests_manager: results {key: {"traits": [...], "text": ...}}. """
+    return CompiledTest(slug, "profiles", list(questions), results)
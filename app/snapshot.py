@@ -0,0 +1,209 @@
+# app/snapshot.py — мягкий рестарт: дренаж апдейтов, снимок сессий и недоделанных апдейтов
+#
+# Поллер aiogram подтверждает апдейты Telegram следующим же getUpdates — задолго до того,
+# как хендлер закончит. Поэтому недоделанное к выходу Telegram заново не пришлёт:
+# сами апдейты кладём в снимок, и новый инстанс прогоняет их через диспетчер.
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+from aiogram.types import TelegramObject, Update
+
+from app.fileio import atomic_write_json
+from app.media import FILE_IDS
+from app.storage import BoundedMemoryStorage
+
+log = logging.getLogger("mbti_bot.snapshot")
+
+ROOT_DIR = Path(__file__).resolve().parent
+SNAPSHOT_PATH = Path(os.getenv("SNAPSHOT_PATH") or ROOT_DIR / "data" / "snapshot.json")
+# Docker даёт 10 секунд между SIGTERM и SIGKILL — укладываемся с запасом
+DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "7"))
+
+
+class UpdateTracker(BaseMiddleware):
+    """
+    Держит апдейты «в работе» (сами объекты — для снимка) и последний полученный
+    update_id — по каждому боту (update_id у разных ботов независимы). Ставить первым
+    в dp.update.outer_middleware, чтобы ждущие в очередях тоже считались незавершёнными.
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[int, Dict[int, Update]] = {}
+        self.max_seen: Dict[int, int] = {}
+        self._busy = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        bot = data.get("bot")
+        if not isinstance(event, Update) or bot is None:
+            return await handler(event, data)
+        uid = event.update_id
+        flight = self.in_flight.setdefault(bot.id, {})
+        flight[uid] = event
+        self._busy += 1
+        self._idle.clear()
+        if uid > self.max_seen.get(bot.id, -1):
+            self.max_seen[bot.id] = uid
+        try:
+            return await handler(event, data)
+        finally:
+            flight.pop(uid, None)
+            self._busy -= 1
+            if not self._busy:
+                self._idle.set()
+
+    @property
+    def offsets(self) -> Dict[int, int]:
+        """
+        bot.id → offset после последнего полученного апдейта. Последнюю пачку поллер
+        мог не успеть подтвердить — новый инстанс подтверждает её сам (ack_offset).
+        Недоделанные апдейты Telegram уже не вернёт — они едут в снимке (unfinished).
+        """
+        return {bot_id: last + 1 for bot_id, last in self.max_seen.items()}
+
+    def unfinished(self) -> Dict[int, List[Update]]:
+        """ bot.id → апдейты, которые начали, но не закончили (в порядке update_id). """
+        return {
+            bot_id: [flight[uid] for uid in sorted(flight)]
+            for bot_id, flight in self.in_flight.items()
+            if flight
+        }
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            log.warning("drain: не успели %d апдейтов — уйдут в снимок", self._busy)
+            return False
+
+
+# ===== Снимок =====
+
+def save_snapshot(
+    storage: MemoryStorage,
+    offsets: Dict[int, int],
+    unfinished: Optional[Dict[int, List[Update]]] = None,
+    path: Path = SNAPSHOT_PATH,
+) -> None:
+    sessions = [
+        {"key": asdict(key), "state": rec.state, "data": rec.data}
+        for key, rec in storage.storage.items()
+        if rec.state is not None or rec.data
+    ]
+    payload = {
+        "saved_at": time.time(),
+        "offsets": {str(k): v for k, v in offsets.items()},
+        "sessions": sessions,
+        "file_ids": {str(k): v for k, v in FILE_IDS.items()},
+        "updates": {
+            str(bot_id): [u.model_dump(mode="json", exclude_none=True) for u in updates]
+            for bot_id, updates in (unfinished or {}).items()
+        },
+    }
+    atomic_write_json(path, payload)
+    n = sum(len(v) for v in payload["updates"].values())
+    log.info("snapshot: %d сессий, %d недоделанных апдейтов, offsets=%s → %s", len(sessions), n, offsets, path)
+
+
+def restore_snapshot(
+    storage: MemoryStorage, path: Path = SNAPSHOT_PATH
+) -> Tuple[Dict[int, int], Dict[int, List[Dict[str, Any]]]]:
+    """
+    Возвращает (offsets {bot.id: offset}, недоделанные апдейты {bot.id: [dict, ...]}).
+    Снимок старого формата (один "offset") кладём под ключом 0 — бот неизвестен.
+
+    Файл не удаляем — его заменит снимок при следующей остановке. Чтобы после падения
+    сразу на старте не прогнать апдейты дважды, помечаем снимок прочитанным: сессии
+    из него восстановятся снова, а offsets и апдейты — уже нет.
+    """
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}, {}
+    except Exception as e:
+        log.warning("snapshot не прочитан: %s", e)
+        return {}, {}
+    for item in payload.get("sessions", []):
+        try:
+            key = StorageKey(**item["key"])
+        except TypeError:
+            continue
+        if isinstance(storage, BoundedMemoryStorage):
+            storage.load_record(key, item.get("data") or {}, item.get("state"))
+        else:
+            storage.storage[key] = MemoryStorageRecord(data=item.get("data") or {}, state=item.get("state"))
+    for bot_id, ids in (payload.get("file_ids") or {}).items():
+        # старый формат {sha: file_id} без бота — пропускаем, file_id перезальются
+        if isinstance(ids, dict):
+            cache = FILE_IDS.setdefault(int(bot_id), {})
+            for k, v in ids.items():
+                cache.setdefault(k, v)
+    if payload.get("restored_at"):
+        log.info("snapshot: уже прочитан, восстановлено %d сессий", len(payload.get("sessions", [])))
+        return {}, {}
+    offsets = {int(k): v for k, v in (payload.get("offsets") or {}).items() if v is not None}
+    if payload.get("offset") is not None:
+        offsets.setdefault(0, payload["offset"])
+    updates = {int(k): v for k, v in (payload.get("updates") or {}).items() if v}
+    payload["restored_at"] = time.time()
+    try:
+        atomic_write_json(path, payload)
+    except OSError as e:
+        log.warning("snapshot не помечен прочитанным: %s", e)
+    log.info(
+        "snapshot: восстановлено %d сессий, %d недоделанных апдейтов, offsets=%s",
+        len(payload.get("sessions", [])), sum(len(v) for v in updates.values()), offsets,
+    )
+    return offsets, updates
+
+
+def resume_updates(dp: Any, bots: List[Bot], updates: Dict[int, List[Dict[str, Any]]]) -> List[asyncio.Task]:
+    """
+    Прогоняем недоделанные апдейты старого инстанса через диспетчер (до старта поллинга —
+    так они первыми встают в очереди своих чатов). Хендлер мог успеть часть работы,
+    поэтому возможен повтор сообщения — лучше, чем потерянный ответ.
+    """
+    by_id = {bot.id: bot for bot in bots}
+    if len(bots) == 1 and 0 in updates:
+        updates.setdefault(bots[0].id, updates.pop(0))
+    tasks: List[asyncio.Task] = []
+    for bot_id, items in updates.items():
+        bot = by_id.get(bot_id)
+        if bot is None:
+            log.warning("snapshot: %d апдейтов бота %s — бота больше нет", len(items), bot_id)
+            continue
+        for item in items:
+            try:
+                update = Update.model_validate(item, context={"bot": bot})
+            except Exception as e:
+                log.warning("snapshot: апдейт не разобран: %s", e)
+                continue
+            tasks.append(asyncio.create_task(dp.feed_update(bot, update)))
+    return tasks
+
+
+async def ack_offset(bot: Bot, offset: Optional[int]) -> None:
+    """ Подтверждаем Telegram всё, что старый инстанс уже обработал (иначе дубли). """
+    if offset is None:
+        return
+    try:
+        await bot.get_updates(offset=offset, limit=1, timeout=0)
+    except Exception as e:
+        log.warning("ack offset %s: %s", offset, e)
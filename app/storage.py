@@ -0,0 +1,135 @@
+# app/storage.py — FSM-хранилище в памяти с вытеснением по простою и лимитом по байтам
+
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+
+# Сессия без активности дольше TTL удаляется; сверх бюджета — вытесняем самые старые
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# примерные накладные расходы на ключ/запись/служебные словари
+_RECORD_OVERHEAD = 400
+# сколько просроченных записей чистим за одно обращение (амортизированно)
+_SWEEP_BATCH = 64
+
+
+def _record_size(rec: MemoryStorageRecord) -> int:
+    try:
+        payload = len(json.dumps(rec.data, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        payload = 1024
+    return _RECORD_OVERHEAD + payload + len(rec.state or "")
+
+
+class BoundedMemoryStorage(MemoryStorage):
+    """
+    Как MemoryStorage, но память ограничена:
+      • LRU-порядок (OrderedDict): в начале — самые давно не трогавшиеся сессии;
+      • TTL по простою: просроченные снимаются с головы при каждом обращении;
+      • бюджет max_bytes: при превышении вытесняем с головы.
+    Чтение несуществующего ключа запись не создаёт (MemoryStorage создаёт).
+    """
+
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        max_bytes: int = SESSION_MAX_BYTES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__()
+        self.storage: "OrderedDict[StorageKey, MemoryStorageRecord]" = OrderedDict()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.bytes = 0
+        self.evictions: Counter = Counter()
+        self._sizes: Dict[StorageKey, int] = {}
+        self._seen: Dict[StorageKey, float] = {}
+
+    # ----- служебное -----
+
+    def _drop(self, key: StorageKey, reason: str) -> None:
+        self.storage.pop(key, None)
+        self.bytes -= self._sizes.pop(key, 0)
+        self._seen.pop(key, None)
+        self.evictions[reason] += 1
+
+    def sweep(self, limit: Optional[int] = _SWEEP_BATCH) -> int:
+        """ Снимает просроченные сессии с головы LRU. limit=None — до конца. """
+        deadline = self.clock() - self.ttl
+        dropped = 0
+        while self.storage and (limit is None or dropped < limit):
+            key = next(iter(self.storage))
+            if self._seen.get(key, 0) > deadline:
+                break
+            self._drop(key, "ttl")
+            dropped += 1
+        return dropped
+
+    def _touch(self, key: StorageKey) -> Optional[MemoryStorageRecord]:
+        self.sweep()
+        rec = self.storage.get(key)
+        if rec is not None:
+            self.storage.move_to_end(key)
+            self._seen[key] = self.clock()
+        return rec
+
+    def _put(self, key: StorageKey, rec: MemoryStorageRecord) -> None:
+        self.storage[key] = rec
+        self.storage.move_to_end(key)
+        self._seen[key] = self.clock()
+        size = _record_size(rec)
+        self.bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        while self.bytes > self.max_bytes and len(self.storage) > 1:
+            oldest = next(iter(self.storage))
+            if oldest == key:
+                break
+            self._drop(oldest, "bytes")
+
+    def load_record(self, key: StorageKey, data: Dict[str, Any], state: Optional[str]) -> None:
+        """ Для восстановления из снимка (с учётом байтов). """
+        self._put(key, MemoryStorageRecord(data=data, state=state))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.storage),
+            "bytes": self.bytes,
+            "evicted_ttl": self.evictions["ttl"],
+            "evicted_bytes": self.evictions["bytes"],
+        }
+
+    # ----- BaseStorage -----
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        rec = self._touch(key) or MemoryStorageRecord()
+        rec.state = state.state if isinstance(state, State) else state
+        if rec.state is None and not rec.data:
+            if key in self.storage:
+                self._drop(key, "cleared")
+            return
+        self._put(key, rec)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        rec = self._touch(key)
+        return rec.state if rec else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        rec = self._touch(key) or MemoryStorageRecord()
+        rec.data = data.copy()
+        if rec.state is None and not rec.data:
+            if key in self.storage:
+                self._drop(key, "cleared")
+            return
+        self._put(key, rec)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        rec = self._touch(key)
+        return rec.data.copy() if rec else {}
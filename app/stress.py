@@ -0,0 +1,140 @@
+# app/stress.py — нагрузочная проверка: параллельные ответы не теряются
+#
+#   python -m app.stress [--chats 10000] [--answers 5] [--unordered]
+#
+# Каждый чат получает серию нажатий «ответ» почти одновременно; все чаты — разом.
+# Хранилище перед каждым чтением/записью отдаёт управление циклу и возвращает копию
+# данных (как Redis), так что гонка get_data → update_data в cb_ans проявляется, если
+# апдейты одного чата не выстроены в очередь. Выход с кодом 1, если ответ потерян.
+# --unordered — без ChatSerialMiddleware: показывает, что проверка гонку ловит.
+
+import asyncio
+import copy
+import datetime
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from app.replay import StubSession
+from app.storage import BoundedMemoryStorage
+
+TOKEN = "42:STRESS"
+
+
+class YieldingStorage(BoundedMemoryStorage):
+    """ Сетевое хранилище в миниатюре: await на каждой операции, данные — копией. """
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        await asyncio.sleep(0)
+        return copy.deepcopy(await super().get_data(key))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await asyncio.sleep(0)
+        await super().set_data(key, copy.deepcopy(data))
+
+
+def answer_update(update_id: int, chat_id: int, data: str) -> Update:
+    chat = Chat(id=chat_id, type="private")
+    return Update(
+        update_id=update_id,
+        callback_query=CallbackQuery(
+            id=str(update_id),
+            from_user=User(id=chat_id, is_bot=False, first_name="stress"),
+            chat_instance="stress",
+            data=data,
+            message=Message(message_id=1, date=datetime.datetime.now(), chat=chat),
+        ),
+    )
+
+
+async def stress(chats: int = 10_000, answers: int = 5, slug: str = "mbti", ordered: bool = True) -> Dict[str, Any]:
+    os.environ.setdefault("BOT_TOKEN", TOKEN)
+    from app import bot as app_bot
+    from app.middlewares import ChatSerialMiddleware
+    from app.scoring import option_payload
+
+    app_bot.QUESTION_IMAGES.workers = 0  # без фоновой отрисовки картинок
+    bot = Bot(TOKEN, session=StubSession())
+    storage = YieldingStorage()
+    dp = Dispatcher(storage=storage)
+    serial = None
+    if ordered:
+        # очередь вмещает всех: проверяем очерёдность, а не сброс лишнего при перегрузке
+        serial = ChatSerialMiddleware(app_bot.MAX_CONCURRENT_UPDATES, chats * answers)
+        dp.update.outer_middleware(serial)
+    dp.include_router(app_bot.router)
+
+    questions = app_bot.TESTS[slug]["questions"][:answers]
+    # ответы — по кругу по вариантам, чтобы потерю было видно и по значению
+    expected = {
+        str(i): option_payload(q["options"][i % len(q["options"])], i % len(q["options"]))
+        for i, q in enumerate(questions)
+    }
+    for c in range(1, chats + 1):
+        key = StorageKey(bot_id=bot.id, chat_id=c, user_id=c)
+        await storage.set_data(key, {"slug": slug, "index": 0, "stash": {}, "shown_at": time.time()})
+
+    ids = itertools.count(1)
+    # порядок прихода: первый ответ всех чатов, затем второй и т. д.
+    updates = [
+        answer_update(next(ids), c, f"ans:{slug}:{idx}:{val}")
+        for idx, val in expected.items()
+        for c in range(1, chats + 1)
+    ]
+    errors: List[str] = []
+
+    async def feed(update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(u) for u in updates))
+    wall = time.perf_counter() - started
+
+    lost = 0
+    for c in range(1, chats + 1):
+        stash = (await storage.get_data(StorageKey(bot_id=bot.id, chat_id=c, user_id=c))).get("stash", {})
+        lost += sum(1 for i, val in expected.items() if stash.get(i) != val)
+
+    return {
+        "chats": chats,
+        "answers": len(updates),
+        "ordered": ordered,
+        "lost": lost,
+        "errors": len(errors),
+        "first_errors": errors[:3],
+        "shed": sum(serial.gate.shed.values()) if serial else 0,
+        "slots_left": serial.active_keys if serial else 0,
+        "wall_s": round(wall, 3),
+        "updates_per_s": round(len(updates) / wall) if wall else None,
+    }
+
+
+def _opt(args: List[str], flag: str, default: Any) -> Any:
+    if flag in args:
+        return args[args.index(flag) + 1]
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    logging.disable(logging.WARNING)
+    report = asyncio.run(stress(
+        chats=int(_opt(args, "--chats", 10_000)),
+        answers=int(_opt(args, "--answers", 5)),
+        ordered="--unordered" not in args,
+    ))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["lost"] or report["errors"] or report["shed"]:
+        print("❌ ответы потеряны" if report["lost"] else "❌ ошибки при обработке")
+        sys.exit(1)
@@ -0,0 +1,94 @@
+# app/tenants.py — несколько брендированных ботов в одном процессе
+#
+# Каталог тестов (TESTS) общий и только для чтения; у каждого бота свои
+# обложки, карточки, file_id и рассылка. FSM-сессии и так разделены:
+# в StorageKey есть bot_id.
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+
+from app.assets import locate
+from app.broadcast import CHECKPOINT_FILE, Broadcaster
+from app.cards import CardCache
+from app.config import BotConfig
+
+ROOT_DIR = Path(__file__).resolve().parent
+DEFAULT_BRANDING_DIR = ROOT_DIR / "data" / "branding"
+
+
+@dataclass
+class Tenant:
+    config: BotConfig
+    branding_dir: Path = DEFAULT_BRANDING_DIR
+    cards: CardCache = field(init=False)
+    broadcaster: Optional[Broadcaster] = None
+
+    def __post_init__(self):
+        self.cards = cards_for(self.brand_image("full"))
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    def allows(self, slug: str) -> bool:
+        return self.config.slugs is None or slug in self.config.slugs
+
+    def brand_image(self, kind: str) -> Optional[str]:
+        """ Обложка бота: своя папка, иначе общая data/branding. """
+        dirs = [self.branding_dir]
+        if self.branding_dir != DEFAULT_BRANDING_DIR:
+            dirs.append(DEFAULT_BRANDING_DIR)
+        for d in dirs:
+            for ext in ("png", "jpg", "jpeg", "webp"):
+                p = locate(d / f"{kind}.{ext}")
+                if p:
+                    return p
+        return None
+
+    def tests(self, catalog: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """ Часть общего каталога, включённая у этого бота. """
+        if self.config.slugs is None:
+            return catalog
+        return {slug: t for slug, t in catalog.items() if slug in self.config.slugs}
+
+    def checkpoint_path(self) -> Path:
+        if self.name == "main":
+            return CHECKPOINT_FILE
+        return CHECKPOINT_FILE.with_name(f"{CHECKPOINT_FILE.stem}-{self.name}{CHECKPOINT_FILE.suffix}")
+
+
+# одна обложка — один кэш карточек (и один рендер), сколько бы ботов её ни делили
+_CARD_CACHES: Dict[Optional[str], CardCache] = {}
+
+
+def cards_for(base_image: Optional[str]) -> CardCache:
+    cache = _CARD_CACHES.get(base_image)
+    if cache is None:
+        cache = _CARD_CACHES[base_image] = CardCache(base_image)
+    return cache
+
+
+def card_caches() -> List[CardCache]:
+    return list(_CARD_CACHES.values())
+
+
+# bot.id → Tenant
+TENANTS: Dict[int, Tenant] = {}
+
+# для неизвестных ботов (заглушки в replay/бенчмарках): все тесты, общие обложки
+DEFAULT_TENANT = Tenant(BotConfig(token=""))
+
+
+def register(bot: Bot, config: BotConfig) -> Tenant:
+    branding = Path(config.branding_dir) if config.branding_dir else DEFAULT_BRANDING_DIR
+    tenant = TENANTS[bot.id] = Tenant(config, branding_dir=branding)
+    return tenant
+
+
+def tenant_for(bot: Optional[Bot]) -> Tenant:
+    if bot is None:
+        return DEFAULT_TENANT
+    return TENANTS.get(bot.id, DEFAULT_TENANT)
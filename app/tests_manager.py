@@ -1,12 +1,17 @@
 import json
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+from app.scoring import compile_profiles
 
 # === Базовая структура для тестов ===
 BASE_TESTS_DIR = Path(__file__).resolve().parent / "data" / "tests"
 
+# slug → ((mtime questions, mtime results), тест) — перечитываем только изменённые файлы
+_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
 def load_test(slug: str) -> Dict[str, Any]:
-    """Загружает тест по названию (например 'psych_age')."""
+    """Загружает тест по названию (например 'psych_age'), кэш по mtime файлов."""
     folder = BASE_TESTS_DIR / slug
     questions_path = folder / "questions.json"
     results_path = folder / "results.json"
@@ -16,20 +21,30 @@ def load_test(slug: str) -> Dict[str, Any]:
     if not results_path.exists():
         raise FileNotFoundError(f"{results_path} не найден")
 
+    stamp = (questions_path.stat().st_mtime_ns, results_path.stat().st_mtime_ns)
+    cached = _CACHE.get(slug)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
     with open(questions_path, "r", encoding="utf-8") as f:
         questions = json.load(f)
     with open(results_path, "r", encoding="utf-8") as f:
         results = json.load(f)
 
-    return {"slug": slug, "questions": questions, "results": results}
+    qlist = questions.get("questions", []) if isinstance(questions, dict) else questions
+    test = {
+        "slug": slug,
+        "questions": questions,
+        "results": results,
+        "compiled": compile_profiles(slug, qlist, results),
+    }
+    _CACHE[slug] = (stamp, test)
+    return test
 
 def calc_result(test: Dict[str, Any], traits: list[str]) -> str:
-    """Подбирает результат по количеству совпадений."""
-    results = test["results"]
-    scores = {}
-    for rkey, rdata in results.items():
-        score = sum(1 for t in traits if t in rdata.get("traits", []))
-        scores[rkey] = score
-    best_key = max(scores, key=scores.get)
-    return results[best_key]["text"]
-
+    """Подбирает результат по количеству совпадений (скалярное произведение с профилями)."""
+    compiled = test.get("compiled") or compile_profiles(test.get("slug", ""), [], test["results"])
+    out = compiled.outcome({str(i): f"t:{t}" for i, t in enumerate(traits)})
+    if out is None:
+        raise ValueError("нет профилей результатов")
+    return out["text"]
@@ -1,5 +1,5 @@
 from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
-import os, json, random, math, colorsys
+import os, json, random, math, colorsys, zlib
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent
@@ -7,9 +7,6 @@ MBTI_FREE  = ROOT / "app" / "data" / "images" / "free"
 MBTI_PAID  = ROOT / "app" / "data" / "images" / "paid"
 TESTS_ROOT = ROOT / "app" / "data" / "tests"
 
-MBTI_FREE.mkdir(parents=True, exist_ok=True)
-MBTI_PAID.mkdir(parents=True, exist_ok=True)
-
 BASE_PALETTES = [
     [(36,55,84),(117,131,154),(200,175,150)],
     [(30,84,76),(92,124,108),(182,166,150)],
@@ -122,7 +119,14 @@ def make_one(size, seed, mode):
 
 def cycle_modes(i): return ["blend","geo","grain"][i % 3]
 
+def question_seed(slug, i):
+    # crc32, а не hash(): hash() строк солится на каждый запуск, а картинки
+    # должны совпадать у офлайн-сборки и у бота (app/imagegen.py)
+    return 3000 + zlib.crc32(slug.encode("utf-8")) % 100000 + i
+
 def save_mbti():
+    MBTI_FREE.mkdir(parents=True, exist_ok=True)
+    MBTI_PAID.mkdir(parents=True, exist_ok=True)
     created = 0
     for i in range(1,17):
         p = MBTI_FREE / f"q{i}.jpg"
@@ -154,7 +158,7 @@ def ensure_images_for_test(slug_path: Path):
     for i in range(1, n+1):
         path = img_dir / f"q{i}.jpg"
         mode = cycle_modes(i)
-        img = make_one(900, 3000 + abs(hash(slug_path.name)) % 100000 + i, mode)
+        img = make_one(900, question_seed(slug_path.name, i), mode)
         img.save(path, "JPEG", quality=90); created += 1
     return n, created
 
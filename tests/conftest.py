@@ -0,0 +1,5 @@
+# tests/conftest.py — запуск из корня репозитория: python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,184 @@
+# tests/scoring_reference.py — подсчёт результатов до движка app/scoring.py (как было)
+#
+# Зафиксированные копии прежних реализаций: с ними сравнивает test_scoring_equivalence.
+# Не править вслед за app/scoring.py — смысл именно в том, что это эталон.
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+DIMENSION_PAIRS = [("E", "I"), ("S", "N"), ("T", "F"), ("J", "P")]
+
+
+# ----- app/mbti.py -----
+
+def mbti_from_traits(traits: List[str]) -> str:
+    c = Counter(traits)
+    res = []
+    for a, b in DIMENSION_PAIRS:
+        res.append(a if c[a] >= c[b] else b)
+    return "".join(res)
+
+
+# ----- app/tests_manager.py -----
+
+def calc_result(test: Dict[str, Any], traits: List[str]) -> str:
+    results = test["results"]
+    scores = {}
+    for rkey, rdata in results.items():
+        score = sum(1 for t in traits if t in rdata.get("traits", []))
+        scores[rkey] = score
+    best_key = max(scores, key=scores.get)
+    return results[best_key]["text"]
+
+
+def pick_band(bands: List[Dict[str, Any]], total: int) -> Optional[Dict[str, Any]]:
+    for b in bands:
+        try:
+            if int(b.get("min", -10**9)) <= total <= int(b.get("max", 10**9)):
+                return b
+        except Exception:
+            continue
+    if not bands:
+        return None
+    bands_sorted = sorted(bands, key=lambda x: (x.get("min", 0)))
+    return bands_sorted[0] if total < bands_sorted[0].get("min", 0) else bands_sorted[-1]
+
+
+# ----- app/bot.py -----
+
+def score_to_mbti(score: Dict[str, int]) -> str:
+    e = "E" if score.get("E", 0) >= score.get("I", 0) else "I"
+    s = "S" if score.get("S", 0) >= score.get("N", 0) else "N"
+    t = "T" if score.get("T", 0) >= score.get("F", 0) else "F"
+    j = "J" if score.get("J", 0) >= score.get("P", 0) else "P"
+    return f"{e}{s}{t}{j}"
+
+
+def _tally(stash: Dict[str, str]) -> Tuple[Dict[str, int], int]:
+    trait_score: Dict[str, int] = {}
+    total_score = 0
+    for raw in stash.values():
+        if not raw:
+            continue
+        if raw.startswith("t:"):
+            trait = raw[2:]
+            if not trait:
+                continue
+            trait_score[trait] = trait_score.get(trait, 0) + 1
+        elif raw.startswith("s:"):
+            try:
+                total_score += int(raw[2:])
+            except Exception:
+                pass
+    return trait_score, total_score
+
+
+def result_outcome(tests: Dict[str, Dict[str, Any]], slug: str, stash: Dict[str, str]) -> Optional[Dict[str, str]]:
+    test = tests.get(slug, {})
+    ttype = test.get("type", "traits")
+    trait_score, total_score = _tally(stash)
+
+    if slug == "mbti" or ttype == "mbti":
+        typ = score_to_mbti(trait_score)
+        desc = test.get("results", {}).get(typ, "Описание недоступно.")
+        return {"key": f"{slug}:{typ}", "title": typ, "text": desc, "test": test.get("title", slug)}
+
+    if ttype == "sum":
+        bands = test.get("results", {}).get("bands", [])
+        picked = pick_band(bands, total_score)
+        if picked:
+            return {
+                "key": f"{slug}:{bands.index(picked)}",
+                "title": picked.get("title", "—"),
+                "text": picked.get("text", ""),
+                "test": test.get("title", slug),
+            }
+    return None
+
+
+def compute_result(tests: Dict[str, Dict[str, Any]], slug: str, stash: Dict[str, str]) -> str:
+    test = tests.get(slug, {})
+    ttype = test.get("type", "traits")
+
+    outcome = result_outcome(tests, slug, stash)
+    if slug == "mbti" or ttype == "mbti":
+        return f"🏁 Твой тип: <b>{outcome['title']}</b>\n{outcome['text']}"
+
+    if ttype == "sum":
+        fmt = test.get("results", {}).get("format", "<b>{title}</b>\n\n{text}")
+        if outcome:
+            return fmt.format(title=outcome["title"], text=outcome["text"])
+        return "🏁 Результат: нет данных"
+
+    trait_score, _ = _tally(stash)
+    top = sorted(trait_score.items(), key=lambda x: -x[1])[:3]
+    top_str = ", ".join([f"{k}:{v}" for k, v in top]) if top else "нет данных"
+    return f"🏁 Результат «{tests[slug]['title']}»:\n<b>{top_str}</b>"
+
+
+# ----- app/adaptive.py (до перехода на векторы: только t:/s:) -----
+
+_MAX_SUM_SPAN = 1000
+
+
+def _option_traits(q: Dict[str, Any]) -> List[str]:
+    return [o["trait"] for o in q.get("options", []) if o.get("trait")]
+
+
+def _option_scores(q: Dict[str, Any]) -> List[int]:
+    scores = []
+    for o in q.get("options", []):
+        try:
+            scores.append(int(o.get("score", 0)))
+        except (TypeError, ValueError):
+            scores.append(0)
+    return scores or [0]
+
+
+def _decided_axes(questions: List[Dict[str, Any]], stash: Dict[str, str], start: int) -> set:
+    count: Counter = Counter()
+    for raw in stash.values():
+        if raw and raw.startswith("t:"):
+            count[raw[2:]] += 1
+    decided = set()
+    for a, b in DIMENSION_PAIRS:
+        left = sum(1 for q in questions[start:] if {a, b} & set(_option_traits(q)))
+        if count[a] >= count[b] + left or count[b] > count[a] + left:
+            decided.add(a)
+            decided.add(b)
+    return decided
+
+
+def _sum_decided(test: Dict[str, Any], stash: Dict[str, str], start: int) -> bool:
+    total = 0
+    for raw in stash.values():
+        if raw and raw.startswith("s:"):
+            try:
+                total += int(raw[2:])
+            except ValueError:
+                pass
+    rest = test["questions"][start:]
+    lo = total + sum(min(_option_scores(q)) for q in rest)
+    hi = total + sum(max(_option_scores(q)) for q in rest)
+    if hi - lo > _MAX_SUM_SPAN:
+        return False
+    bands = test.get("results", {}).get("bands", [])
+    first = pick_band(bands, lo)
+    return all(pick_band(bands, v) is first for v in range(lo + 1, hi + 1))
+
+
+def next_index(test: Dict[str, Any], stash: Dict[str, str], start: int) -> int:
+    questions = test["questions"]
+    total = len(questions)
+    if not test.get("adaptive") or start >= total:
+        return start
+    ttype = test.get("type", "traits")
+    if ttype == "sum":
+        return total if _sum_decided(test, stash, start) else start
+    if ttype == "mbti":
+        decided = _decided_axes(questions, stash, start)
+        for i in range(start, total):
+            traits = set(_option_traits(questions[i]))
+            if traits and not traits <= decided:
+                return i
+        return total
+    return start
@@ -0,0 +1,63 @@
+# tests/test_adaptive.py — досрочное завершение на реальных тестах каталога
+#
+# 200 случайных проходов на тест: итог после досрочного завершения совпадает с итогом
+# полного прохода (пропущенные вопросы дозаполняются любыми ответами).
+import os
+import random
+from collections import Counter
+from typing import Any, Dict
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+
+from app import adaptive  # noqa: E402
+from app import bot as app_bot  # noqa: E402
+from app.adaptive import next_index, record_saved, saved_stats  # noqa: E402
+from app.scoring import option_payload  # noqa: E402
+
+SEQUENCES = 200
+
+
+def _answer(test: Dict[str, Any], i: int, rng: random.Random) -> str:
+    opts = test["questions"][i]["options"]
+    j = rng.randrange(len(opts))
+    return option_payload(opts[j], j)
+
+
+@pytest.mark.parametrize("slug", ["mbti", "burnout"])
+def test_early_finish_matches_full_walk(slug):
+    test = dict(app_bot.TESTS[slug], adaptive=True)
+    compiled = test["compiled"]
+    total = len(test["questions"])
+    rng = random.Random(f"adaptive:{slug}")
+    saved = 0
+    for _ in range(SEQUENCES):
+        stash: Dict[str, str] = {}
+        i = 0
+        while i < total:
+            stash[str(i)] = _answer(test, i, rng)
+            i = next_index(test, stash, i + 1)
+        saved += total - len(stash)
+        full = dict(stash)
+        for i in range(total):
+            full.setdefault(str(i), _answer(test, i, rng))
+        assert compiled.outcome(full) == compiled.outcome(stash), (slug, stash)
+    assert saved > 0, slug
+
+
+def test_catalog_tests_are_not_adaptive_by_default():
+    """ Режим включается в questions.json (meta.adaptive) явно; боевые тесты идут полностью. """
+    for slug in ("mbti", "burnout"):
+        test = app_bot.TESTS[slug]
+        assert not test.get("adaptive")
+        assert next_index(test, {"0": _answer(test, 0, random.Random(0))}, 1) == 1
+
+
+def test_saved_stats(monkeypatch):
+    monkeypatch.setattr(adaptive, "SAVED", Counter())
+    record_saved("mbti", 3)
+    record_saved("mbti", 2)
+    record_saved("burnout", 0)
+    record_saved(None, 5)
+    assert saved_stats() == {"mbti": 5}
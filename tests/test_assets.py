@@ -0,0 +1,65 @@
+# tests/test_assets.py — python -m app.assets build: только исходники, prune — только найденное по хэшу
+import json
+
+import pytest
+
+from app import assets
+
+
+def _img(path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(assets, "ASSETS_DIR", tmp_path / "assets")
+    monkeypatch.setattr(assets, "STORE", assets.AssetStore(tmp_path / "assets"))
+    images = tmp_path / "tests" / "t1" / "images"
+    _img(images / "q1.jpg", b"one")
+    _img(images / "q2.jpg", b"one")                     # дубль q1
+    _img(tmp_path / "branding" / "menu.png", b"menu")
+    # рантайм и то, что бот не ищет
+    _img(images / "generated" / "q3.jpg", b"rendered")
+    _img(images / "backup" / "q1.jpg", b"old")
+    _img(tmp_path / "cards" / "card.png", b"card")
+    _img(tmp_path / "images" / "q1.jpg", b"legacy")
+    (tmp_path / "tests" / "t1" / "questions.json").write_text(
+        json.dumps({"questions": [{"text": "?", "image": "q1.jpg"}]}), encoding="utf-8"
+    )
+    # запись о карточке от прежней сборки
+    assets.STORE.index["paths"]["cards/card.png"] = "0" * 64
+    return tmp_path
+
+
+def test_iter_images_only_sources(data):
+    rel = sorted(p.relative_to(data).as_posix() for p in assets.iter_images())
+    assert rel == ["branding/menu.png", "tests/t1/images/q1.jpg", "tests/t1/images/q2.jpg"]
+
+
+def test_build_prune_keeps_runtime_files(data):
+    stats = assets.build(prune=True)
+    assert stats["files"] == 3 and stats["unique"] == 2 and stats["pruned"] == 3
+
+    index = json.loads((data / "assets" / "index.json").read_text(encoding="utf-8"))
+    assert sorted(index["paths"]) == ["branding/menu.png", "tests/t1/images/q1.jpg", "tests/t1/images/q2.jpg"]
+    for rel in ("tests/t1/images/generated/q3.jpg", "tests/t1/images/backup/q1.jpg", "cards/card.png", "images/q1.jpg"):
+        assert (data / rel).exists(), rel
+
+    # удалённые исходники бот находит по индексу
+    assert open(assets.locate(data / "tests" / "t1" / "images" / "q2.jpg"), "rb").read() == b"one"
+    assert open(assets.locate(data / "branding" / "menu.png"), "rb").read() == b"menu"
+    q = json.loads((data / "tests" / "t1" / "questions.json").read_text(encoding="utf-8"))["questions"][0]
+    assert open(assets.resolve_asset(q["asset"]), "rb").read() == b"one"
+
+
+def test_changed_or_unindexed_file_is_not_pruned(data):
+    assets.build()
+    q1 = data / "tests" / "t1" / "images" / "q1.jpg"
+    q1.write_bytes(b"edited after build")
+    extra = _img(data / "tests" / "t1" / "images" / "q9.jpg", b"new")
+    assert not assets.prunable(q1)
+    assert not assets.prunable(extra)
+    assert assets.prunable(data / "branding" / "menu.png")
@@ -0,0 +1,138 @@
+# tests/test_broadcast.py — рассылка: курсор по chat_id, получатели из памяти, чекпоинт вне цикла
+import asyncio
+import json
+import threading
+
+from aiogram.exceptions import TelegramForbiddenError
+
+from app.broadcast import Broadcaster, RateLimiter, load_recipients
+
+BOT_ID = 42
+
+
+class FakeBot:
+    def __init__(self, blocked=()):
+        self.id = BOT_ID
+        self.sent = []
+        self.blocked = set(blocked)
+        self.on_send = None
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        await asyncio.sleep(0)
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method=None, message="bot was blocked by the user")
+        self.sent.append(chat_id)
+        if self.on_send:
+            self.on_send(chat_id)
+
+
+def _state(chats):
+    return {"chats": {str(BOT_ID): {str(c): "mbti" for c in chats}}, "last_results": {}}
+
+
+def _broadcaster(bot, tmp_path, state):
+    return Broadcaster(
+        bot, checkpoint=tmp_path / "broadcast.json", limiter=RateLimiter(10_000),
+        concurrency=2, state=lambda: state,
+    )
+
+
+def test_recipients_sorted_unique_after_cursor():
+    state = _state([30, 10, 20])
+    state["chats"]["7"] = {"99": "mbti"}                      # чужой бот
+    state["last_results"] = {
+        "5": {"slug": "mbti", "chat": 15},                      # старый однобот
+        "6": {"slug": "mbti", "chat": 77, "bot": 7},
+    }
+    state["last_mbti"] = {"10": "INTJ"}
+    got = asyncio.run(load_recipients(state, bot_id=BOT_ID, legacy=True))
+    assert got == [10, 15, 20, 30]
+    assert asyncio.run(load_recipients(state, after=15, bot_id=BOT_ID, legacy=False)) == [20, 30]
+
+
+def test_cursor_stable_when_state_grows_mid_campaign(tmp_path):
+    state = _state(range(1, 11))
+    bot = FakeBot()
+
+    async def first_half():
+        b = _broadcaster(bot, tmp_path, state)
+
+        def grow(chat_id):
+            # новые чаты появляются на ходу: и левее курсора, и правее
+            if chat_id == 3:
+                state["chats"][str(BOT_ID)].update({"-5": "mbti", "100": "mbti"})
+            if chat_id == 5:
+                b.task.cancel()
+
+        bot.on_send = grow
+        b.start("привет")
+        try:
+            await b.task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(first_half())
+    camp = json.loads((tmp_path / "broadcast.json").read_text(encoding="utf-8"))["campaign"]
+    assert not camp["done"] and camp["after"] < 10
+    assert all(c in bot.sent for c in range(1, camp["after"] + 1))
+
+    # перезапуск: дочитываем с курсора по новому снимку
+    async def second_half():
+        bot.on_send = None
+        b = _broadcaster(bot, tmp_path, state)
+        assert b.resume()
+        await b.task
+        return b.campaign
+
+    camp = asyncio.run(second_half())
+    assert camp["done"]
+    assert -5 not in bot.sent                                   # левее курсора — не наша кампания
+    assert sorted(set(bot.sent)) == list(range(1, 11)) + [100]
+    # повторно — только то, что было в работе в момент остановки
+    assert len(bot.sent) - len(set(bot.sent)) <= 2
+
+
+def test_blocked_appended_and_checkpoint_written_off_loop(tmp_path):
+    state = _state(range(1, 21))
+    bot = FakeBot(blocked={4, 8})
+    writers = []
+
+    async def run():
+        b = _broadcaster(bot, tmp_path, state)
+        real = b._write
+
+        def spy(snapshot, new_blocked):
+            writers.append(threading.get_ident())
+            real(snapshot, new_blocked)
+
+        b._write = spy
+        b.start("привет")
+        await b.task
+        # вторая кампания не шлёт заблокированным и не дублирует их в файле
+        bot.blocked.add(12)
+        b.start("ещё")
+        await b.task
+        return threading.get_ident(), b
+
+    loop_thread, b = asyncio.run(run())
+    assert writers and loop_thread not in writers
+    assert (tmp_path / "broadcast.blocked").read_text(encoding="utf-8").split() == ["4", "8", "12"]
+    assert "blocked" not in json.loads((tmp_path / "broadcast.json").read_text(encoding="utf-8"))
+    assert bot.sent.count(4) == 0 and bot.sent.count(1) == 2
+    assert b.campaign["blocked"] == 1 and b.campaign["done"]
+
+
+def test_legacy_blocked_list_migrates(tmp_path):
+    (tmp_path / "broadcast.json").write_text(
+        json.dumps({"blocked": [2, 3], "campaign": None}), encoding="utf-8"
+    )
+    bot = FakeBot()
+
+    async def run():
+        b = _broadcaster(bot, tmp_path, _state([1, 2, 3, 4]))
+        b.start("привет")
+        await b.task
+
+    asyncio.run(run())
+    assert bot.sent == [1, 4] or sorted(bot.sent) == [1, 4]
+    assert sorted((tmp_path / "broadcast.blocked").read_text(encoding="utf-8").split()) == ["2", "3"]
@@ -0,0 +1,53 @@
+# tests/test_http_session.py — MmapInputFile: содержимое кусками, файловый ввод-вывод вне цикла
+import asyncio
+import threading
+
+import pytest
+
+from app import http_session
+from app.http_session import MmapInputFile
+
+
+async def _read_all(f: MmapInputFile):
+    return [chunk async for chunk in f.read(None)]
+
+
+@pytest.mark.parametrize("size", [0, 1, 1000, 4096, 10_000])
+def test_chunks_reassemble_file(tmp_path, size):
+    path = tmp_path / "photo.jpg"
+    data = bytes(i % 251 for i in range(size))
+    path.write_bytes(data)
+    chunks = asyncio.run(_read_all(MmapInputFile(path, chunk_size=4096)))
+    assert b"".join(chunks) == data
+    assert all(len(c) <= 4096 for c in chunks)
+    assert MmapInputFile(path).filename == "photo.jpg"
+
+
+def test_file_io_runs_off_the_loop(tmp_path, monkeypatch):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"x" * 10_000)
+    threads = []
+    real = asyncio.to_thread
+
+    async def spy(fn, *args):
+        def wrapped():
+            threads.append(threading.get_ident())
+            return fn(*args)
+        return await real(wrapped)
+
+    monkeypatch.setattr(http_session.asyncio, "to_thread", spy)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        chunks = await _read_all(MmapInputFile(path, chunk_size=4096))
+        return loop_thread, chunks
+
+    loop_thread, chunks = asyncio.run(run())
+    assert len(chunks) == 3
+    # open/mmap и три среза — все в пуле потоков
+    assert len(threads) == 4 and loop_thread not in threads
+
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(_read_all(MmapInputFile(tmp_path / "nope.jpg")))
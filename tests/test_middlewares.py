@@ -0,0 +1,164 @@
+# tests/test_middlewares.py — ChatSerialMiddleware: очередь по приоритетам и ответы «занято»
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.types import Update
+
+from app.middlewares import (
+    PRIO_ANSWER, PRIO_DEFAULT, PRIO_START, ChatSerialMiddleware, PriorityGate, TokenBucket
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+        self.toasts = []
+
+    async def send_message(self, chat_id, text):
+        self.messages.append(chat_id)
+
+    async def answer_callback_query(self, callback_id, text=None):
+        self.toasts.append(callback_id)
+
+
+def _start(chat_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": chat_id,
+        "message": {
+            "message_id": 1, "date": 0, "text": "/start",
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+        },
+    })
+
+
+def _answer(chat_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": chat_id,
+        "callback_query": {
+            "id": f"cb{chat_id}", "chat_instance": "x", "data": "ans:mbti:0:t:E",
+            "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+        },
+    })
+
+
+def test_token_bucket_drops_when_empty():
+    clock = FakeClock()
+    bucket = TokenBucket(2, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    clock.now = 0.5
+    assert bucket.take() and not bucket.take()
+
+
+def test_busy_messages_throttled_toasts_not():
+    async def run():
+        serial = ChatSerialMiddleware(max_concurrency=1, max_waiting=0, busy_rate=2)
+        bot = FakeBot()
+        release = asyncio.Event()
+
+        async def handler(event, data):
+            await release.wait()
+
+        def data(chat_id):
+            return {"bot": bot, "event_chat": SimpleNamespace(id=chat_id, type="private"),
+                    "event_from_user": SimpleNamespace(id=chat_id)}
+
+        busy = asyncio.create_task(serial(handler, _start(1), data(1)))
+        await asyncio.sleep(0)
+        for chat in range(2, 52):
+            await serial(handler, _start(chat), data(chat))
+        for chat in range(100, 110):
+            await serial(handler, _answer(chat), data(chat))
+        release.set()
+        await busy
+        return serial, bot
+
+    serial, bot = asyncio.run(run())
+    # 50 отброшенных /start: сообщений — не больше burst, остальные молча
+    assert 1 <= len(bot.messages) <= 5
+    assert serial.busy_dropped == 50 - len(bot.messages)
+    assert serial.stats()["busy_dropped"] == serial.busy_dropped
+    assert len(bot.toasts) == 10
+
+
+def test_gate_wakes_answers_before_starts():
+    async def run():
+        gate = PriorityGate(slots=1, max_waiting=10)
+        assert await gate.acquire(PRIO_DEFAULT)
+        order = []
+
+        async def waiter(name, prio):
+            assert await gate.acquire(prio)
+            order.append(name)
+            gate.release()
+
+        tasks = [
+            asyncio.create_task(waiter("start1", PRIO_START)),
+            asyncio.create_task(waiter("default", PRIO_DEFAULT)),
+            asyncio.create_task(waiter("answer1", PRIO_ANSWER)),
+            asyncio.create_task(waiter("start2", PRIO_START)),
+            asyncio.create_task(waiter("answer2", PRIO_ANSWER)),
+        ]
+        await asyncio.sleep(0)
+        assert gate.depth == 5
+        gate.release()
+        await asyncio.gather(*tasks)
+        return gate, order
+
+    gate, order = asyncio.run(run())
+    assert order == ["answer1", "answer2", "default", "start1", "start2"]
+    assert gate.free == 1 and gate.depth == 0
+
+
+def test_gate_sheds_least_important():
+    async def run():
+        gate = PriorityGate(slots=1, max_waiting=2)
+        assert await gate.acquire(PRIO_ANSWER)
+        start = asyncio.create_task(gate.acquire(PRIO_START))
+        answer = asyncio.create_task(gate.acquire(PRIO_ANSWER))
+        await asyncio.sleep(0)
+        # очередь полна: ответ вытесняет ждущий /start, новый /start отбрасывается сразу
+        late_answer = asyncio.create_task(gate.acquire(PRIO_ANSWER))
+        assert await start is False
+        assert await gate.acquire(PRIO_START) is False
+        gate.release()
+        assert await answer
+        gate.release()
+        assert await late_answer
+        gate.release()
+        return gate
+
+    gate = asyncio.run(run())
+    assert gate.shed[PRIO_START] == 2 and gate.shed[PRIO_ANSWER] == 0
+    assert gate.free == 1 and gate.depth == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def run():
+        gate = PriorityGate(slots=1, max_waiting=10)
+        assert await gate.acquire(PRIO_DEFAULT)
+        queued = asyncio.create_task(gate.acquire(PRIO_START))
+        handed = asyncio.create_task(gate.acquire(PRIO_ANSWER))
+        await asyncio.sleep(0)
+
+        # отменили, пока ждал в очереди: просто уходит из неё
+        queued.cancel()
+        await asyncio.sleep(0)
+        assert gate.depth == 1
+
+        # место уже передали, но задачу отменили раньше, чем она проснулась: место возвращается
+        gate.release()
+        handed.cancel()
+        await asyncio.gather(queued, handed, return_exceptions=True)
+        return gate
+
+    gate = asyncio.run(run())
+    assert gate.free == 1 and gate.depth == 0
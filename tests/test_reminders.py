@@ -0,0 +1,217 @@
+# tests/test_reminders.py — колесо напоминаний на подменённых часах
+import asyncio
+import threading
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.reminders import _REC, ReminderScheduler, ReminderWheel
+
+BUCKET = 3600
+DAY = 86400
+
+
+class FakeClock:
+    def __init__(self, t: float = 1_000_000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+class FreeLimiter:
+    """ Без ожиданий: лимит проверяем отдельно, здесь — только логику колеса. """
+
+    def __init__(self):
+        self.acquired = 0
+        self.paused = 0.0
+
+    async def acquire(self):
+        self.acquired += 1
+
+    def pause(self, seconds):
+        self.paused += seconds
+
+
+def _wheel(tmp_path, clock):
+    return ReminderWheel(tmp_path, bucket=BUCKET, clock=clock)
+
+
+def _pop(wheel, **kw):
+    return asyncio.run(wheel.pop_due(**kw))
+
+
+def test_insert_appends_one_record(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    rem = wheel.add(1, 100, "burnout", clock.t + 14 * DAY)
+    wheel.add(1, 101, "burnout", clock.t + 14 * DAY)
+    path = tmp_path / f"{rem.bucket}.bin"
+    assert path.stat().st_size == 2 * _REC.size
+    # будущая корзина в память не грузится
+    assert wheel.stats() == {"loaded": 0, "buckets": 1, "pending_keys": 2}
+
+
+def test_pop_due_in_order_and_not_early(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    wheel.add(1, 2, "psych_age", clock.t + 20)
+    wheel.add(1, 1, "burnout", clock.t + 10)
+    assert _pop(wheel) == []
+    clock.t += 15
+    assert [r.chat_id for r in _pop(wheel)] == [1]
+    clock.t += 10
+    assert [r.chat_id for r in _pop(wheel)] == [2]
+
+
+def test_restart_reads_only_due_buckets(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    for i in range(10):
+        wheel.add(1, i, "burnout", clock.t + i * BUCKET)
+
+    restarted = _wheel(tmp_path, clock)
+    # на старте — только имена файлов
+    assert restarted.loaded is None
+    assert restarted.stats() == {"loaded": 0, "buckets": 10, "pending_keys": 0}
+
+    clock.t += 2 * BUCKET
+    due = _pop(restarted)
+    assert sorted(r.chat_id for r in due) == [0, 1, 2]
+    # корзины дальше текущей так и лежат на диске
+    assert restarted.stats()["buckets"] == 8
+
+
+def test_done_survives_restart_and_drops_bucket(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    for i in range(4):
+        wheel.add(1, i, "burnout", clock.t + 1)
+    clock.t += 2
+    first = _pop(wheel, limit=2)
+    for rem in first:
+        wheel.done(rem)
+    asyncio.run(wheel.flush())
+
+    # упали, не отметив остальное: после рестарта — только неотмеченные
+    restarted = _wheel(tmp_path, clock)
+    rest = _pop(restarted)
+    assert sorted(r.chat_id for r in rest) == sorted({0, 1, 2, 3} - {r.chat_id for r in first})
+    for rem in rest:
+        restarted.done(rem)
+
+    # всё отправлено и корзина в прошлом — файлы удаляются
+    clock.t += BUCKET
+    assert _pop(restarted) == []
+    asyncio.run(restarted.flush())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_double_tap_schedules_once(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    first = wheel.add(1, 7, "burnout", clock.t + 5)
+    # повтор через час — уже другая корзина; записи на диск не добавляется
+    assert wheel.add(1, 7, "burnout", clock.t + BUCKET + 5) == first
+    assert wheel.add(2, 7, "burnout", clock.t + 5) != first          # другой бот
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.bin")) == 2 * _REC.size
+    clock.t += 2 * BUCKET
+    due = _pop(wheel)
+    assert sorted(r.bot_id for r in due) == [1, 2]
+    # отправляется — новое нажатие планирует следующее
+    assert wheel.add(1, 7, "burnout", clock.t + DAY) != first
+
+
+def test_dedup_after_restart(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    first = wheel.add(1, 7, "burnout", clock.t + 5)
+
+    restarted = _wheel(tmp_path, clock)
+    asyncio.run(restarted.load_index())
+    assert restarted.add(1, 7, "burnout", clock.t + BUCKET) == first
+    # дубли прежних версий на диске (в разных корзинах) — шлём одно, лишнее отмечаем
+    legacy = _wheel(tmp_path, clock)
+    legacy.add(1, 8, "burnout", clock.t + 5)
+    legacy._keys.clear()
+    legacy.add(1, 8, "burnout", clock.t + BUCKET + 5)
+    fresh = _wheel(tmp_path, clock)
+    asyncio.run(fresh.load_index())
+    clock.t += 2 * BUCKET
+    assert sorted(r.chat_id for r in _pop(fresh)) == [7, 8]
+
+
+def test_buckets_read_and_marks_written_off_loop(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    for i in range(5):
+        wheel.add(1, i, "burnout", clock.t + 1)
+    threads = {"read": [], "write": []}
+    real_read, real_write = wheel._read, wheel._write
+
+    def read(b):
+        threads["read"].append(threading.get_ident())
+        return real_read(b)
+
+    def write(marks, drops):
+        threads["write"].append((threading.get_ident(), {b: len(p) for b, p in marks.items()}))
+        real_write(marks, drops)
+
+    wheel._read, wheel._write = read, write
+    clock.t += 2
+
+    async def run():
+        for rem in await wheel.pop_due():
+            wheel.done(rem)
+        await wheel.flush()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads["read"] and loop_thread not in threads["read"]
+    # пять отметок — одной записью
+    assert len(threads["write"]) == 1
+    tid, counts = threads["write"][0]
+    assert tid != loop_thread and list(counts.values()) == [5]
+
+
+def test_scheduler_shares_limiter_and_handles_errors(tmp_path):
+    clock = FakeClock()
+    limiters = {}
+    sent = []
+    flood = {"left": 1}
+
+    def limiter(bot_id):
+        return limiters.setdefault(bot_id, FreeLimiter())
+
+    async def send(rem):
+        if rem.chat_id == 13:
+            raise TelegramForbiddenError(method=SendMessage(chat_id=13, text="x"), message="blocked")
+        if rem.chat_id == 7 and flood["left"]:
+            flood["left"] -= 1
+            raise TelegramRetryAfter(method=SendMessage(chat_id=7, text="x"), message="flood", retry_after=3)
+        sent.append((rem.bot_id, rem.chat_id))
+
+    async def scenario():
+        sched = ReminderScheduler(_wheel(tmp_path, clock), send, limiter=limiter)
+        sched.schedule(1, 7, "burnout", 10)
+        sched.schedule(2, 8, "burnout", 10)
+        sched.schedule(1, 13, "psych_age", 10)
+        assert await sched.run_due() == 0
+        clock.t += 11
+        assert await sched.run_due() == 3
+        return sched
+
+    sched = asyncio.run(scenario())
+    assert sorted(sent) == [(1, 7), (2, 8)]
+    assert sched.stats()["sent"] == 2 and sched.stats()["failed"] == 1
+    # лимитер — по боту; flood-wait ставит на паузу лимитер именно этого бота
+    assert limiters[1].acquired == 3 and limiters[1].paused == 3
+    assert limiters[2].acquired == 1
+
+
+def test_overdue_insert_goes_to_current_bucket(tmp_path):
+    clock = FakeClock()
+    wheel = _wheel(tmp_path, clock)
+    rem = wheel.add(1, 1, "burnout", clock.t - 5 * BUCKET)
+    assert rem.bucket == int(clock.t // BUCKET)
+    assert [r.chat_id for r in _pop(wheel)] == [1]
@@ -0,0 +1,77 @@
+# tests/test_replay.py — запись апдейтов (пачками, вне цикла) и прогон на диспетчере бота
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from app.replay import UpdateRecorder, build_update
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _updates(n: int):
+    for i in range(n):
+        rec = {"k": "msg", "c": 1000 + i % 3, "u": 1000 + i % 3, "m": i + 1, "d": "/start" if i % 4 == 0 else "привет"}
+        yield build_update(rec, i + 1)
+
+
+def test_recorder_buffers_and_writes_off_loop(tmp_path):
+    path = tmp_path / "u.rec"
+    recorder = UpdateRecorder(str(path), salt="test", flush_every=10)
+    writers = []
+    real_write = recorder._write
+
+    def spy(lines):
+        writers.append((threading.get_ident(), len(lines)))
+        real_write(lines)
+
+    recorder._write = spy
+
+    async def handler(event, data):
+        return "ok"
+
+    async def run():
+        for update in _updates(25):
+            assert await recorder(handler, update, {}) == "ok"
+        await asyncio.sleep(0)
+        await recorder.close()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    # две полные пачки по 10 и хвост при закрытии — все в пуле потоков
+    assert [n for _, n in writers] == [10, 10, 5]
+    assert all(t != loop_thread for t, _ in writers)
+
+    recs = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["m"] for r in recs] == list(range(1, 26))  # порядок сохранён
+    assert {r["d"] for r in recs} == {"/start", ""}      # свободный текст не пишем
+    assert all(r["c"] not in (1000, 1001, 1002) for r in recs)  # id — хэш
+
+
+def test_replay_runs_on_bot_dispatcher(tmp_path):
+    path = tmp_path / "u.rec"
+    lines = []
+    for chat in range(1, 21):
+        lines.append({"k": "msg", "c": chat, "ct": "private", "u": chat, "m": 1, "d": "/start", "t": 0})
+        lines.append({"k": "cb", "c": chat, "ct": "private", "u": chat, "m": 1, "d": "start:burnout", "t": 0})
+        lines += [
+            {"k": "cb", "c": chat, "ct": "private", "u": chat, "m": 1, "d": f"ans:burnout:{i}:s:1", "t": 0}
+            for i in range(3)
+        ]
+    path.write_text("".join(json.dumps(r) + "\n" for r in lines), encoding="utf-8")
+
+    # отдельный процесс: router бота подключается к одному Dispatcher
+    proc = subprocess.run(
+        [sys.executable, "-m", "app.replay", str(path), "--speed", "max"],
+        cwd=ROOT, capture_output=True, text=True, timeout=300,
+    )
+    report = json.loads(proc.stdout)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    assert report["updates"] == len(lines)
+    assert report["errors"] == 0 and report["unfinished"] == 0
+    assert report["handlers"]["cb:ans"]["n"] == 60
+    # сессии живут в хранилище бота, очереди чатов убраны
+    assert report["sessions"]["sessions"] == 20
+    assert report["ingress"]["chats"] == 0
@@ -0,0 +1,38 @@
+# tests/test_results.py — ResultStore: последние результаты раздельно по ботам (тенантам)
+import json
+
+from app.results import ResultStore
+
+OUTCOME = {"key": "mbti:INTJ", "title": "INTJ", "text": "…"}
+
+
+def test_latest_isolated_per_bot(tmp_path):
+    store = ResultStore(tmp_path / "state.json")
+    store.record(1, 100, 100, "mbti", OUTCOME)
+    store.record(2, 100, -500, "burnout", {"key": "burnout:1", "title": "…", "text": "…"})
+    assert store.latest(1, 100)["key"] == "mbti:INTJ"
+    assert store.latest(2, 100)["key"] == "burnout:1"
+    assert store.latest(3, 100) is None
+    assert store.state["chats"] == {"1": {"100": "mbti"}, "2": {"-500": "burnout"}}
+
+
+def test_legacy_records_only_for_legacy_bot(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps({
+        "last_results": {
+            "100": {"slug": "mbti", "key": "mbti:ENFP"},               # однобот
+            "200": {"slug": "mbti", "key": "mbti:ISTJ", "bot": 2},     # прежний формат ключа
+        },
+        "last_mbti": {"300": "INFJ"},
+    }), encoding="utf-8")
+    store = ResultStore(path)
+    store.legacy_bot = 1
+    assert store.latest(1, 100)["key"] == "mbti:ENFP"
+    assert store.latest(2, 100) is None
+    assert store.latest(2, 200)["key"] == "mbti:ISTJ"
+    assert store.latest(1, 200) is None
+    assert store.latest(1, 300)["key"] == "mbti:INFJ"
+    assert store.latest(2, 300) is None
+    # новая запись перекрывает старую
+    store.record(1, 100, 100, "mbti", OUTCOME)
+    assert store.latest(1, 100)["key"] == "mbti:INTJ"
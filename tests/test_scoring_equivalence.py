@@ -0,0 +1,257 @@
+# tests/test_scoring_equivalence.py — движок app/scoring.py считает так же, как прежний код
+#
+# Случайные сессии (детерминированные сиды) по реальным тестам каталога и по синтетическим:
+# пропуски вопросов, пустые/битые/устаревшие payload, полосы с дырами и кривыми границами.
+# Эталон — tests/scoring_reference.py.
+import asyncio
+import os
+import random
+from typing import Any, Dict, List
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+
+from app import bot as app_bot  # noqa: E402
+from app import mbti, tests_manager  # noqa: E402
+from app.adaptive import next_index  # noqa: E402
+from app.scoring import compile_test, option_payload  # noqa: E402
+
+import scoring_reference as ref  # noqa: E402
+
+CASES = 300
+# мусор, который встречается в старых сессиях и подделанных callback_data
+JUNK = ["", "t:", "s:", "s:x", "s:-3", "s:12", "x:1", "t:Z", "o:0", "t:E", "t:I", "s:0"]
+
+
+class FakeState:
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+
+    async def get_data(self) -> Dict[str, Any]:
+        return self.data
+
+
+def random_stash(test: Dict[str, Any], rng: random.Random) -> Dict[str, str]:
+    stash: Dict[str, str] = {}
+    for i, q in enumerate(test["questions"]):
+        roll = rng.random()
+        if roll < 0.1:
+            continue  # вопрос пропущен (адаптивный тест, сессия не дошла)
+        if roll < 0.15:
+            stash[str(i)] = rng.choice(JUNK)
+            continue
+        opts = q.get("options", [])
+        if opts:
+            j = rng.randrange(len(opts))
+            stash[str(i)] = option_payload(opts[j], j)
+    if rng.random() < 0.1:
+        stash["stale"] = rng.choice(JUNK)  # ключ не номер вопроса
+    return stash
+
+
+def synthetic_tests(rng: random.Random) -> Dict[str, Dict[str, Any]]:
+    traits = list("ABCDE") + ["E", "I"]
+    sum_questions = [
+        {"text": f"q{i}", "options": [{"text": "-", "score": s} for s in rng.sample(range(-2, 5), 3)]}
+        for i in range(6)
+    ]
+    return {
+        "syn_traits": {
+            "title": "Трейты",
+            "type": "traits",
+            "questions": [
+                {"text": f"q{i}", "options": [{"text": "-", "trait": t} for t in rng.sample(traits, 3)] + [{"text": "-"}]}
+                for i in range(8)
+            ],
+            "results": {},
+        },
+        "syn_sum": {
+            "title": "Сумма",
+            "type": "sum",
+            "questions": sum_questions,
+            # дыры между полосами, перекрытие, полоса без max и с битой границей
+            "results": {"bands": [
+                {"min": 0, "max": 3, "title": "низко", "text": "a"},
+                {"min": 6, "max": 9, "title": "средне", "text": "b"},
+                {"min": 8, "max": 12, "title": "перекрытие", "text": "c"},
+                {"min": 13, "max": "x", "title": "битая", "text": "d"},
+                {"min": 15, "title": "высоко", "text": "e"},
+            ]},
+        },
+        "syn_sum_empty": {"title": "Пусто", "type": "sum", "questions": sum_questions, "results": {"bands": []}},
+        "syn_mbti": {
+            "title": "Ещё MBTI",
+            "type": "mbti",
+            "questions": [
+                {"text": f"q{i}", "options": [{"text": "-", "trait": a}, {"text": "-", "trait": b}]}
+                for i, (a, b) in enumerate(ref.DIMENSION_PAIRS * 2)
+            ],
+            "results": {"ESTJ": "описание"},
+        },
+    }
+
+
+@pytest.fixture
+def tests(monkeypatch) -> Dict[str, Dict[str, Any]]:
+    """ Каталог бота плюс синтетические тесты (скомпилированные, как в load_tests). """
+    for slug, test in synthetic_tests(random.Random(1)).items():
+        test["compiled"] = compile_test(slug, test)
+        monkeypatch.setitem(app_bot.TESTS, slug, test)
+    return app_bot.TESTS
+
+
+def test_compute_result_matches_reference(tests):
+    async def check():
+        for slug, test in tests.items():
+            rng = random.Random(f"compute:{slug}")
+            for _ in range(CASES):
+                stash = random_stash(test, rng)
+                got = await app_bot.compute_result(slug, FakeState({"stash": stash}))
+                assert got == ref.compute_result(tests, slug, stash), (slug, stash)
+
+    asyncio.run(check())
+
+
+def test_result_outcome_matches_reference(tests):
+    for slug, test in tests.items():
+        rng = random.Random(f"outcome:{slug}")
+        for _ in range(CASES):
+            stash = random_stash(test, rng)
+            assert app_bot.result_outcome(slug, stash) == ref.result_outcome(tests, slug, stash), (slug, stash)
+
+
+def test_sum_bands_every_total(tests):
+    """ Таблица полос на весь достижимый диапазон и за его краями — как линейный поиск. """
+    for slug in ("syn_sum", "burnout", "iq_lite"):
+        compiled = tests[slug]["compiled"]
+        lo, hi = compiled.band_lo, compiled.band_lo + len(compiled.band_table)
+        for total in range(lo - 5, hi + 5):
+            assert compiled.band_for(total) is ref.pick_band(compiled.bands, total), (slug, total)
+
+
+def test_score_to_mbti_matches_reference():
+    rng = random.Random("score_to_mbti")
+    for _ in range(CASES * 10):
+        score = {k: rng.randrange(6) for k in rng.sample("EISNTFJPX", rng.randint(0, 9))}
+        assert app_bot.score_to_mbti(score) == ref.score_to_mbti(score), score
+
+
+def test_mbti_from_traits_matches_reference():
+    rng = random.Random("mbti_from_traits")
+    for _ in range(CASES * 10):
+        traits = [rng.choice("EISNTFJPX") for _ in range(rng.randint(0, 30))]
+        assert mbti.mbti_from_traits(traits) == ref.mbti_from_traits(traits), traits
+
+
+def _profiles(rng: random.Random, pool: List[str]) -> Dict[str, Any]:
+    return {
+        f"p{i}": {"traits": [rng.choice(pool) for _ in range(rng.randint(0, 4))], "text": f"профиль {i}"}
+        for i in range(rng.randint(1, 8))
+    }
+
+
+def test_calc_result_matches_reference():
+    rng = random.Random("calc_result")
+    pool = list("ABCDEFGHIJ")
+    for _ in range(CASES * 10):
+        test = {"slug": "x", "questions": [], "results": _profiles(rng, pool)}
+        traits = [rng.choice(pool + ["Z"]) for _ in range(rng.randint(0, 15))]
+        assert tests_manager.calc_result(dict(test), traits) == ref.calc_result(test, traits), (test, traits)
+
+
+def test_calc_result_no_profiles_raises():
+    with pytest.raises(ValueError):
+        ref.calc_result({"results": {}}, ["A"])
+    with pytest.raises(ValueError):
+        tests_manager.calc_result({"slug": "x", "results": {}}, ["A"])
+
+
+def test_unknown_payloads_do_not_grow_compiled_test(tests):
+    compiled = tests["mbti"]["compiled"]
+    dims, vectors = len(compiled.dims), len(compiled.vectors)
+    stash = {str(i): f"t:junk{i}" for i in range(5000)}
+    stash.update({"5000": "s:7", "5001": "o:99", "5002": "t:E"})
+    assert compiled.outcome(stash)["title"] == "ESTJ"
+    assert len(compiled.accumulate(stash)) == dims
+    assert (len(compiled.dims), len(compiled.vectors)) == (dims, vectors)
+
+
+# ----- адаптивный режим -----
+
+def _walk(test: Dict[str, Any], rng: random.Random, step) -> Dict[str, str]:
+    """ Проход с досрочным завершением: step(stash, следующий) → индекс следующего вопроса. """
+    stash: Dict[str, str] = {}
+    i, total = 0, len(test["questions"])
+    while i < total:
+        opts = test["questions"][i]["options"]
+        j = rng.randrange(len(opts))
+        stash[str(i)] = option_payload(opts[j], j)
+        i = step(stash, i + 1)
+    return stash
+
+
+def test_next_index_matches_reference(tests):
+    """ На тестах без весов (t:/s:) — те же прыжки, что у прежней реализации. """
+    for slug in ("mbti", "burnout", "syn_mbti", "syn_sum", "iq_lite"):
+        test = dict(tests[slug], adaptive=True)
+        rng = random.Random(f"adaptive:{slug}")
+        for _ in range(CASES // 3):
+            def step(stash, nxt):
+                got = next_index(test, stash, nxt)
+                assert got == ref.next_index(test, stash, nxt), (slug, stash, nxt)
+                return got
+            _walk(test, rng, step)
+
+
+def weighted_tests() -> Dict[str, Dict[str, Any]]:
+    """ Адаптивные тесты на вариантах с весами (payload o:N) — прежний код их не понимал. """
+    mbti_q = [
+        {"text": f"q{i}", "options": [
+            {"text": "да", "weights": {a: 2}}, {"text": "скорее да", "weights": {a: 1}},
+            {"text": "скорее нет", "weights": {b: 1}}, {"text": "нет", "weights": {b: 2}},
+        ]}
+        for i, (a, b) in enumerate(ref.DIMENSION_PAIRS * 3)
+    ]
+    sum_q = [
+        {"text": f"q{i}", "options": [{"text": "-", "weights": {"score": w}} for w in (0, 1, 3)]}
+        for i in range(6)
+    ]
+    return {
+        "w_mbti": {"title": "MBTI с весами", "type": "mbti", "adaptive": True, "questions": mbti_q, "results": {}},
+        "w_sum": {"title": "Сумма с весами", "type": "sum", "adaptive": True, "questions": sum_q, "results": {"bands": [
+            {"min": 0, "max": 2, "title": "lo", "text": "a"},
+            {"min": 3, "max": 9, "title": "mid", "text": "b"},
+            {"min": 10, "max": 18, "title": "hi", "text": "c"},
+        ]}},
+    }
+
+
+def test_adaptive_weighted_options_finish_with_full_walk_result():
+    """ Досрочный итог совпадает с итогом любого полного прохода с теми же ответами. """
+    for slug, test in weighted_tests().items():
+        compiled = test["compiled"] = compile_test(slug, test)
+        total = len(test["questions"])
+        rng = random.Random(f"weighted:{slug}")
+        skipped = 0
+        for _ in range(CASES // 3):
+            stash = _walk(test, rng, lambda s, nxt: next_index(test, s, nxt))
+            skipped += total - len(stash)
+            early = compiled.outcome(stash)
+            for _ in range(5):
+                full = dict(stash)
+                for i in range(total):
+                    if str(i) not in full:
+                        j = rng.randrange(len(test["questions"][i]["options"]))
+                        full[str(i)] = option_payload(test["questions"][i]["options"][j], j)
+                assert compiled.outcome(full) == early, (slug, stash, full)
+        assert skipped > 0, slug  # досрочное завершение действительно срабатывает
+
+
+def test_adaptive_weighted_first_answer_does_not_finish():
+    """ Первый ответ с весом не заканчивает тест: ни пропуск всех вопросов, ни «решено» на 0..0. """
+    tests = weighted_tests()
+    for slug, test in tests.items():
+        test["compiled"] = compile_test(slug, test)
+    assert next_index(tests["w_mbti"], {"0": "o:0"}, 1) == 1
+    assert next_index(tests["w_sum"], {"0": "o:1"}, 1) == 1
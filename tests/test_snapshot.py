@@ -0,0 +1,77 @@
+# tests/test_snapshot.py — снимок мягкого рестарта: сессии, offsets, недоделанные апдейты
+import asyncio
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+
+from app import media, snapshot
+from app.snapshot import restore_snapshot, save_snapshot
+from app.storage import BoundedMemoryStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def _update(uid: int) -> Update:
+    return Update.model_validate({
+        "update_id": uid,
+        "message": {
+            "message_id": uid, "date": 0, "text": "/start",
+            "chat": {"id": 10, "type": "private"},
+            "from": {"id": 10, "is_bot": False, "first_name": "u"},
+        },
+    })
+
+
+@pytest.fixture(autouse=True)
+def file_ids(monkeypatch):
+    ids = {1: {"abc": "FILE1"}}
+    monkeypatch.setattr(media, "FILE_IDS", ids)
+    monkeypatch.setattr(snapshot, "FILE_IDS", ids)
+    return ids
+
+
+def _saved(tmp_path):
+    storage = BoundedMemoryStorage()
+    asyncio.run(storage.set_state(KEY, "Quiz:q"))
+    asyncio.run(storage.set_data(KEY, {"slug": "mbti", "index": 3, "stash": {"0": "t:E"}}))
+    path = tmp_path / "snapshot.json"
+    save_snapshot(storage, {1: 501}, {1: [_update(500), _update(499)]}, path=path)
+    return path
+
+
+def test_round_trip(tmp_path, file_ids):
+    path = _saved(tmp_path)
+    file_ids.clear()
+
+    storage = BoundedMemoryStorage()
+    offsets, updates = restore_snapshot(storage, path=path)
+    assert offsets == {1: 501}
+    assert [u["update_id"] for u in updates[1]] == [500, 499]
+    assert Update.model_validate(updates[1][0]).message.text == "/start"
+    assert asyncio.run(storage.get_state(KEY)) == "Quiz:q"
+    assert asyncio.run(storage.get_data(KEY))["stash"] == {"0": "t:E"}
+    assert storage.bytes > 0
+    assert file_ids == {1: {"abc": "FILE1"}}
+
+
+def test_restored_at_prevents_second_replay(tmp_path):
+    path = _saved(tmp_path)
+    assert restore_snapshot(BoundedMemoryStorage(), path=path)[1]
+
+    # падение сразу после старта: сессии восстанавливаются снова, апдейты и offsets — нет
+    storage = BoundedMemoryStorage()
+    assert restore_snapshot(storage, path=path) == ({}, {})
+    assert asyncio.run(storage.get_state(KEY)) == "Quiz:q"
+
+    # свежий снимок при следующей остановке снова несёт апдейты
+    save_snapshot(storage, {1: 600}, {1: [_update(599)]}, path=path)
+    offsets, updates = restore_snapshot(BoundedMemoryStorage(), path=path)
+    assert offsets == {1: 600} and [u["update_id"] for u in updates[1]] == [599]
+
+
+def test_missing_or_broken_snapshot(tmp_path):
+    assert restore_snapshot(BoundedMemoryStorage(), path=tmp_path / "none.json") == ({}, {})
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+    assert restore_snapshot(BoundedMemoryStorage(), path=broken) == ({}, {})
@@ -0,0 +1,82 @@
+# tests/test_storage.py — BoundedMemoryStorage: TTL по простою и бюджет по байтам (часы — фейковые)
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.storage import BoundedMemoryStorage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _key(i: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=i, user_id=i)
+
+
+def test_idle_sessions_expire():
+    clock = FakeClock()
+    storage = BoundedMemoryStorage(ttl=60, clock=clock)
+
+    async def run():
+        await storage.set_data(_key(1), {"slug": "mbti"})
+        await storage.set_data(_key(2), {"slug": "burnout"})
+        clock.now += 50
+        assert await storage.get_data(_key(1)) == {"slug": "mbti"}   # продлили 1
+        clock.now += 20
+        # 2 простаивает 70 с — снята при обращении; 1 трогали 20 с назад
+        assert await storage.get_data(_key(2)) == {}
+        assert await storage.get_state(_key(1)) is None and _key(1) in storage.storage
+        clock.now += 61
+        assert storage.sweep(limit=None) == 1
+
+    asyncio.run(run())
+    assert not storage.storage and storage.bytes == 0
+    assert storage.stats()["evicted_ttl"] == 2
+
+
+def test_byte_budget_evicts_least_recent():
+    clock = FakeClock()
+    storage = BoundedMemoryStorage(ttl=3600, max_bytes=3000, clock=clock)
+
+    async def run():
+        for i in range(5):
+            clock.now += 1
+            await storage.set_data(_key(i), {"stash": "x" * 500})
+        return [k.chat_id for k in storage.storage]
+
+    alive = asyncio.run(run())
+    # ~900 байт на запись: влезает три, вытеснены самые давние
+    assert alive == [2, 3, 4]
+    assert storage.bytes <= 3000
+    assert storage.stats()["evicted_bytes"] == 2
+
+
+def test_touch_protects_from_byte_eviction():
+    storage = BoundedMemoryStorage(ttl=3600, max_bytes=3000, clock=FakeClock())
+
+    async def run():
+        for i in range(3):
+            await storage.set_data(_key(i), {"stash": "x" * 500})
+        await storage.get_data(_key(0))        # 0 стал самым свежим
+        await storage.set_data(_key(3), {"stash": "x" * 500})
+        return [k.chat_id for k in storage.storage]
+
+    assert asyncio.run(run()) == [2, 0, 3]
+
+
+def test_missing_key_read_creates_nothing_and_clear_drops():
+    storage = BoundedMemoryStorage(clock=FakeClock())
+
+    async def run():
+        assert await storage.get_data(_key(1)) == {}
+        assert not storage.storage
+        await storage.set_state(_key(1), "Quiz:q")
+        await storage.set_state(_key(1), None)
+
+    asyncio.run(run())
+    assert not storage.storage and storage.bytes == 0
@@ -0,0 +1,35 @@
+# tests/test_stress.py — python -m app.stress: ответы не теряются при параллельной обработке
+#
+# Каждый прогон — отдельный процесс (router бота подключается к одному Dispatcher).
+# По умолчанию 1000 чатов; полный прогон — STRESS_CHATS=10000 python -m pytest tests/test_stress.py
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHATS = os.getenv("STRESS_CHATS", "1000")
+
+
+def _stress(*args: str):
+    proc = subprocess.run(
+        [sys.executable, "-m", "app.stress", "--chats", CHATS, *args],
+        cwd=ROOT, capture_output=True, text=True, timeout=900,
+    )
+    report = json.loads(proc.stdout[: proc.stdout.rindex("}") + 1])
+    return proc.returncode, report
+
+
+def test_no_lost_answers():
+    code, report = _stress()
+    assert report["lost"] == 0
+    assert report["errors"] == 0 and report["shed"] == 0
+    assert report["answers"] == int(CHATS) * 5
+    assert report["slots_left"] == 0  # очереди чатов убраны
+    assert code == 0
+
+
+def test_race_is_detected_without_serial_middleware():
+    code, report = _stress("--unordered")
+    assert report["lost"] > 0
+    assert code == 1